@@ -8,10 +8,13 @@ Main entry point of the program.
 
 import logging
 
-from .argparser import get_trading_data_from_args
+from .argparser import get_parsed_args, get_trading_data_from_args
+from .cache import set_cache_directory
 from .simulator import simulate
+from .sweep import sweep
 from .utils import (
     BINANCE_DATA_PATH,
+    CACHE_PATH,
     COINGECKO_DATA_PATH,
     COINMARKETCAP_DATA_PATH,
     DATA_PATH,
@@ -27,8 +30,10 @@ for path in {
     BINANCE_DATA_PATH,
     COINMARKETCAP_DATA_PATH,
     COINGECKO_DATA_PATH,
+    CACHE_PATH,
 }:
     path.mkdir(parents=True, exist_ok=True)
+set_cache_directory(CACHE_PATH)
 
 logging.basicConfig(
     format="[%(levelname)s] %(message)s",
@@ -41,5 +46,9 @@ logging.basicConfig(
     ],
 )
 
-trading_data = get_trading_data_from_args()
-simulate(trading_data)
+args = get_parsed_args()
+trading_data = get_trading_data_from_args(args)
+if args["command"] == "sweep":
+    sweep(trading_data, args["sweep"])
+else:
+    simulate(trading_data)
@@ -7,6 +7,7 @@ Module responsible for getting the trading data from supplied program arguments.
 import argparse
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 import yaml
@@ -14,6 +15,7 @@ from schema import SchemaError
 
 from .api_downloader import get_data, get_global_metrics, get_historical_btc
 from .utils import (
+    DEFAULT_DOWNLOAD_WORKERS,
     TIME_FORMAT,
     YAML_FILE_SCHEMA,
     TradingData,
@@ -26,9 +28,10 @@ from .utils import (
 )
 
 
-def get_trading_data_from_args() -> TradingData:
+def get_trading_data_from_args(args: dict = None) -> TradingData:
     """Get trading data ready for simulation."""
-    args = get_parsed_args()
+    if args is None:
+        args = get_parsed_args()
     set_logging_level(args)
     trading_vars = convert_args_to_trading_variables(args)
     data_df = get_data_dataframe(trading_vars)
@@ -61,14 +64,25 @@ def get_parsed_args():
         parser.error("Incomplete arguments or no argument file defined!")
 
     if args.file:
-        return parse_yaml(args)
-    return {
-        "pairs": args.pairs,
-        "start_date": args.start_date,
-        "end_date": args.end_date,
-        "interval": args.interval,
-        "debug_level": args.debug_level,
-    }
+        parsed_args = parse_yaml(args)
+    else:
+        parsed_args = {
+            "pairs": args.pairs,
+            "start_date": args.start_date,
+            "end_date": args.end_date,
+            "interval": args.interval,
+            "debug_level": args.debug_level,
+            "workers": 1,
+        }
+
+    if args.workers is not None:
+        parsed_args["workers"] = args.workers
+    if args.download_workers is not None:
+        parsed_args["download_workers"] = args.download_workers
+    parsed_args["command"] = args.command
+    if args.command == "sweep":
+        parsed_args["sweep"] = get_sweep_args(parser, args)
+    return parsed_args
 
 
 def get_argument_parser():
@@ -100,9 +114,72 @@ def get_argument_parser():
         choices={"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"},
         default="INFO",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=get_positive_int,
+        help="number of processes to run the strategies in, 1 runs them sequentially "
+        "(default: 1), overrides the argument file",
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=get_positive_int,
+        help="number of threads to load the pairs data in "
+        f"(default: {DEFAULT_DOWNLOAD_WORKERS}), overrides the argument file",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="run one strategy for a grid of its keyword arguments"
+    )
+    sweep_parser.add_argument("--strategy", required=True, help="name of the strategy class")
+    sweep_parser.add_argument(
+        "--grid",
+        nargs="+",
+        required=True,
+        metavar="KWARG=VALUE,VALUE",
+        help="values of the strategy keyword arguments, risk metric optimizations "
+        "such as diminishing_returns=true,false can be swept as well",
+    )
+    sweep_parser.add_argument(
+        "--samples", type=int, help="run only a random sample of the grid combinations"
+    )
+    sweep_parser.add_argument("--seed", type=int, help="seed of the random sample")
+    sweep_parser.add_argument(
+        "--cash", type=float, default=10000, help="dollar capital of the portfolio"
+    )
+    sweep_parser.add_argument(
+        "--keep-profits", action="store_true", help="save also profits in time of every run"
+    )
     return parser
 
 
+def get_positive_int(value: str) -> int:
+    """Parse a positive integer argument."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def get_sweep_args(parser, args):
+    """Get sweep arguments, grid values are parsed as YAML scalars."""
+    grid = {}
+    for kwarg_values in args.grid:
+        kwarg, _, values = kwarg_values.partition("=")
+        if not kwarg or not values:
+            parser.error(f"Grid argument {kwarg_values} is not in the KWARG=VALUE,VALUE format!")
+        grid[kwarg] = [yaml.safe_load(value) for value in values.split(",")]
+    return {
+        "strategy": args.strategy,
+        "grid": grid,
+        "samples": args.samples,
+        "seed": args.seed,
+        "cash": args.cash,
+        "keep_profits": args.keep_profits,
+    }
+
+
 def set_logging_level(args):
     logging.getLogger().setLevel(getattr(logging, args["debug_level"]))
 
@@ -117,17 +194,31 @@ def parse_yaml(args):
             sys.exit(1)
         if "debug_level" not in yaml_args:
             yaml_args["debug_level"] = "INFO"
+        if "workers" not in yaml_args:
+            yaml_args["workers"] = 1
         return yaml_args
 
 
 def get_data_dataframe(trading_vars: TradingVariables):
-    """Get data based on the information provided in the arguments."""
-    pairs_dataframes = [
-        get_dataframe_for_trading_pair(trading_vars, pair) for pair in trading_vars.pairs
-    ]
+    """Get data based on the information provided in the arguments.
+
+    The pairs are loaded concurrently in threads, the downloads wait on the network and
+    the memory-mapped Arrow files are read without holding the GIL. The data frames are
+    concatenated in the order of the pairs, regardless of the order they finish in.
+    """
+    pairs = trading_vars.pairs
+    pairs_dataframes = [None] * len(pairs)
+    with ThreadPoolExecutor(max_workers=trading_vars.download_workers) as executor:
+        futures = {
+            executor.submit(get_dataframe_for_trading_pair, trading_vars, pair): i
+            for i, pair in enumerate(pairs)
+        }
+        for loaded, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            pairs_dataframes[i] = future.result()
+            logging.info(f"loaded pair {loaded}/{len(pairs)}: {pairs[i]}")
     data = pd.concat(pairs_dataframes)
-    data = remove_distinct_dates(data)
-    return data.sort_index()
+    return remove_distinct_dates(data)
 
 
 def get_dataframe_for_trading_pair(trading_vars: TradingVariables, pair: str):
@@ -0,0 +1,180 @@
+"""
+Author: Marek Filip 2022
+
+Module simulating many variants of one strategy family in lockstep.
+
+The holdings of all variants are kept in (variants x coins) arrays and the decisions of every
+step are applied to all variants at once as masked vector updates. The updates replicate
+the arithmetic of the Strategy trading methods, so the results match the per-variant
+simulations. Supported are the risk metric strategies, whose actions in every step are known
+from the risk metric and the variant's keyword arguments before the simulation starts.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from .dca_riskmetric_strategy import DCARiskMetricStrategy
+from .riskmetric_calculator import align_risk_metric
+from .riskmetric_strategy import RiskMetricStrategy
+from .strategy import Strategy
+from .utils import (
+    ACTION_BUY,
+    ACTION_BUY_ADDITIONAL,
+    ACTION_BUY_PARTIAL,
+    ACTION_SELL,
+    ACTION_SELL_PARTIAL,
+    Portfolio,
+    StrategyResult,
+    TradingData,
+    create_portfolio_from_data,
+    get_profits_relative_to_invested,
+)
+
+
+class BatchedSimulation:
+    """Portfolios of several variants of one strategy, traded in lockstep.
+
+    Every trading method takes the step index and a mask of the variants that trade.
+    """
+
+    def __init__(self, data: TradingData, portfolio: Portfolio, variants: int):
+        self.dates = data.dates
+        columns = [data.pair_columns[coin] for coin in portfolio.symbols]
+        self.close_values = data.close_values[:, columns]
+        self.coins_count = len(columns)
+
+        self.usd = np.full(variants, float(portfolio.usd))
+        self.coins = np.tile(portfolio.holdings, (variants, 1))
+        self.usd_invested = np.full(variants, float(portfolio.usd))
+
+        self.profits = np.zeros((variants, self.dates.size))
+        self.bought = np.zeros((variants, self.dates.size), dtype=np.int64)
+        self.sold = np.zeros((variants, self.dates.size), dtype=np.int64)
+
+    def get_coins_value(self, step: int):
+        # Coins are summed one by one, same as in Strategy.get_coins_value_in_usd()
+        value = np.zeros(self.usd.size)
+        for column in range(self.coins_count):
+            value += self.coins[:, column] * self.close_values[step, column]
+        return value
+
+    def log_profits(self, step: int, relative_to_invested=False):
+        profits = self.usd + self.get_coins_value(step)
+        if relative_to_invested:
+            profits = get_profits_relative_to_invested(profits, self.usd_invested)
+        self.profits[:, step] = profits
+
+    def buy(self, step: int, mask: npt.NDArray[bool]):
+        mask = mask & (self.usd != 0)
+        usd_per_coin = self.usd[mask] / self.coins_count
+        self.coins[mask] += usd_per_coin[:, None] / self.close_values[step]
+        self.usd[mask] = 0
+        self.bought[mask, step] += 1
+
+    def sell(self, step: int, mask: npt.NDArray[bool]):
+        mask = mask & (self.coins != 0).any(axis=1)
+        self._sell_coins(step, mask)
+        self.sold[mask, step] += 1
+
+    def buy_partial(self, step: int, mask: npt.NDArray[bool], percentages: npt.NDArray[float]):
+        self._buy_partial(step, mask, percentages)
+        self.bought[mask, step] += 1
+
+    def sell_partial(self, step: int, mask: npt.NDArray[bool], percentages: npt.NDArray[float]):
+        self._buy_partial(step, mask, 100 - percentages)
+        self.sold[mask, step] += 1
+
+    def buy_additional(self, step: int, mask: npt.NDArray[bool], usd: npt.NDArray[float]):
+        usd_per_coin = usd[mask] / self.coins_count
+        self.coins[mask] += usd_per_coin[:, None] / self.close_values[step]
+        self.usd_invested[mask] += usd[mask]
+        self.bought[mask, step] += 1
+
+    def execute_actions(self, step: int, codes: npt.NDArray[int], values: npt.NDArray[float]):
+        """Execute one action code per variant, with the action value as its argument."""
+        actions = {
+            ACTION_BUY: lambda mask: self.buy(step, mask),
+            ACTION_SELL: lambda mask: self.sell(step, mask),
+            ACTION_BUY_PARTIAL: lambda mask: self.buy_partial(step, mask, values),
+            ACTION_SELL_PARTIAL: lambda mask: self.sell_partial(step, mask, values),
+            ACTION_BUY_ADDITIONAL: lambda mask: self.buy_additional(step, mask, values),
+        }
+        for code, action in actions.items():
+            mask = codes == code
+            if mask.any():
+                action(mask)
+
+    def _sell_coins(self, step: int, mask: npt.NDArray[bool]):
+        self.usd[mask] += self.get_coins_value(step)[mask]
+        self.coins[mask] = 0
+
+    def _buy_partial(self, step: int, mask: npt.NDArray[bool], percentages: npt.NDArray[float]):
+        self._sell_coins(step, mask)
+        usd_to_buy_coins_with = self.usd[mask] * (percentages[mask] / 100)
+        usd_per_coin = usd_to_buy_coins_with / self.coins_count
+        self.coins[mask] += usd_per_coin[:, None] / self.close_values[step]
+        self.usd[mask] = self.usd[mask] - usd_to_buy_coins_with
+
+    def get_results(self, names: list[str]) -> list[StrategyResult]:
+        return [
+            StrategyResult(
+                name,
+                self.profits[variant],
+                list(self.dates.repeat(self.bought[variant])),
+                list(self.dates.repeat(self.sold[variant])),
+                self.usd_invested[variant],
+            )
+            for variant, name in enumerate(names)
+        ]
+
+
+def can_run_variants_batched(strategy_class: Strategy):
+    return issubclass(strategy_class, RiskMetricStrategy)
+
+
+def run_variants_batched(
+    strategy_class: Strategy,
+    data: TradingData,
+    variants: list[dict],
+    portfolio: Portfolio = None,
+) -> list[StrategyResult]:
+    """Simulate the strategy for every variant's keyword arguments in lockstep."""
+    if not can_run_variants_batched(strategy_class):
+        raise ValueError(f"{strategy_class.__name__} cannot be simulated in batches")
+    if portfolio is None:
+        portfolio = create_portfolio_from_data(data)
+
+    simulation = BatchedSimulation(data, portfolio, len(variants))
+    actions, action_values = get_variant_actions(strategy_class, data, variants)
+    relative_to_invested = issubclass(strategy_class, DCARiskMetricStrategy)
+
+    # Risk metric strategies buy on their first step
+    simulation.buy(0, np.ones(len(variants), dtype=bool))
+    for step in range(data.dates.size):
+        simulation.log_profits(step, relative_to_invested)
+        if actions[:, step].any():
+            simulation.execute_actions(step, actions[:, step], action_values[:, step])
+
+    return simulation.get_results([get_variant_name(strategy_class, v) for v in variants])
+
+
+def get_variant_actions(strategy_class: Strategy, data: TradingData, variants: list[dict]):
+    """Get (variants x steps) action codes and values, aligning every distinct risk metric
+    only once.
+    """
+    aligned_riskmetrics = {}
+    actions, action_values = [], []
+    for variant in variants:
+        riskmetric = variant["riskmetric"]
+        if id(riskmetric) not in aligned_riskmetrics:
+            aligned_riskmetrics[id(riskmetric)] = align_risk_metric(riskmetric, data.dates)
+        variant_actions = strategy_class.get_actions(aligned_riskmetrics[id(riskmetric)], variant)
+        actions.append(variant_actions[0])
+        action_values.append(variant_actions[1])
+    return np.array(actions), np.array(action_values)
+
+
+def get_variant_name(strategy_class: Strategy, variant: dict):
+    if issubclass(strategy_class, DCARiskMetricStrategy):
+        return f"{strategy_class.__name__}{{interval: {variant.get('dca_interval', 1)}}}"
+    return strategy_class.__name__
@@ -7,103 +7,175 @@ for Binance API see: https://www.binance.com/en/support/faq/c-6
 """
 
 import logging
-from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Iterable
 
 import numpy as np
 import pandas as pd
 from binance import Client
 from decouple import config
 
-from .utils import (
-    BINANCE_DATA_PATH,
-    SEP,
-    TIME_FORMAT,
-    convert_csv_to_df,
-    get_dates_from_index,
+from .market_data_store import (
+    ARROW_SUFFIX,
+    MarketDataCatalog,
+    MarketDataEntry,
+    load_market_data,
+    merge_market_data,
+    resample_ohlcv,
+    save_market_data,
 )
+from .utils import BINANCE_DATA_PATH, SEP, TIME_FORMAT, get_dates_from_index
+
+KLINE_COLUMNS = ["open", "high", "low", "close", "volume"]
+KLINE_PAGE_SIZE = 1000  # klines returned by one request of the Binance API
+# Kline intervals of Binance from the finest one, without the months of variable length
+BINANCE_INTERVALS = [
+    "1m",
+    "3m",
+    "5m",
+    "15m",
+    "30m",
+    "1h",
+    "2h",
+    "4h",
+    "6h",
+    "8h",
+    "12h",
+    "1d",
+    "3d",
+    "1w",
+]
 
 
 def get_data_from_binance(args: dict) -> pd.DataFrame:
     """Get dataframe pair data from Binance API."""
     logging.debug(f"path to data: {BINANCE_DATA_PATH}")
 
-    # check if csv file does not already exist for previous data
-    for file in BINANCE_DATA_PATH.iterdir():
-        if does_binance_file_meet_criteria(file, args):
-            logging.info(f"opening existing csv file: {file}")
-            df = convert_csv_to_df(file, "open_time")
-            try:
-                return df[args["start_date"] : args["end_date"]]
-            except KeyError:
-                # Binance server saves days at 02:00, so this error can happen
-                return df[df.index[0] : args["end_date"]]
+    # check if data file does not already exist for previous data
+    catalog = get_binance_catalog()
+    file = catalog.find(args["ticker"], args["interval"], args["start_date"], args["end_date"])
+    if file is not None:
+        # The data can start after start_date, when the pair was listed later
+        return load_market_data(file, args["start_date"], args["end_date"])
+
+    df = get_resampled_data(catalog, args)
+    if df is not None:
+        return df
+
+    # Extend the widest file of the pair with only the missing head and tail of the data
+    old_file = catalog.find_widest(args["ticker"], args["interval"])
+    df = download_missing_data(catalog, old_file, args)
+    return df[args["start_date"] : args["end_date"]]
+
+
+def download_missing_data(catalog: MarketDataCatalog, old_file: Path, args: dict):
+    """Download the data of the dates missing in the old file, or all the data when there
+    is no old file, and save them merged with the old data. Get all the merged data.
+    """
+    if old_file is None:
+        start_date = args["start_date"]
+        df = download_klines(args, args["start_date"], args["end_date"])
+        if df.empty:
+            logging.warning(f"no {args['ticker']} {args['interval']} klines were downloaded")
+            return df
+    else:
+        entry = get_binance_file_entry(old_file)
+        start_date = min(args["start_date"], entry.start_date)
+        head = tail = None
+        if args["start_date"] < entry.start_date:
+            head = download_klines(args, args["start_date"], entry.start_date)
+        if args["end_date"] > entry.end_date:
+            tail = download_klines(args, entry.end_date, args["end_date"])
+        df = load_market_data(old_file)
+        if all(new_df is None or new_df.empty for new_df in (head, tail)):
+            return df
+        df = merge_market_data(head, df, tail)
+
+    path_to_data = BINANCE_DATA_PATH / (
+        f"{args['ticker']}{SEP}"
+        + f"{start_date.strftime(TIME_FORMAT)}{SEP}"
+        + f"{get_dates_from_index(df)[-1].strftime(TIME_FORMAT)}"
+        + f"{SEP}{args['interval']}{ARROW_SUFFIX}"
+    )
+    save_market_data(df, path_to_data)
+    catalog.replace(old_file, path_to_data, get_binance_file_entry(path_to_data))
+    return df
 
+
+def get_resampled_data(catalog: MarketDataCatalog, args: dict) -> pd.DataFrame:
+    """Get the data of the interval resampled from the cached data of the coarsest finer
+    interval covering the dates, None if there are no such data. The cached files end on
+    the day of their last bar, the missing tail of the last bar is downloaded and cached.
+    """
+    if args["interval"] not in BINANCE_INTERVALS:
+        return None
+    interval = pd.Timedelta(args["interval"])
+    # Bars must align to the weeks, 3d bars of Binance do not
+    if pd.Timedelta(weeks=1) % interval:
+        return None
+
+    for source in reversed(BINANCE_INTERVALS[: BINANCE_INTERVALS.index(args["interval"])]):
+        source_interval = pd.Timedelta(source)
+        if interval % source_interval:
+            continue
+        file = catalog.find(args["ticker"], source, args["start_date"], args["end_date"])
+        if file is not None:
+            logging.info(f"resampling {source} data to {args['interval']}: {file}")
+            # The last bar needs the data up to the end of its interval
+            end_date = args["end_date"] + interval - source_interval
+            df = load_market_data(file, args["start_date"], end_date)
+            if df.empty or df.index[-1] < end_date:
+                source_args = {**args, "interval": source, "end_date": end_date}
+                df = download_missing_data(catalog, file, source_args)
+                df = df[args["start_date"] : end_date]
+            df = resample_ohlcv(df, interval, source_interval)
+            return df[args["start_date"] : args["end_date"]]
+    return None
+
+
+def download_klines(args: dict, start_date: pd.Timestamp, end_date: pd.Timestamp):
+    """Download the klines of the pair opening from start_date to end_date, both UTC, from
+    Binance API.
+    """
+    logging.info(f"downloading {args['ticker']} klines from {start_date} to {end_date}")
     client = Client(config("BINANCE_API_KEY"), config("BINANCE_SECRET_KEY"))
-    klines = client.get_historical_klines(
+    klines = client.get_historical_klines_generator(
         args["ticker"],
         args["interval"],
-        args["start_date"].strftime(TIME_FORMAT),
-        args["end_date"].strftime(TIME_FORMAT),
+        int(start_date.timestamp() * 1000),
+        int(end_date.timestamp() * 1000),
     )
+    return get_df_from_binance(klines)
 
-    df = get_df_from_binance(klines)
 
-    path_to_csv = (
-        f"{BINANCE_DATA_PATH}/{args['ticker']}{SEP}"
-        + f"{args['start_date'].strftime(TIME_FORMAT)}{SEP}"
-        + f"{get_dates_from_index(df)[-1].strftime(TIME_FORMAT)}"
-        + f"{SEP}{args['interval']}.csv"
+def get_binance_catalog() -> MarketDataCatalog:
+    # Previous versions saved the open times in the local timezone
+    return MarketDataCatalog(
+        BINANCE_DATA_PATH, get_binance_file_entry, "open_time", local_time=True
     )
-    df.to_csv(path_to_csv, encoding="utf-8")
-    logging.info(f"saving csv to: {path_to_csv}")
-    return df
 
 
-def does_binance_file_meet_criteria(file, args):
+def get_binance_file_entry(file: Path) -> MarketDataEntry:
     ticker, start_date, end_date, interval = file.stem.split(SEP)
     [start_date, end_date] = map(pd.to_datetime, [start_date, end_date])
-
-    if (
-        args["ticker"] == ticker
-        and args["start_date"] >= start_date
-        and args["end_date"] <= end_date
-        and args["interval"] == interval
-    ):
-        return True
-
-    return False
-
-
-def get_df_from_binance(klines):
-    np_klines = np.array(klines)
-    df = pd.DataFrame(
-        np_klines.reshape(-1, 12),
-        dtype=float,
-        columns=(
-            "open_time",
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "close_time",
-            "quote_asset_volume",
-            "number_of_trades",
-            "taker_buy_base_asset_volume",
-            "taker_buy_quote_asset_volume",
-            "ignore",
-        ),
+    return MarketDataEntry(ticker, interval, start_date, end_date)
+
+
+def get_df_from_binance(klines: Iterable[list]) -> pd.DataFrame:
+    """Convert the klines to a data frame with UTC open times. The klines are consumed in
+    pages, every page is parsed into typed arrays at once, so the raw klines of a long
+    download never have to be held in memory together.
+    """
+    klines = iter(klines)
+    open_times, values = [np.empty(0, dtype=np.int64)], [np.empty((0, len(KLINE_COLUMNS)))]
+    while page := list(islice(klines, KLINE_PAGE_SIZE)):
+        # Open time in milliseconds followed by the price and volume strings
+        page = np.array(page, dtype=object)
+        open_times.append(page[:, 0].astype(np.int64))
+        values.append(page[:, 1 : len(KLINE_COLUMNS) + 1].astype(np.float64))
+
+    index = pd.DatetimeIndex(
+        pd.to_datetime(np.concatenate(open_times), unit="ms"), name="open_time"
     )
-    df = df.drop(
-        columns=[
-            "close_time",
-            "quote_asset_volume",
-            "number_of_trades",
-            "taker_buy_base_asset_volume",
-            "taker_buy_quote_asset_volume",
-            "ignore",
-        ]
-    )
-    df.open_time = df.open_time.apply(lambda x: datetime.fromtimestamp(x / 1000))
-    df = df.set_index("open_time")
-    return df
+    return pd.DataFrame(np.concatenate(values), columns=KLINE_COLUMNS, index=index)
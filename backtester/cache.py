@@ -0,0 +1,114 @@
+"""
+Author: Marek Filip 2022
+
+Module for caching computed data frames in memory and on disk.
+
+Results are stored under keys hashed from all the inputs of the computation. The memory tier
+keeps the most recently used data frames of the current process. The disk tier keeps parquet
+files in the cache folder and removes the least recently used files once its size limit is
+exceeded. The disk tier is used only once the cache folder is set by set_cache_directory().
+"""
+
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+# Folder of the disk tier shared by all the caches, None keeps the caches in memory only
+_cache_directory: Path = None
+
+
+def set_cache_directory(directory: Path):
+    global _cache_directory
+    _cache_directory = directory
+
+
+def get_cache_directory() -> Path:
+    return _cache_directory
+
+
+def get_cache_key(*parts) -> str:
+    """Get a key hashed from the parts. Data frames and series are hashed by their contents,
+    other parts by their repr.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part).to_numpy().tobytes())
+            names = list(part.columns) if isinstance(part, pd.DataFrame) else part.name
+            digest.update(repr(names).encode())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class FrameCache:
+    """Two tier least recently used cache of data frames. The cache keeps its own copies of
+    the data frames, so callers may change the data frames they put and get.
+    """
+
+    def __init__(self, name: str, max_memory_entries: int = 16, max_disk_bytes: int = 2**30):
+        self.name = name
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: OrderedDict[str, pd.DataFrame] = OrderedDict()
+
+    def get(self, key: str) -> pd.DataFrame:
+        """Get the cached data frame, None if there is none."""
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key].copy()
+
+        path = self.get_path(key)
+        if path is None or not path.is_file():
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except Exception as error:
+            logging.warning(f"Could not read cached {self.name} from {path}: {error}")
+            return None
+        # Mark the file as recently used
+        os.utime(path)
+        self.remember(key, df)
+        return df.copy()
+
+    def put(self, key: str, df: pd.DataFrame):
+        self.remember(key, df.copy())
+        path = self.get_path(key)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(temporary_path)
+        temporary_path.replace(path)
+        self.evict_files()
+
+    def remember(self, key: str, df: pd.DataFrame):
+        self.memory[key] = df
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get_path(self, key: str) -> Path:
+        if _cache_directory is None:
+            return None
+        return _cache_directory / self.name / f"{key}.parquet"
+
+    def evict_files(self):
+        """Remove the least recently used files until the cache fits its size limit."""
+        files = sorted(
+            (_cache_directory / self.name).glob("*.parquet"), key=lambda f: f.stat().st_mtime
+        )
+        total_bytes = sum(file.stat().st_size for file in files)
+        for file in files[:-1]:
+            if total_bytes <= self.max_disk_bytes:
+                break
+            total_bytes -= file.stat().st_size
+            file.unlink()
+
+    def clear_memory(self):
+        self.memory.clear()
@@ -7,11 +7,22 @@ For Coingecko API see: https://www.coingecko.com/en/api/documentation
 """
 
 import logging
+from pathlib import Path
 
 import pandas as pd
 from pycoingecko import CoinGeckoAPI
 
-from .utils import COINGECKO_DATA_PATH, SEP, TIME_FORMAT, convert_csv_to_df
+from .market_data_store import (
+    ARROW_SUFFIX,
+    MarketDataCatalog,
+    MarketDataEntry,
+    load_market_data,
+    merge_market_data,
+    save_market_data,
+)
+from .utils import COINGECKO_DATA_PATH, SEP, TIME_FORMAT
+
+HISTORICAL_BTC_NAME = "btc-historical"
 
 
 def get_historical_btc_from_coingecko(end_date: pd.Timestamp) -> pd.DataFrame:
@@ -19,16 +30,41 @@ def get_historical_btc_from_coingecko(end_date: pd.Timestamp) -> pd.DataFrame:
     from the CoinGecko API. Data is got in form of Pandas data frame.
     """
 
-    # check if csv file does not already exist for previous data
-    for file in COINGECKO_DATA_PATH.iterdir():
-        if does_historical_btc_file_meet_criteria(file, end_date):
-            logging.info(f"opening existing csv file: {file}")
-            df = convert_csv_to_df(file, "date")
-            return df[:end_date]
+    # check if data file does not already exist for previous data
+    catalog = get_historical_btc_catalog()
+    file = catalog.find(HISTORICAL_BTC_NAME, "1d", None, end_date)
+    if file is not None:
+        return load_market_data(file, end_date=end_date)
+
+    # Extend the widest file with only the days missing since its end, up to today
+    old_file = catalog.find_widest(HISTORICAL_BTC_NAME, "1d")
+    if old_file is None:
+        historical_btc = download_historical_btc("max")
+    else:
+        old_end_date = get_historical_btc_file_entry(old_file).end_date
+        days = (pd.Timestamp.now().normalize() - old_end_date).days + 1
+        historical_btc = merge_market_data(
+            load_market_data(old_file), download_historical_btc(max(days, 1))
+        )
+        end_date = max(end_date, old_end_date)
+
+    path_to_data = (
+        COINGECKO_DATA_PATH
+        / f"{HISTORICAL_BTC_NAME}{SEP}{end_date.strftime(TIME_FORMAT)}{ARROW_SUFFIX}"
+    )
+    save_market_data(historical_btc, path_to_data)
+    catalog.replace(old_file, path_to_data, get_historical_btc_file_entry(path_to_data))
+    return historical_btc[:end_date]
 
+
+def download_historical_btc(days) -> pd.DataFrame:
+    """Download the daily bitcoin data of the last days, or of all days when days is "max",
+    from CoinGecko API.
+    """
+    logging.info(f"downloading historical bitcoin data of the last {days} days")
     cg = CoinGeckoAPI()
     bitcoin_market_chart = cg.get_coin_market_chart_by_id(
-        id="bitcoin", vs_currency="usd", days="max", interval="daily"
+        id="bitcoin", vs_currency="usd", days=days, interval="daily"
     )
 
     data = {}
@@ -40,17 +76,14 @@ def get_historical_btc_from_coingecko(end_date: pd.Timestamp) -> pd.DataFrame:
     historical_btc = pd.DataFrame.from_dict(data)
     historical_btc["date"] = pd.to_datetime(data["date"], unit="ms").normalize()
     historical_btc.index = historical_btc["date"]
-    historical_btc = historical_btc.drop(columns=["date"])
+    return historical_btc.drop(columns=["date"])
+
 
-    path_to_csv = f"{COINGECKO_DATA_PATH}/btc-historical{SEP}" + f"{end_date.strftime(TIME_FORMAT)}"
-    historical_btc.to_csv(path_to_csv, encoding="utf-8")
-    logging.info(f"saving csv to: {path_to_csv}")
-    return historical_btc
+def get_historical_btc_catalog() -> MarketDataCatalog:
+    return MarketDataCatalog(COINGECKO_DATA_PATH, get_historical_btc_file_entry, "date")
 
 
-def does_historical_btc_file_meet_criteria(file, end_date: pd.Timestamp):
-    _, file_end_date = file.stem.split(SEP)
-    file_end_date = pd.to_datetime(file_end_date)
-    if end_date <= file_end_date:
-        return True
-    return False
+def get_historical_btc_file_entry(file: Path) -> MarketDataEntry:
+    name, file_end_date = file.stem.split(SEP)
+    # The historical data start from the first day Bitcoin was traded
+    return MarketDataEntry(name, "1d", None, pd.to_datetime(file_end_date))
@@ -6,23 +6,35 @@ File for getting dataframe data from Coinmarketcap API.
 For Coinmarket API see: https://coinmarketcap.com/api/
 """
 
-import json
 import logging
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import requests
-from requests.exceptions import ConnectionError, Timeout, TooManyRedirects
-
+from requests import RequestException
+
+from .http_client import get_json_responses
+from .market_data_store import (
+    ARROW_SUFFIX,
+    MarketDataCatalog,
+    MarketDataEntry,
+    load_market_data,
+    merge_market_data,
+    save_market_data,
+)
 from .utils import (
     COINMARKETCAP_DATA_PATH,
     COINMARKETCAP_GLOBAL_METRICS_URL,
     COINMARKETCAP_LIMIT,
+    COINMARKETCAP_RATE,
+    COINMARKETCAP_WORKERS,
     SEP,
     TIME_FORMAT,
-    convert_csv_to_df,
     interpolate_missing_dates,
 )
 
+GLOBAL_METRICS_NAME = "global-metrics"
+
 
 def get_global_metrics_from_coinmarketcap(
     start_date: pd.Timestamp, end_date: pd.Timestamp
@@ -37,36 +49,71 @@ def get_global_metrics_from_coinmarketcap(
     start_date -= pd.Timedelta(days=1)
     end_date += pd.Timedelta(days=1)
 
-    # check if csv file does not already exist for previous data
-    for file in COINMARKETCAP_DATA_PATH.iterdir():
-        if does_global_metrics_file_meet_criteria(file, start_date, end_date):
-            logging.info(f"opening existing csv file: {file}")
-            df = convert_csv_to_df(file, "date")
-            return df[start_date:end_date]
-
-    response_json = get_response_dict_from_api(start_date, end_date)
-    df = convert_global_metrics_json_to_dataframe(response_json)
+    # check if data file does not already exist for previous data
+    catalog = get_global_metrics_catalog()
+    file = catalog.find(GLOBAL_METRICS_NAME, "1d", start_date, end_date)
+    if file is not None:
+        return load_market_data(file, start_date, end_date)
+
+    # Extend the widest file with only the missing head and tail of the data
+    old_file = catalog.find_widest(GLOBAL_METRICS_NAME, "1d")
+    if old_file is None:
+        df = download_global_metrics(start_date, end_date)
+    else:
+        entry = get_global_metrics_file_entry(old_file)
+        head = tail = None
+        if start_date < entry.start_date:
+            head = download_global_metrics(start_date, entry.start_date)
+        if end_date > entry.end_date:
+            tail = download_global_metrics(entry.end_date, end_date)
+        df = merge_market_data(head, load_market_data(old_file), tail)
+        start_date = min(start_date, entry.start_date)
+        end_date = max(end_date, entry.end_date)
     df = interpolate_missing_dates(df)
 
-    path_to_csv = (
-        f"{COINMARKETCAP_DATA_PATH}/global-metrics{SEP}"
+    path_to_data = COINMARKETCAP_DATA_PATH / (
+        f"{GLOBAL_METRICS_NAME}{SEP}"
         + f"{start_date.strftime(TIME_FORMAT)}{SEP}"
-        + f"{end_date.strftime(TIME_FORMAT)}"
+        + f"{end_date.strftime(TIME_FORMAT)}{ARROW_SUFFIX}"
     )
-    df.to_csv(path_to_csv, encoding="utf-8")
-    logging.info(f"saving csv to: {path_to_csv}")
+    save_market_data(df, path_to_data)
+    catalog.replace(old_file, path_to_data, get_global_metrics_file_entry(path_to_data))
     return df
 
 
-def does_global_metrics_file_meet_criteria(file, start_date, end_date):
-    _, file_start_date, file_end_date = file.stem.split(SEP)
+def download_global_metrics(start_date: pd.Timestamp, end_date: pd.Timestamp) -> pd.DataFrame:
+    """Download the global metrics from start_date to end_date from CoinMarketCap API."""
+    logging.info(f"downloading global metrics from {start_date} to {end_date}")
+    try:
+        responses = get_json_responses(
+            COINMARKETCAP_GLOBAL_METRICS_URL,
+            get_parameters_list(start_date, end_date),
+            COINMARKETCAP_WORKERS,
+            COINMARKETCAP_RATE,
+        )
+    except RequestException as e:
+        logging.error(f"downloading global metrics failed: {e}")
+        raise
+    return convert_global_metrics_quotes_to_dataframe(
+        [response["data"]["quotes"] for response in responses]
+    )
+
+
+def get_global_metrics_catalog() -> MarketDataCatalog:
+    return MarketDataCatalog(COINMARKETCAP_DATA_PATH, get_global_metrics_file_entry, "date")
+
+
+def get_global_metrics_file_entry(file: Path) -> MarketDataEntry:
+    name, file_start_date, file_end_date = file.stem.split(SEP)
     [file_start_date, file_end_date] = map(pd.to_datetime, [file_start_date, file_end_date])
-    if start_date >= file_start_date and end_date <= file_end_date:
-        return True
-    return False
+    return MarketDataEntry(name, "1d", file_start_date, file_end_date)
 
 
-def get_response_dict_from_api(start_date, end_date):
+def get_parameters_list(start_date: pd.Timestamp, end_date: pd.Timestamp) -> list[dict]:
+    """Get the request parameters of the windows the dates are split into, taking the API
+    limit of days per request into account.
+    """
+
     def get_parameters(start_date, end_date):
         return {
             "format": "chart",
@@ -78,7 +125,6 @@ def get_response_dict_from_api(start_date, end_date):
     days_between_dates = pd.Timedelta(end_date - start_date).days
     assert days_between_dates > 0
 
-    # Take API limit into account
     params_list = []
     if days_between_dates > COINMARKETCAP_LIMIT:
         temp_start_date = start_date
@@ -89,51 +135,41 @@ def get_response_dict_from_api(start_date, end_date):
             days_between_dates = (end_date - temp_end_date).days
         start_date = temp_start_date
     params_list.append(get_parameters(start_date, end_date))
+    return params_list
 
-    responses = []
-    try:
-        responses = list(
-            requests.get(COINMARKETCAP_GLOBAL_METRICS_URL, params=params) for params in params_list
-        )
-    except (ConnectionError, Timeout, TooManyRedirects) as e:
-        logging.error(e)
-
-    individual_global_metrics = [json.loads(response.text) for response in responses]
-    global_metrics = individual_global_metrics[0]
-    for metrics in individual_global_metrics[1:]:
-        global_metrics["data"]["quotes"].extend(metrics["data"]["quotes"])
-    return global_metrics
-
-
-def convert_global_metrics_json_to_dataframe(response: dict):
-    data = response["data"]["quotes"]
 
+def convert_global_metrics_quotes_to_dataframe(quotes_lists: list[list[dict]]) -> pd.DataFrame:
+    """Convert the quotes of the API responses to a data frame. The values are written
+    straight into preallocated column arrays, the dates are parsed at once.
+    """
+    size = sum(map(len, quotes_lists))
+    timestamps = np.empty(size, dtype=object)
     # NOTE: All marketcap data is reported in $USD
-    output_data = {
-        "date": [],
-        "btc_dominance": [],
-        "eth_dominance": [],
-        "altcoin_marketcap": [],
-        "altcoin_volume_24h": [],
-        "total_marketcap": [],
-        "total_volume_24h": [],
+    columns = {
+        column: np.empty(size)
+        for column in [
+            "btc_dominance",
+            "eth_dominance",
+            "altcoin_marketcap",
+            "altcoin_volume_24h",
+            "total_marketcap",
+            "total_volume_24h",
+        ]
     }
-    for entry in data:
-        output_entry = {}
-        output_entry["btc_dominance"] = entry["btcDominance"]
-        output_entry["eth_dominance"] = entry.get("ethDominance", 0)
-        output_entry["date"] = pd.Timestamp(entry["timestamp"]).tz_localize(None).normalize()
-
-        quote = entry["quote"][0]
-        output_entry["altcoin_marketcap"] = quote["altcoinMarketCap"]
-        output_entry["altcoin_volume_24h"] = quote["altcoinVolume24H"]
-        output_entry["total_marketcap"] = quote["totalMarketCap"]
-        output_entry["total_volume_24h"] = quote["totalVolume24H"]
-
-        for key, value in output_entry.items():
-            output_data[key].append(value)
-
-    df = pd.DataFrame.from_dict(output_data)
-    df.index = df["date"]
-    df = df.drop(columns=["date"])
-    return df
+
+    i = 0
+    for quotes in quotes_lists:
+        for entry in quotes:
+            timestamps[i] = entry["timestamp"]
+            columns["btc_dominance"][i] = entry["btcDominance"]
+            columns["eth_dominance"][i] = entry.get("ethDominance", 0)
+
+            quote = entry["quote"][0]
+            columns["altcoin_marketcap"][i] = quote["altcoinMarketCap"]
+            columns["altcoin_volume_24h"][i] = quote["altcoinVolume24H"]
+            columns["total_marketcap"][i] = quote["totalMarketCap"]
+            columns["total_volume_24h"][i] = quote["totalVolume24H"]
+            i += 1
+
+    dates = pd.to_datetime(timestamps, utc=True).tz_localize(None).normalize()
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(dates, name="date"))
@@ -0,0 +1,116 @@
+"""
+Author: Marek Filip 2022
+
+Module with the numba compiled simulation engine.
+
+Strategies expressing their logic as per-step action arrays are simulated by a single
+compiled loop over plain arrays. The loop repeats the arithmetic of the Strategy trading
+methods in the same order, so the results are identical to the reference simulation.
+numba is installed together with vectorbt, without it the compiled engine is not available.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from .utils import (
+    ACTION_BUY,
+    ACTION_BUY_ADDITIONAL,
+    ACTION_BUY_PARTIAL,
+    ACTION_SELL,
+    ACTION_SELL_PARTIAL,
+)
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+
+@njit(cache=True)
+def _get_coins_value(close: npt.NDArray[float], coins: npt.NDArray[float]):
+    # Summed one coin after another, same as in Strategy.get_coins_value_in_usd()
+    coins_value = 0.0
+    for coin in range(coins.size):
+        coins_value += coins[coin] * close[coin]
+    return coins_value
+
+
+@njit(cache=True)
+def _sell_coins(close: npt.NDArray[float], coins: npt.NDArray[float], usd: float):
+    usd += _get_coins_value(close, coins)
+    coins[:] = 0
+    return usd
+
+
+@njit(cache=True)
+def _buy_coins(close: npt.NDArray[float], coins: npt.NDArray[float], usd: float):
+    usd_per_coin = usd / coins.size
+    for coin in range(coins.size):
+        coins[coin] += usd_per_coin / close[coin]
+
+
+@njit(cache=True)
+def _buy_partial(close: npt.NDArray[float], coins: npt.NDArray[float], usd: float, percentage):
+    usd = _sell_coins(close, coins, usd)
+    usd_to_buy_coins_with = usd * (percentage / 100)
+    _buy_coins(close, coins, usd_to_buy_coins_with)
+    return usd - usd_to_buy_coins_with
+
+
+@njit(cache=True)
+def simulate_actions(
+    close_values: npt.NDArray[float],
+    actions: npt.NDArray[int],
+    action_values: npt.NDArray[float],
+    start: int,
+    usd: float,
+    coins: npt.NDArray[float],
+    total_usd_invested: float,
+    relative_to_invested: bool,
+    profits: npt.NDArray[float],
+    bought: npt.NDArray[int],
+    sold: npt.NDArray[int],
+):
+    """Simulate the steps from start on. Profits and the numbers of buys and sells of every
+    step are written into the given arrays, coins are updated in place.
+
+    Returns the final USD and total USD invested.
+    """
+    for step in range(start, close_values.shape[0]):
+        close = close_values[step]
+
+        # Profits are logged first, same as in Strategy.execute_step()
+        profit = usd + _get_coins_value(close, coins)
+        if relative_to_invested:
+            if profit == 0 and total_usd_invested == 0:
+                profit = 0.0
+            else:
+                profit = profit / total_usd_invested
+        profits[step] = profit
+
+        action = actions[step]
+        if action == ACTION_BUY:
+            if usd != 0:
+                bought[step] += 1
+                _buy_coins(close, coins, usd)
+                usd = 0.0
+        elif action == ACTION_SELL:
+            if np.any(coins != 0):
+                sold[step] += 1
+                usd = _sell_coins(close, coins, usd)
+        elif action == ACTION_BUY_PARTIAL:
+            bought[step] += 1
+            usd = _buy_partial(close, coins, usd, action_values[step])
+        elif action == ACTION_SELL_PARTIAL:
+            sold[step] += 1
+            usd = _buy_partial(close, coins, usd, 100 - action_values[step])
+        elif action == ACTION_BUY_ADDITIONAL:
+            bought[step] += 1
+            _buy_coins(close, coins, action_values[step])
+            total_usd_invested += action_values[step]
+    return usd, total_usd_invested
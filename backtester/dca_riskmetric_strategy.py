@@ -5,41 +5,65 @@ File defining the DCA strategy optimized for risk metric.
 """
 
 
-from abc import ABC, abstractmethod
+import numpy as np
 
+from .riskmetric_calculator import RiskMetric
 from .riskmetric_strategy import RiskMetricStrategy
-from .utils import Portfolio, TradingData
+from .utils import (
+    ACTION_BUY_ADDITIONAL,
+    ACTION_NONE,
+    Portfolio,
+    TradingData,
+    get_profits_relative_to_invested,
+)
 
 
-class DCARiskMetricStrategy(ABC, RiskMetricStrategy):
-    """Abstract class implementing the dollar-cost averaging simulation that takes risk metric
+class DCARiskMetricStrategy(RiskMetricStrategy):
+    """Class implementing the dollar-cost averaging simulation that takes risk metric
     into account. It is used as base for other classes.
+
+    Every dca_interval steps, base multiplied by the risk bucket's multiplier is bought.
+    The multipliers can be passed as dca_multipliers, one per risk bucket.
     """
 
+    dca_multipliers = None
+    profits_relative_to_invested = True
+
     def __init__(self, data: TradingData, portfolio: Portfolio = None, *args, **kwargs):
         super().__init__(data, portfolio, *args, **kwargs)
         self.dca_interval = kwargs.get("dca_interval", 1)
-        self.interval_until_next_buy = self.dca_interval
         self.name += f"{{interval: {self.dca_interval}}}"
-        self.base_buy = 5
-
-    def execute_step(self):
-        super().execute_step()
-        self.interval_until_next_buy -= 1
-        if self.interval_until_next_buy == 0:
-            self.execute_dca()
-            self.interval_until_next_buy = self.dca_interval
+        self.base_buy = kwargs.get("base", 5)
+
+    @classmethod
+    def get_actions(cls, riskmetric: RiskMetric, kwargs: dict):
+        dca_multipliers = kwargs.get("dca_multipliers", cls.dca_multipliers)
+        if dca_multipliers is None:
+            raise ValueError(f"{cls.__name__} needs dca_multipliers")
+        size = riskmetric.dates.size
+        dca_interval = kwargs.get("dca_interval", 1)
+        dca_steps = np.arange(dca_interval - 1, size, dca_interval)
+        buckets = cls.get_risk_buckets(riskmetric, kwargs)
+
+        actions = np.full(size, ACTION_NONE)
+        actions[dca_steps] = ACTION_BUY_ADDITIONAL
+        action_values = np.zeros(size)
+        dca_multipliers = np.array(dca_multipliers)[buckets[dca_steps]]
+        action_values[dca_steps] = kwargs.get("base", 5) * dca_multipliers
+        return actions, action_values
 
     def log_profits(self):
+        if self.deferred_profits:
+            return
         profit_in_usd = self.get_profit_in_usd()
         if profit_in_usd == 0 and self.total_usd_invested == 0:
             self.profits_in_time[self.i] = 0
         else:
             self.profits_in_time[self.i] = profit_in_usd / self.total_usd_invested
 
-    @abstractmethod
-    def execute_dca(self):
-        pass
+    def get_profits_from_ledger(self):
+        values, usd_invested = self.ledger.get_values(self.get_portfolio_close_values())
+        return get_profits_relative_to_invested(values, usd_invested)
 
 
 class DCARiskMetricStrategy7to0(DCARiskMetricStrategy):
@@ -47,29 +71,7 @@ class DCARiskMetricStrategy7to0(DCARiskMetricStrategy):
     with linera 7 to 0 buying power decrease.
     """
 
-    def execute_dca(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.buy_additional(self.base_buy * 7)
-        elif risk < 0.2:
-            self.buy_additional(self.base_buy * 6)
-        elif risk < 0.3:
-            self.buy_additional(self.base_buy * 5)
-        elif risk < 0.4:
-            self.buy_additional(self.base_buy * 4)
-        elif risk < 0.5:
-            self.buy_additional(self.base_buy * 3)
-        elif risk < 0.6:
-            self.buy_additional(self.base_buy * 2)
-        elif risk < 0.7:
-            self.buy_additional(self.base_buy * 1)
-        elif risk < 0.8:
-            self.buy_additional(self.base_buy * 0)
-        elif risk < 0.9:
-            self.buy_additional(self.base_buy * 0)
-        else:
-            self.buy_additional(self.base_buy * 0)
+    dca_multipliers = (7, 6, 5, 4, 3, 2, 1, 0, 0, 0)
 
 
 class DCARiskMetricStrategyFibonacci(DCARiskMetricStrategy):
@@ -77,29 +79,7 @@ class DCARiskMetricStrategyFibonacci(DCARiskMetricStrategy):
     with Fibonacci optimization in mind.
     """
 
-    def execute_dca(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.buy_additional(self.base_buy * 34)
-        elif risk < 0.2:
-            self.buy_additional(self.base_buy * 21)
-        elif risk < 0.3:
-            self.buy_additional(self.base_buy * 13)
-        elif risk < 0.4:
-            self.buy_additional(self.base_buy * 8)
-        elif risk < 0.5:
-            self.buy_additional(self.base_buy * 5)
-        elif risk < 0.6:
-            self.buy_additional(self.base_buy * 3)
-        elif risk < 0.7:
-            self.buy_additional(self.base_buy * 2)
-        elif risk < 0.8:
-            self.buy_additional(self.base_buy * 1)
-        elif risk < 0.9:
-            self.buy_additional(self.base_buy * 1)
-        else:
-            self.buy_additional(self.base_buy * 0)
+    dca_multipliers = (34, 21, 13, 8, 5, 3, 2, 1, 1, 0)
 
 
 class DCARiskMetricStrategyFibonacciAdjusted(DCARiskMetricStrategy):
@@ -107,26 +87,4 @@ class DCARiskMetricStrategyFibonacciAdjusted(DCARiskMetricStrategy):
     with adjust Fibonacci sequence.
     """
 
-    def execute_dca(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.buy_additional(self.base_buy * 21)
-        elif risk < 0.2:
-            self.buy_additional(self.base_buy * 13)
-        elif risk < 0.3:
-            self.buy_additional(self.base_buy * 8)
-        elif risk < 0.4:
-            self.buy_additional(self.base_buy * 5)
-        elif risk < 0.5:
-            self.buy_additional(self.base_buy * 3)
-        elif risk < 0.6:
-            self.buy_additional(self.base_buy * 2)
-        elif risk < 0.7:
-            self.buy_additional(self.base_buy * 1)
-        elif risk < 0.8:
-            self.buy_additional(self.base_buy * 0)
-        elif risk < 0.9:
-            self.buy_additional(self.base_buy * 0)
-        else:
-            self.buy_additional(self.base_buy * 0)
+    dca_multipliers = (21, 13, 8, 5, 3, 2, 1, 0, 0, 0)
@@ -5,8 +5,10 @@ File defining the DCA strategy.
 """
 
 
+import numpy as np
+
 from .strategy import Strategy
-from .utils import Portfolio, TradingData
+from .utils import Portfolio, TradingData, get_profits_relative_to_invested
 
 
 class DCAStrategy(Strategy):
@@ -15,6 +17,8 @@ class DCAStrategy(Strategy):
     dca_interval keyword argument can be used to specify the periodic buy interval.
     """
 
+    profits_relative_to_invested = True
+
     def __init__(self, data: TradingData, portfolio: Portfolio = None, **kwargs):
         super().__init__(data, portfolio)
         self.dca_interval = kwargs.get("dca_interval", 1)
@@ -29,12 +33,48 @@ class DCAStrategy(Strategy):
             self.execute_dca()
             self.interval_until_next_buy = self.dca_interval
 
+    def can_run_vectorized(self):
+        return type(self) is DCAStrategy
+
+    def run_simulation_vectorized(self):
+        """Holdings and invested USD are cumulative sums of the periodic buys. Profits
+        are logged before the buy of the same step, hence the sums are shifted by one step.
+        """
+        close = self.get_portfolio_close_values()
+        buy_steps = self.get_periodic_steps(self.dca_interval)
+
+        bought = np.zeros_like(close)
+        bought[buy_steps] = self.base_buy / close.shape[1] / close[buy_steps]
+        invested = np.zeros(self.steps.size)
+        invested[buy_steps] = self.base_buy
+
+        holdings = np.cumsum(np.vstack((self.get_holdings_vector(), bought)), axis=0)
+        total_usd_invested = np.cumsum(np.concatenate(([self.total_usd_invested], invested)))
+
+        profits_in_usd = self.portfolio.usd + (holdings[:-1] * close).sum(axis=1)
+        self.profits_in_time = get_profits_relative_to_invested(
+            profits_in_usd, total_usd_invested[:-1]
+        )
+
+        self.bought_dates.extend(self.steps[buy_steps])
+        self.set_holdings_from_vector(holdings[-1])
+        self.total_usd_invested = total_usd_invested[-1]
+        self.interval_until_next_buy = self.get_periodic_countdown(self.dca_interval)
+        self.finish_simulation()
+        return self.profits_in_time
+
     def execute_dca(self):
         self.buy_additional(self.base_buy)
 
     def log_profits(self):
+        if self.deferred_profits:
+            return
         profit_in_usd = self.get_profit_in_usd()
         if profit_in_usd == 0 and self.total_usd_invested == 0:
             self.profits_in_time[self.i] = 0
         else:
             self.profits_in_time[self.i] = profit_in_usd / self.total_usd_invested
+
+    def get_profits_from_ledger(self):
+        values, usd_invested = self.ledger.get_values(self.get_portfolio_close_values())
+        return get_profits_relative_to_invested(values, usd_invested)
@@ -0,0 +1,88 @@
+"""
+Author: Marek Filip 2022
+
+Module for finding the local extrema of the risk metrics.
+
+A value is a local minimum (maximum) when it is less (greater) than or equal to all the values
+up to order steps before and after it, same as scipy.signal.argrelextrema() with np.less_equal
+(np.greater_equal). Values with NaN in their neighbourhood are not extrema. The batch detector
+finds the extrema of a whole series, the streaming detector confirms them one value after
+another, order steps late.
+"""
+
+from collections import deque
+
+import numpy as np
+import numpy.typing as npt
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+
+def get_local_extrema(values: npt.NDArray[float], order: int):
+    """Get masks of the local minima and maxima of the values. The neighbourhood is clipped
+    at both ends of the values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+
+    # Sliding minima and maxima of the neighbourhoods, extending the edge values
+    size = 2 * order + 1
+    missing = np.isnan(values)
+    neighbourhood_min = minimum_filter1d(np.where(missing, np.inf, values), size, mode="nearest")
+    neighbourhood_max = maximum_filter1d(np.where(missing, -np.inf, values), size, mode="nearest")
+    complete = maximum_filter1d(missing.view(np.uint8), size, mode="nearest") == 0
+    return complete & (values <= neighbourhood_min), complete & (values >= neighbourhood_max)
+
+
+class StreamingExtrema:
+    """Local extrema confirmed from the values appended one after another.
+
+    Every appended value confirms the value appended order steps before, so the signals
+    equal the extrema shifted by order steps, the min_real and max_real columns of
+    the risk metrics. Monotonic deques keep the neighbourhood minimum and maximum.
+    """
+
+    def __init__(self, order: int):
+        self.order = order
+        self.step = -1
+        self.last_missing_step = None
+        self.values = deque(maxlen=order + 1)
+        # Steps and values of the neighbourhood, increasing resp. decreasing by value
+        self.minima = deque()
+        self.maxima = deque()
+
+    def append(self, value: float):
+        """Append the value and get the confirmed local minimum and maximum, the value from
+        order steps before if it is one, otherwise NaN.
+        """
+        self.step += 1
+        self.values.append(value)
+        first_step = self.step - 2 * self.order
+        if np.isnan(value):
+            self.last_missing_step = self.step
+        else:
+            self.push(self.minima, value, lambda last: last >= value, first_step)
+            self.push(self.maxima, value, lambda last: last <= value, first_step)
+
+        confirmed_step = self.step - self.order
+        if confirmed_step < 0:
+            return np.nan, np.nan
+        # The neighbourhood of the first steps is clipped at the start of the values
+        if self.last_missing_step is not None and self.last_missing_step >= first_step:
+            return np.nan, np.nan
+        confirmed = self.values[0]
+        local_min = confirmed if confirmed <= self.minima[0][1] else np.nan
+        local_max = confirmed if confirmed >= self.maxima[0][1] else np.nan
+        return local_min, local_max
+
+    def push(self, extrema: deque, value: float, is_dominated, first_step: int):
+        while extrema and is_dominated(extrema[-1][1]):
+            extrema.pop()
+        extrema.append((self.step, value))
+        while extrema[0][0] < first_step:
+            extrema.popleft()
+
+    def extend(self, values: npt.NDArray[float]):
+        """Append all the values and get arrays of the confirmed minima and maxima."""
+        signals = np.array([self.append(value) for value in values], dtype=np.float64)
+        return signals.reshape(-1, 2).T
@@ -10,13 +10,23 @@ from .utils import Portfolio, TradingData
 class HodlStrategy(Strategy):
     """Very simple class, buying all coins at first date and logging results of each day.
 
-    RFE: Optimization could be used in a form of vectorized computation, since there is
-    no need to compute each step of such simple strategy individually.
+    There is no need to compute each step of such simple strategy individually,
+    so the vectorized computation is used when possible.
     """
 
-    def __init__(self, data: TradingData, portfolio: Portfolio = None):
+    def __init__(self, data: TradingData, portfolio: Portfolio = None, *args, **kwargs):
         super().__init__(data, portfolio)
         self.buy()
 
     def execute_step(self):
         super().execute_step()
+
+    def can_run_vectorized(self):
+        return type(self) is HodlStrategy
+
+    def run_simulation_vectorized(self):
+        close = self.get_portfolio_close_values()
+        holdings = self.get_holdings_vector()
+        self.profits_in_time = self.portfolio.usd + (close * holdings).sum(axis=1)
+        self.finish_simulation()
+        return self.profits_in_time
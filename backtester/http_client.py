@@ -0,0 +1,80 @@
+"""
+Author: Marek Filip 2022
+
+Module for downloading JSON data from HTTP APIs concurrently.
+
+The requests share one session, so the connections to the API are pooled and kept alive.
+Failed requests and responses with transient error statuses are retried with exponential
+backoff, a rate limiter spaces the requests to stay within the limits of the API.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_TIMEOUT = 30  # seconds to wait for connecting to and for a response of the API
+HTTP_RETRIES = 5
+HTTP_BACKOFF_FACTOR = 0.5  # retries wait 0.5, 1, 2, 4... seconds
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Thread safe limiter spacing the requests at least 1 / rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def get_session(pool_size: int) -> requests.Session:
+    """Get session pooling pool_size connections and retrying the failed GET requests."""
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_json_responses(
+    url: str,
+    params_list: list[dict],
+    workers: int,
+    rate: float,
+) -> list:
+    """Get the JSON responses of GET requests with every parameters of the list, in the
+    order of the list. The requests are sent from workers threads, at most rate requests
+    per second. Raises requests.RequestException when a request fails after the retries.
+    """
+    session = get_session(workers)
+    rate_limiter = RateLimiter(rate)
+
+    def get_json(params: dict):
+        rate_limiter.wait()
+        logging.debug(f"requesting {url} with {params}")
+        response = session.get(url, params=params, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    with session, ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(get_json, params_list))
@@ -0,0 +1,232 @@
+"""
+Author: Marek Filip 2022
+
+Module with the incremental risk metric calculation.
+
+The calculator keeps the state of the rolling means, of the cumulative minima and maxima and
+the recent rows needed for the local extrema, so only the rows of newly arrived data are
+calculated instead of the whole history. The results are identical to the risk metric
+calculated by get_risk_metric() from all the data at once.
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from .extrema import get_local_extrema
+from .riskmetric_calculator import (
+    EXTREMA_ORDER,
+    NO_DAYS_24H_VOLUME,
+    NO_DAYS_MA,
+    RiskMetricOptimizations,
+    get_price,
+)
+from .utils import FIRST_BITCOIN_EXCHANGE
+
+
+def shift(values: npt.NDArray[float], periods: int) -> npt.NDArray[float]:
+    """Shift the values by the periods, same as Series.shift()."""
+    shifted = np.full(values.size, np.nan)
+    shifted[periods:] = values[: max(0, values.size - periods)]
+    return shifted
+
+
+class RollingMean:
+    """Rolling mean of the last window values, appended one value after another.
+
+    It repeats the compensated (Kahan) summation of pandas, so the means are identical to
+    Series.rolling(window, min_periods).mean() of all the values.
+    """
+
+    def __init__(self, window: int, min_periods: int = None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.observations = 0
+        self.negative_count = 0
+        self.same_value_count = 0
+        self.previous_value = math.nan
+
+    def append(self, values: npt.NDArray[float]) -> npt.NDArray[float]:
+        """Append the values and get the means of their windows."""
+        means = np.empty(len(values))
+        for index, value in enumerate(values):
+            value = float(value)
+            self.values.append(value)
+            if len(self.values) > self.window:
+                self.remove(self.values.popleft())
+            self.add(value)
+            means[index] = self.get_mean()
+        return means
+
+    def add(self, value: float):
+        if math.isnan(value):
+            return
+        self.observations += 1
+        y = value - self.compensation_add
+        t = self.sum + y
+        self.compensation_add = t - self.sum - y
+        self.sum = t
+        if math.copysign(1, value) < 0:
+            self.negative_count += 1
+        # Repeated values are counted to return them exactly, without summation errors
+        if value == self.previous_value:
+            self.same_value_count += 1
+        else:
+            self.same_value_count = 1
+        self.previous_value = value
+
+    def remove(self, value: float):
+        if math.isnan(value):
+            return
+        self.observations -= 1
+        y = -value - self.compensation_remove
+        t = self.sum + y
+        self.compensation_remove = t - self.sum - y
+        self.sum = t
+        if math.copysign(1, value) < 0:
+            self.negative_count -= 1
+
+    def get_mean(self) -> float:
+        if self.observations < self.min_periods or self.observations == 0:
+            return math.nan
+        if self.same_value_count >= self.observations:
+            return self.previous_value
+        mean = self.sum / self.observations
+        if self.negative_count == 0 and mean < 0:
+            return 0.0
+        if self.negative_count == self.observations and mean > 0:
+            return 0.0
+        return mean
+
+
+class CumulativeRange:
+    """Cumulative minimum and maximum of the values appended so far, skipping NaN."""
+
+    def __init__(self):
+        self.min = np.inf
+        self.max = -np.inf
+
+    def normalize(self, values: npt.NDArray[float]) -> npt.NDArray[float]:
+        """Append the values and get them normalized by the cumulative range, same as
+        (values - values.cummin()) / (values.cummax() - values.cummin()).
+        """
+        missing = np.isnan(values)
+        cummin = np.minimum.accumulate(np.append(self.min, np.where(missing, np.inf, values)))
+        cummax = np.maximum.accumulate(np.append(self.max, np.where(missing, -np.inf, values)))
+        self.min, self.max = cummin[-1], cummax[-1]
+
+        cummin, cummax = cummin[1:], cummax[1:]
+        cummin[missing] = np.nan
+        cummax[missing] = np.nan
+        return (values - cummin) / (cummax - cummin)
+
+
+class IncrementalRiskMetric:
+    """Risk metric calculated from the data one update after another.
+
+    update() returns the risk metric rows of the new data together with the previous rows,
+    whose local extrema have been confirmed by the new data. The returned rows replace
+    the rows of the same dates returned before. Min and max of the last EXTREMA_ORDER rows
+    are provisional, same as in the risk metric calculated from the data so far.
+    """
+
+    def __init__(self, optimizations: RiskMetricOptimizations):
+        self.optimizations = optimizations
+        self.short_mean = RollingMean(NO_DAYS_MA, min_periods=1)
+        self.long_mean = RollingMean(NO_DAYS_MA * 7, min_periods=1)
+        self.volume_mean = RollingMean(NO_DAYS_24H_VOLUME)
+        self.risk_range = CumulativeRange()
+        self.volume_range = CumulativeRange()
+        self.riskmetric_range = CumulativeRange()
+
+        self.size = 0
+        self.first_date = None
+        # Rows needed to confirm the extrema of the last EXTREMA_ORDER rows
+        self.recent_dates: pd.DatetimeIndex = None
+        self.recent: dict[str, npt.NDArray] = None
+        self.updates = []
+
+    def update(self, new_data: pd.DataFrame) -> pd.DataFrame:
+        """Calculate the risk metric of the new historical data, which follows the data
+        of the previous updates.
+        """
+        if self.size and new_data.index[0] <= self.recent_dates[-1]:
+            raise ValueError(
+                f"New data starting at {new_data.index[0]} does not follow the last update "
+                f"ending at {self.recent_dates[-1]}"
+            )
+        if self.first_date is None:
+            self.first_date = new_data.index[0]
+
+        price = get_price(new_data)
+        prices = price.to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            risk = self.short_mean.append(prices) / self.long_mean.append(prices)
+            if self.optimizations.diminishing_returns:
+                risk = risk * self.get_days_log(new_data.index)
+            if self.optimizations.daily_volume_correlation:
+                volume = new_data["total_volume_24h"].to_numpy(dtype=np.float64)
+                daily_volume = self.volume_range.normalize(self.volume_mean.append(volume))
+                risk = self.risk_range.normalize(risk) + ((daily_volume - 0.5) * 0.2)
+            riskmetric = self.riskmetric_range.normalize(risk)
+
+        riskmetric_df = self.update_extrema(new_data.index, price.to_numpy(), riskmetric)
+        self.updates.append(riskmetric_df)
+        return riskmetric_df
+
+    def get_days_log(self, dates: pd.DatetimeIndex) -> npt.NDArray[float]:
+        """Get the logarithm of days since the first Bitcoin exchange. Only the dates whole
+        days after the first date have it, same as in the calculation of all the data.
+        """
+        days = (dates - FIRST_BITCOIN_EXCHANGE).days.to_numpy(dtype=np.float64)
+        whole_days = (dates - self.first_date) % pd.Timedelta(days=1) == pd.Timedelta(0)
+        return np.log(np.where(whole_days, days, np.nan))
+
+    def update_extrema(
+        self, dates: pd.DatetimeIndex, prices: npt.NDArray, riskmetric: npt.NDArray[float]
+    ) -> pd.DataFrame:
+        nan = np.full(dates.size, np.nan)
+        new_rows = {"price": prices, "riskmetric": riskmetric, "min": nan, "max": nan.copy()}
+        if self.size:
+            dates = self.recent_dates.append(dates)
+            rows = {column: np.append(self.recent[column], new_rows[column]) for column in new_rows}
+        else:
+            rows = new_rows
+        recent_count = dates.size - riskmetric.size
+        self.size += riskmetric.size
+
+        # Extrema change for the rows that had less than EXTREMA_ORDER following rows, the rows
+        # before them complete their neighbourhoods
+        changed = recent_count - min(recent_count, EXTREMA_ORDER)
+        values = rows["riskmetric"]
+        local_min, local_max = get_local_extrema(values, EXTREMA_ORDER)
+        rows["min"][changed:] = np.where(local_min, values, np.nan)[changed:]
+        rows["max"][changed:] = np.where(local_max, values, np.nan)[changed:]
+
+        self.recent_dates = dates[-2 * EXTREMA_ORDER :]
+        self.recent = {column: rows[column][-2 * EXTREMA_ORDER :] for column in rows}
+
+        riskmetric_df = pd.DataFrame(
+            {
+                "riskmetric": values[changed:],
+                "price": rows["price"][changed:],
+                "min": rows["min"][changed:],
+                "max": rows["max"][changed:],
+                "min_real": shift(rows["min"], EXTREMA_ORDER)[changed:],
+                "max_real": shift(rows["max"], EXTREMA_ORDER)[changed:],
+            },
+            index=dates[changed:],
+        )
+        return riskmetric_df[~np.isnan(values[changed:])]
+
+    def get_df(self) -> pd.DataFrame:
+        """Get the risk metric of all the data so far."""
+        df = pd.concat(self.updates)
+        return df[~df.index.duplicated(keep="last")]
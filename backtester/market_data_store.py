@@ -0,0 +1,283 @@
+"""
+Author: Marek Filip 2022
+
+Module for storing the downloaded market data in Arrow files.
+
+The Arrow IPC files keep the typed time index and float columns, so they are loaded without
+parsing any text. The files are uncompressed and memory-mapped, only the pages of the rows
+of the requested date range are read. CSV files saved by the previous versions are converted
+to Arrow files once, when they are found in the data folders. The Binance CSV files keep the
+open times in the local timezone, they are converted to UTC like the newly downloaded data.
+
+The files of every data folder are indexed by a SQLite catalog, so finding the file covering
+the requested data does not need to list the folder and parse the file names. When no file
+covers the requested data, the downloaders extend the widest file of the market with only
+the missing head and tail of the data and replace it by the merged file. Coarser intervals
+are resampled from the cached data of finer intervals, without downloading them.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from dateutil.tz import tzlocal
+
+from .utils import convert_csv_to_df
+
+ARROW_SUFFIX = ".arrow"
+CATALOG_NAME = ".catalog.sqlite"
+
+# Timezone of the open times of the Binance CSV files saved by the previous versions
+LOCAL_TIMEZONE = tzlocal()
+
+# Aggregation of the bars of finer intervals into a bar of a coarser interval
+OHLCV_AGGREGATION = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+# Bars start at midnight, weeks on Monday, same as the klines of Binance
+RESAMPLE_ORIGIN = pd.Timestamp("1970-01-05")
+
+# The pairs are loaded in threads, only one of them creates a missing catalog
+_create_lock = threading.Lock()
+
+
+def save_market_data(df: pd.DataFrame, path: Path):
+    """Save the data frame with a time index to the Arrow file."""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    temporary_path = path.with_name(f".{path.name}.tmp")
+    with pa.OSFile(str(temporary_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    temporary_path.replace(path)
+    logging.info(f"saving data to: {path}")
+
+
+def load_market_data(
+    path: Path, start_date: pd.Timestamp = None, end_date: pd.Timestamp = None
+) -> pd.DataFrame:
+    """Load the rows from start_date to end_date, both included, from the Arrow file."""
+    logging.info(f"opening existing data file: {path}")
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        index_name = table.schema.pandas_metadata["index_columns"][0]
+        dates = table.column(index_name).to_numpy()
+
+        # Rows of the date range are found by binary search of the sorted time index
+        if np.all(dates[1:] >= dates[:-1]):
+            start = 0 if start_date is None else np.searchsorted(dates, start_date.to_datetime64())
+            end = (
+                dates.size
+                if end_date is None
+                else np.searchsorted(dates, end_date.to_datetime64(), side="right")
+            )
+            return table.slice(start, end - start).to_pandas()
+        return table.to_pandas()[start_date:end_date]
+
+
+def merge_market_data(*dfs: pd.DataFrame) -> pd.DataFrame:
+    """Merge the data frames into one sorted by the time index. Rows of the same time are
+    taken from the last data frame having them, the most recently downloaded one. Missing
+    (None) and empty data frames are skipped.
+    """
+    df = pd.concat([df for df in dfs if df is not None and not df.empty])
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+
+def resample_ohlcv(
+    df: pd.DataFrame, interval: pd.Timedelta, source_interval: pd.Timedelta
+) -> pd.DataFrame:
+    """Resample the OHLCV bars of the source interval to bars of the coarser interval.
+    Bars not fully covered at the edges of the data, and bars of gaps without any data,
+    are dropped.
+    """
+    resampler = df.resample(interval, origin=RESAMPLE_ORIGIN, closed="left", label="left")
+    bars = resampler.agg(OHLCV_AGGREGATION)[list(df.columns)]
+    covered = resampler["close"].count().to_numpy() > 0
+    if not df.empty:
+        covered &= bars.index >= df.index[0]
+        covered &= bars.index + interval - source_interval <= df.index[-1]
+    return bars[covered]
+
+
+def get_market_data_files(
+    directory: Path, time_index_str: str, local_time: bool = False
+) -> list[Path]:
+    """Get the Arrow files of the data folder, converting the CSV files found in it. With
+    local_time, the times of the CSV files are converted from the local timezone to UTC.
+    """
+    for file in list(directory.iterdir()):
+        if file.suffix in ("", ".csv") and not file.name.startswith("."):
+            try:
+                migrate_csv_file(file, time_index_str, local_time)
+            except (ValueError, KeyError) as error:
+                logging.warning(f"skipping file not holding market data: {file}: {error}")
+    return sorted(directory.glob(f"*{ARROW_SUFFIX}"))
+
+
+def migrate_csv_file(csv_file: Path, time_index_str: str, local_time: bool = False):
+    """Convert the CSV file to an Arrow file of the same name and remove it."""
+    logging.info(f"converting csv file to arrow: {csv_file}")
+    df = convert_csv_to_df(csv_file, time_index_str)
+    if local_time:
+        df.index = convert_local_times_to_utc(df.index)
+        # The hour repeated when the daylight saving time ends was saved twice
+        df = df[~df.index.duplicated(keep="last")]
+    save_market_data(df, csv_file.with_name(csv_file.stem + ARROW_SUFFIX))
+    csv_file.unlink()
+
+
+def convert_local_times_to_utc(dates: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """Convert naive local times, as made by datetime.fromtimestamp(), to naive UTC times.
+    The UTC offset of the last UTC estimate is subtracted until the estimate settles, which
+    takes two steps around the daylight saving time changes.
+    """
+    utc_dates = dates
+    for _ in range(3):
+        local_dates = utc_dates.tz_localize("UTC").tz_convert(LOCAL_TIMEZONE).tz_localize(None)
+        utc_dates = dates - (local_dates - utc_dates)
+    return utc_dates.rename(dates.name)
+
+
+@dataclass(frozen=True)
+class MarketDataEntry:
+    """Data container describing the data of a market data file. Start date is None when
+    the data start from the first available date.
+    """
+
+    name: str
+    interval: str
+    start_date: pd.Timestamp
+    end_date: pd.Timestamp
+
+
+class MarketDataCatalog:
+    """SQLite catalog of the market data files of a data folder, indexed by their name,
+    interval and covered date range.
+
+    When the catalog is created, the files found in the folder are indexed using
+    get_file_entry(), which raises ValueError for files not holding market data. local_time
+    tells that the CSV files of the folder keep local times.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        get_file_entry: Callable[[Path], MarketDataEntry],
+        time_index_str: str,
+        local_time: bool = False,
+    ):
+        self.directory = directory
+        self.path = directory / CATALOG_NAME
+        self.get_file_entry = get_file_entry
+        self.time_index_str = time_index_str
+        self.local_time = local_time
+
+    def connect(self) -> sqlite3.Connection:
+        if not self.path.exists():
+            with _create_lock:
+                if not self.path.exists():
+                    self.create()
+        return sqlite3.connect(self.path)
+
+    def create(self):
+        """Create the catalog of the files in the folder. It is written to a temporary file
+        first, so that an interrupted indexing does not leave an incomplete catalog.
+        """
+        temporary_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        connection = sqlite3.connect(temporary_path)
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE files (file TEXT PRIMARY KEY, name TEXT NOT NULL, "
+                    "interval TEXT NOT NULL, start_date TEXT, end_date TEXT NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX files_by_range ON files (name, interval, end_date)"
+                )
+            for file in get_market_data_files(self.directory, self.time_index_str, self.local_time):
+                try:
+                    entry = self.get_file_entry(file)
+                except ValueError:
+                    logging.warning(f"skipping file not holding market data: {file}")
+                    continue
+                self.insert(connection, file, entry)
+        finally:
+            connection.close()
+        temporary_path.replace(self.path)
+
+    def add(self, file: Path, entry: MarketDataEntry):
+        """Add the file to the catalog, replacing its previous entry."""
+        connection = self.connect()
+        try:
+            self.insert(connection, file, entry)
+        finally:
+            connection.close()
+
+    def replace(self, old_file: Path, file: Path, entry: MarketDataEntry):
+        """Add the file to the catalog and remove the old file it was merged from."""
+        self.add(file, entry)
+        if old_file is not None and old_file != file:
+            connection = self.connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM files WHERE file = ?", (old_file.name,))
+            finally:
+                connection.close()
+            old_file.unlink(missing_ok=True)
+            logging.info(f"removing merged data file: {old_file}")
+
+    def insert(self, connection: sqlite3.Connection, file: Path, entry: MarketDataEntry):
+        start_date = None if entry.start_date is None else entry.start_date.isoformat()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (file.name, entry.name, entry.interval, start_date, entry.end_date.isoformat()),
+            )
+
+    def find(
+        self, name: str, interval: str, start_date: pd.Timestamp, end_date: pd.Timestamp
+    ) -> Path:
+        """Get the file with the shortest date range covering the dates, None if there is
+        none. Start date can be None when only the end of the data matters.
+        """
+        start_date = None if start_date is None else start_date.isoformat()
+        return self.select_file(
+            "SELECT file FROM files WHERE name = ? AND interval = ? AND end_date >= ? "
+            "AND (? IS NULL OR start_date IS NULL OR start_date <= ?) "
+            "ORDER BY start_date IS NULL, julianday(end_date) - julianday(start_date), "
+            "end_date",
+            (name, interval, end_date.isoformat(), start_date, start_date),
+        )
+
+    def find_widest(self, name: str, interval: str) -> Path:
+        """Get the file with the longest date range of the name and interval, None if there
+        is none. It is the file to be extended with the missing data.
+        """
+        return self.select_file(
+            "SELECT file FROM files WHERE name = ? AND interval = ? "
+            "ORDER BY start_date IS NULL DESC, "
+            "julianday(end_date) - julianday(start_date) DESC, end_date DESC",
+            (name, interval),
+        )
+
+    def select_file(self, query: str, parameters: tuple) -> Path:
+        """Get the first existing file selected by the query, removing the entries of the
+        files missing in the folder.
+        """
+        connection = self.connect()
+        try:
+            for (file_name,) in connection.execute(query, parameters).fetchall():
+                file = self.directory / file_name
+                if file.exists():
+                    return file
+                logging.warning(f"removing missing file from the catalog: {file}")
+                with connection:
+                    connection.execute("DELETE FROM files WHERE file = ?", (file_name,))
+            return None
+        finally:
+            connection.close()
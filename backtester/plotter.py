@@ -44,7 +44,7 @@ class Plotter:
         title_text="",
     ):
         self.figure = go.Figure()
-        self.data = data.data
+        self.panels = data.panels
         self.historical_btc = data.btc_historical
         self.global_metrics = data.global_metrics
         self.dates: npt.NDArray[pd.Timestamp] = data.dates
@@ -72,7 +72,7 @@ class Plotter:
 
     def _plot_symbol(self, symbol: str, visible=True):
         self.figure.add_trace(
-            go.Scatter(x=self.dates, y=self.data.loc[symbol, "close"], name=symbol, visible=visible)
+            go.Scatter(x=self.dates, y=self.panels["close"][symbol], name=symbol, visible=visible)
         )
 
     def plot_all_symbols_as_percentages(self):
@@ -81,11 +81,9 @@ class Plotter:
             self._plot_symbol_as_percentages(symbol)
 
     def _plot_symbol_as_percentages(self, symbol: str):
-        df = self.data.loc[symbol]
-        base = df.iloc[0]["close"]
-        percentages = np.where(
-            df["close"] >= base, df["close"] / base * 100 - 100, base / df["close"] * -100 + 100
-        )
+        close = self.panels["close"][symbol]
+        base = close.iloc[0]
+        percentages = np.where(close >= base, close / base * 100 - 100, base / close * -100 + 100)
         self.figure.add_trace(go.Scatter(x=self.dates, y=percentages, name=symbol))
 
     def plot_specific_symbols(self, symbol_list):
@@ -127,7 +125,7 @@ class Plotter:
     def plot_btc(self):
         """Specifically plot Bitcoin."""
         self.figure.add_trace(
-            go.Scatter(x=self.dates, y=self.data.loc[BTC_SYMBOL, "close"], name=BTC_SYMBOL)
+            go.Scatter(x=self.dates, y=self.panels["close"][BTC_SYMBOL], name=BTC_SYMBOL)
         )
 
     def plot_historical_btc(self):
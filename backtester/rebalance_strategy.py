@@ -5,6 +5,8 @@ File defining the risk metric strategy.
 """
 
 
+import numpy as np
+
 from .strategy import Strategy
 from .utils import Portfolio, TradingData
 
@@ -30,14 +32,46 @@ class RebalanceStrategy(Strategy):
             self.rebalance_coins()
             self.interval_until_next_rebalance = self.rebalance_interval
 
+    def can_run_vectorized(self):
+        return type(self) is RebalanceStrategy
+
+    def run_simulation_vectorized(self):
+        """After every rebalance the coins' value grows by the average of the coins'
+        price ratios, so the coins' value only needs to be chained between rebalances.
+        """
+        close = self.get_portfolio_close_values()
+        holdings = self.get_holdings_vector()
+        coins_values = (close * holdings).sum(axis=1)
+
+        rebalance_steps = self.get_periodic_steps(self.rebalance_interval)
+        if rebalance_steps.size:
+            coins_count = close.shape[1]
+            steps_after = np.arange(rebalance_steps[0] + 1, self.steps.size)
+            # Last rebalance before every step, the step itself is logged before rebalancing
+            anchors = rebalance_steps[np.searchsorted(rebalance_steps, steps_after) - 1]
+            growth = (close[steps_after] / close[anchors]).sum(axis=1) / coins_count
+
+            rebalance_growth = growth[rebalance_steps[1:] - rebalance_steps[0] - 1]
+            anchor_values = coins_values[rebalance_steps[0]] * np.cumprod(
+                np.concatenate(([1.0], rebalance_growth))
+            )
+            anchor_positions = np.searchsorted(rebalance_steps, anchors)
+            coins_values[steps_after] = anchor_values[anchor_positions] * growth
+
+            last_close = close[rebalance_steps[-1]]
+            self.set_holdings_from_vector(anchor_values[-1] / coins_count / last_close)
+
+        self.profits_in_time = self.portfolio.usd + coins_values
+        self.interval_until_next_rebalance = self.get_periodic_countdown(self.rebalance_interval)
+        self.finish_simulation()
+        return self.profits_in_time
+
     def rebalance_coins(self):
         """Do the rebalance, equal reatio between all coins."""
         usd_to_rebalance = self.get_coins_value_in_usd()
-        self.portfolio.coins = {coin: 0 for coin in self.portfolio.coins}
-        usd_per_coin = usd_to_rebalance / len(self.portfolio.coins)
-        for coin in self.portfolio.coins:
-            close = self.get_close_value(coin)
-            self.portfolio.coins[coin] = usd_per_coin / close
+        usd_per_coin = usd_to_rebalance / len(self.portfolio.symbols)
+        self.portfolio.holdings[:] = usd_per_coin / self.get_close_values()
+        self.record_holdings()
 
     def print_rebalance_ratios(self):
         coins = self.portfolio.coins
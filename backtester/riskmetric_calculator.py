@@ -4,93 +4,256 @@ Author: Marek Filip 2022
 Module exposing the risk metric calculation functions.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Union
 
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 from autots import AutoTS
-from scipy.signal import argrelextrema
 
+from .cache import FrameCache, get_cache_key
+from .extrema import get_local_extrema
 from .utils import FIRST_BITCOIN_EXCHANGE
 
 NO_DAYS_MA = 50  # Number of days that the moving averages are calculated for
 NO_DAYS_24H_VOLUME = 7  # Number of days that the daily volume is calculated for
+EXTREMA_ORDER = 5  # Number of values before and after checked for the local extrema
 
+# Whole calculated risk metrics, keyed by the historical data and the calculation parameters
+riskmetric_cache = FrameCache("riskmetric")
 
-@dataclass
+
+@dataclass(frozen=True)
 class RiskMetricOptimizations:
-    """Data container for the possible risk optimizations."""
+    """Data container for the possible risk optimizations. It is hashable, so the risk metrics
+    can be shared among strategies using the same optimizations.
+    """
 
     diminishing_returns: bool = False
     daily_volume_correlation: bool = False
 
 
+@dataclass
+class RiskMetric:
+    """Dataclass holding the risk metric data frame and its columns as arrays aligned to
+    the simulation dates, so that strategies read the value of step i as arrays[column][i].
+
+    All the dates need to be present in the data frame, otherwise ValueError is raised.
+    """
+
+    df: pd.DataFrame
+    dates: pd.DatetimeIndex
+    arrays: dict[str, npt.NDArray[float]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        missing_dates = self.dates.difference(self.df.index)
+        if missing_dates.size:
+            raise ValueError(
+                f"Risk metric is missing {missing_dates.size} of the {self.dates.size} simulation "
+                f"dates, first missing date: {missing_dates[0]}"
+            )
+        aligned_df = self.df.reindex(self.dates)
+        self.arrays = {
+            column: np.ascontiguousarray(aligned_df[column].to_numpy(dtype=np.float64))
+            for column in aligned_df.columns
+        }
+
+    def __getitem__(self, column: str) -> npt.NDArray[float]:
+        return self.arrays[column]
+
+
+def align_risk_metric(
+    riskmetric: Union[RiskMetric, pd.DataFrame], dates: pd.DatetimeIndex
+) -> RiskMetric:
+    """Get the risk metric aligned to the dates, reusing it if it already is."""
+    if isinstance(riskmetric, RiskMetric):
+        if riskmetric.dates.equals(dates):
+            return riskmetric
+        riskmetric = riskmetric.df
+    return RiskMetric(riskmetric, dates)
+
+
 def get_risk_metric(
     historical_data: pd.DataFrame,
     optimizations: RiskMetricOptimizations,
     start_date: pd.Timestamp,
     end_date: pd.Timestamp,
+    dates: pd.DatetimeIndex = None,
+) -> RiskMetric:
+    """Get risk metric calculated from the historical data and optimiztions data.
+    Its arrays are aligned to the dates, by default to the dates of the risk metric itself.
+    """
+    return get_risk_metrics(historical_data, [optimizations], start_date, end_date, dates)[0]
+
+
+def get_risk_metrics(
+    historical_data: pd.DataFrame,
+    optimizations_list: list[RiskMetricOptimizations],
+    start_date: pd.Timestamp,
+    end_date: pd.Timestamp,
+    dates: pd.DatetimeIndex = None,
+) -> list[RiskMetric]:
+    """Get risk metrics of all the optimizations, in the same order. The moving averages
+    and the optimization factors are calculated only once for all of them.
+
+    The whole calculated risk metrics are cached, so other date ranges of the same data
+    are only sliced from them.
+    """
+    data_key = get_cache_key(historical_data)
+    keys = [
+        get_cache_key(data_key, optimizations, NO_DAYS_MA, NO_DAYS_24H_VOLUME, EXTREMA_ORDER)
+        for optimizations in optimizations_list
+    ]
+    calculated_dfs = {key: riskmetric_cache.get(key) for key in keys}
+    missing = {
+        key: optimizations
+        for key, optimizations in zip(keys, optimizations_list)
+        if calculated_dfs[key] is None
+    }
+    if missing:
+        df = historical_data.copy()
+        df["price"] = get_price(df)
+        for key, calculated_df in zip(missing, _calculate_risk_metrics(df, missing.values())):
+            calculated_dfs[key] = calculated_df
+            riskmetric_cache.put(key, calculated_df)
+
+    riskmetrics = []
+    for key in keys:
+        riskmetric_df = calculated_dfs[key][start_date:end_date]
+        riskmetrics.append(
+            RiskMetric(riskmetric_df, riskmetric_df.index if dates is None else dates)
+        )
+    return riskmetrics
+
+
+def get_price(historical_data: pd.DataFrame) -> pd.Series:
+    """Get the price the risk metric is calculated from."""
+    # When using the Binance data we need to use the close column accordingly.
+    if "close" in historical_data:
+        return historical_data["close"]
+    # When using total market capitalization we need to use its column accordingly.
+    if "total_marketcap" in historical_data:
+        return historical_data["total_marketcap"]
+    return historical_data["price"]
+
+
+def get_risk_metrics_of_windows(
+    historical_data: pd.DataFrame,
+    window_pairs: list[tuple[int, int]],
+    start_date: pd.Timestamp,
+    end_date: pd.Timestamp,
+    optimizations: RiskMetricOptimizations = RiskMetricOptimizations(),
 ) -> pd.DataFrame:
-    """Get risk metric dataframe calculated from the historical data and optimiztions data."""
-    df = historical_data.copy()
-    # When using total market capitalization we need to change the column name accordingly.
-    if "total_marketcap" in df:
-        df["price"] = df["total_marketcap"]
-    # When using the Binance data we need to change the column name accordingly.
-    if "close" in df:
-        df["price"] = df["close"]
-    riskmetric_df = _calculate_risk_metric(df, optimizations)
-    return riskmetric_df[start_date:end_date]
-
-
-def _calculate_risk_metric(df: pd.DataFrame, optimizations: RiskMetricOptimizations):
-    # General MA risk metric
+    """Get the risk metrics of the (short, long) moving average window pairs, one column
+    per pair and one row per date, with NaN where the risk metric is unknown.
+
+    The moving averages of all the windows are calculated from one cumulative sum of
+    the prices, so they can differ from the ones of get_risk_metric() in the last digits.
+    """
+    dates = historical_data.index
+    windows = sorted({window for window_pair in window_pairs for window in window_pair})
+    moving_averages = _get_moving_averages(get_price(historical_data).to_numpy(), windows)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        risk = np.column_stack(
+            [moving_averages[short] / moving_averages[long] for short, long in window_pairs]
+        )
+    risk = pd.DataFrame(
+        risk,
+        index=dates,
+        columns=pd.MultiIndex.from_tuples(window_pairs, names=["short_window", "long_window"]),
+    )
+
+    if optimizations.diminishing_returns:
+        risk = risk.mul(_get_days_log(dates).reindex(dates), axis=0)
+    if optimizations.daily_volume_correlation:
+        daily_volume = _get_normalized_daily_volume(historical_data).reindex(dates)
+        risk = _normalize(risk).add((daily_volume - 0.5) * 0.2, axis=0)
+    return _normalize(risk)[start_date:end_date]
+
+
+def _get_moving_averages(prices: npt.NDArray[float], windows: list[int]):
+    """Get the moving averages of the windows, with at least one price in the window."""
+    prices = prices.astype(np.float64)
+    known = ~np.isnan(prices)
+    # Prices are summed relative to their mean, which keeps the rounding errors of the sums low
+    center = prices[known].mean() if known.any() else 0.0
+    sums = np.concatenate([[0.0], np.cumsum(np.where(known, prices - center, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(known)])
+
+    ends = np.arange(1, prices.size + 1)
+    moving_averages = {}
+    for window in windows:
+        starts = np.maximum(ends - window, 0)
+        window_counts = counts[ends] - counts[starts]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moving_average = center + (sums[ends] - sums[starts]) / window_counts
+        moving_averages[window] = np.where(window_counts > 0, moving_average, np.nan)
+    return moving_averages
+
+
+def _calculate_risk_metrics(df: pd.DataFrame, optimizations_list) -> list[pd.DataFrame]:
+    # General MA risk metric, shared by all the optimizations
     df["MA_short"] = df["price"].rolling(NO_DAYS_MA, min_periods=1).mean().dropna()
     df["MA_long"] = df["price"].rolling(NO_DAYS_MA * 7, min_periods=1).mean().dropna()
     df["risk"] = df["MA_short"] / df["MA_long"]
 
-    if optimizations.diminishing_returns:
-        df = _calculate_dim_returns(df)
+    optimizations_list = list(optimizations_list)
+    if any(optimizations.diminishing_returns for optimizations in optimizations_list):
+        days_log = _get_days_log(df.index)
+    if any(optimizations.daily_volume_correlation for optimizations in optimizations_list):
+        daily_volume = _get_normalized_daily_volume(df)
 
-    if optimizations.daily_volume_correlation:
-        df = _calculate_daily_volume_correlation(df)
+    riskmetric_dfs = []
+    for optimizations in optimizations_list:
+        optimized_df = df.copy()
+        if optimizations.diminishing_returns:
+            optimized_df["risk"] = optimized_df["risk"] * days_log
+        if optimizations.daily_volume_correlation:
+            optimized_df = _correlate_daily_volume(optimized_df, daily_volume)
+        riskmetric_dfs.append(_calculate_extrema(optimized_df))
+    return riskmetric_dfs
 
-    df["riskmetric"] = (df["risk"] - df["risk"].cummin()) / (
-        df["risk"].cummax() - df["risk"].cummin()
-    )
 
-    checked_values_after_before = 5
-    df["min"] = df.iloc[
-        argrelextrema(df.riskmetric.values, np.less_equal, order=checked_values_after_before)[0]
-    ]["riskmetric"]
-    df["max"] = df.iloc[
-        argrelextrema(df.riskmetric.values, np.greater_equal, order=checked_values_after_before)[0]
-    ]["riskmetric"]
-    df["min_real"] = df["min"].shift(checked_values_after_before)
-    df["max_real"] = df["max"].shift(checked_values_after_before)
+def _calculate_extrema(df: pd.DataFrame):
+    df["riskmetric"] = _normalize(df["risk"])
+
+    local_min, local_max = get_local_extrema(df["riskmetric"].to_numpy(), EXTREMA_ORDER)
+    df["min"] = df["riskmetric"].where(local_min)
+    df["max"] = df["riskmetric"].where(local_max)
+    df["min_real"] = df["min"].shift(EXTREMA_ORDER)
+    df["max_real"] = df["max"].shift(EXTREMA_ORDER)
 
     df = df[["riskmetric", "price", "min", "max", "min_real", "max_real"]]
     riskmetric_df = df[df["riskmetric"].notna()]
     return riskmetric_df
 
 
-def _calculate_dim_returns(df: pd.DataFrame):
-    start_d = (df["MA_short"].index.values[0] - FIRST_BITCOIN_EXCHANGE).days
-    end_d = (df["MA_short"].index.values[-1] - FIRST_BITCOIN_EXCHANGE).days
+def _get_days_log(dates: pd.DatetimeIndex) -> pd.Series:
+    """Get the logarithm of days since the first Bitcoin exchange, for diminishing returns."""
+    start_d = (dates.values[0] - FIRST_BITCOIN_EXCHANGE).days
+    end_d = (dates.values[-1] - FIRST_BITCOIN_EXCHANGE).days
     d = pd.Series(range(start_d, end_d + 1))
-    d.index = pd.date_range(start=df["price"].index.values[0], periods=d.size)
-    df["risk"] = df["risk"] * np.log(d)
-    return df
+    d.index = pd.date_range(start=dates.values[0], periods=d.size)
+    return np.log(d)
 
 
-def _calculate_daily_volume_correlation(df: pd.DataFrame):
+def _get_normalized_daily_volume(df: pd.DataFrame) -> pd.Series:
     lastdays = df["total_volume_24h"].rolling(NO_DAYS_24H_VOLUME).mean().dropna()
-    lastdays = (lastdays - lastdays.cummin()) / (lastdays.cummax() - lastdays.cummin())
-    df["risk"] = (df["risk"] - df["risk"].cummin()) / (df["risk"].cummax() - df["risk"].cummin())
-    df["risk"] = df["risk"] + ((lastdays - 0.5) * 0.2)
+    return _normalize(lastdays)
+
+
+def _correlate_daily_volume(df: pd.DataFrame, daily_volume: pd.Series):
+    df["risk"] = _normalize(df["risk"])
+    df["risk"] = df["risk"] + ((daily_volume - 0.5) * 0.2)
     return df
 
 
+def _normalize(values: Union[pd.Series, pd.DataFrame]):
+    """Normalize the values to the range of the values so far."""
+    return (values - values.cummin()) / (values.cummax() - values.cummin())
+
+
 def calculate_autots_prediction(
     historical_data: pd.DataFrame, start_date, end_date, forecast_length
 ):
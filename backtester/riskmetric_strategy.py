@@ -2,209 +2,159 @@
 Author: Marek Filip 2022
 
 File defining the risk metric strategy.
+
+The strategies are defined by tables of risk bucket edges and actions. The whole risk metric
+is mapped to the trading actions of every step before the simulation starts.
 """
 
+from abc import abstractmethod
+
+import numpy as np
+import numpy.typing as npt
+
+from .riskmetric_calculator import RiskMetric, align_risk_metric
+from .strategy import Strategy, get_extrema_actions
+from .utils import (
+    ACTION_BUY,
+    ACTION_BUY_PARTIAL,
+    ACTION_NONE,
+    ACTION_SELL,
+    ACTION_SELL_PARTIAL,
+    Portfolio,
+    TradingData,
+)
 
-import pandas as pd
+# Upper edges of the risk buckets, the last bucket holds the risk above the last edge
+RISK_EDGES = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
 
-from .strategy import Strategy
-from .utils import Portfolio, TradingData
+
+def get_risk_buckets(risk: npt.NDArray[float], risk_edges) -> npt.NDArray[int]:
+    """Map risk values to the indices of their buckets. Risk equal to an edge belongs
+    to the upper bucket and unknown risk to the last bucket.
+    """
+    return np.searchsorted(risk_edges, risk, side="right")
 
 
 class RiskMetricStrategy(Strategy):
     """Base risk metric strategy, that other risk strategies inherit from.
 
-    It accepts the riskmetric as its argument.
+    It accepts the riskmetric as its argument, either RiskMetric or its data frame, which is
+    aligned to the simulation steps. Subclasses define get_actions(), which maps
+    the risk metric to the action codes and values of every step. The risk bucket edges
+    can be passed as risk_edges.
     """
 
+    risk_edges = RISK_EDGES
+
     def __init__(self, data: TradingData, portfolio: Portfolio = None, *args, **kwargs):
         super().__init__(data, portfolio)
-        self.riskmetric = kwargs.get("riskmetric")
-
-        self.states = {
-            "sell": False,
-            0.9: False,
-            0.8: False,
-            0.7: False,
-            0.6: False,
-            0.5: False,
-            0.4: False,
-            0.3: False,
-            0.2: False,
-            0.1: False,
-        }
+        self.riskmetric = align_risk_metric(kwargs.get("riskmetric"), self.steps)
+        self.actions, self.action_values = self.get_actions(self.riskmetric, kwargs)
 
         self.buy()
 
-    def set_states(self, state_to_set):
-        self.states = {k: False for k in self.states}
-        self.states[state_to_set] = True
-        self.sold_state = False
-        self.bought_state = False
-        return self.states
+    @classmethod
+    @abstractmethod
+    def get_actions(cls, riskmetric: RiskMetric, kwargs: dict):
+        """Abstract method getting the action codes and values of every step from the risk
+        metric aligned to the steps and the strategy's keyword arguments.
+        """
+
+    @classmethod
+    def get_risk_buckets(cls, riskmetric: RiskMetric, kwargs: dict):
+        risk_edges = kwargs.get("risk_edges", cls.risk_edges)
+        return get_risk_buckets(riskmetric["riskmetric"], risk_edges)
 
     def execute_step(self):
         super().execute_step()
-        return self.states
+        self.execute_action(self.actions[self.i], self.action_values[self.i])
+
+    def get_event_steps(self):
+        return np.flatnonzero(self.actions != ACTION_NONE)
+
+    def get_action_arrays(self):
+        return self.actions, self.action_values
 
 
 class RiskMetricStrategyRiskLogic(RiskMetricStrategy):
-    """Risk metric strategy based on partially buying and selling during different risk."""
+    """Risk metric strategy based on partially buying and selling during different risk.
 
-    def execute_step(self):
-        super(RiskMetricStrategy, self).execute_step()
-        self.execute_risk_logic()
-
-    def execute_risk_logic(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            if not self.states[0.1]:
-                self.states = self.set_states(0.1)
-                self.buy()
-        elif risk < 0.2:
-            if not self.states[0.2]:
-                self.states = self.set_states(0.2)
-                self.buy()
-        elif risk < 0.3:
-            if not self.states[0.3]:
-                self.states = self.set_states(0.3)
-                self.buy()
-        elif risk < 0.4:
-            if not self.states[0.4]:
-                self.states = self.set_states(0.4)
-                self.buy()
-        elif risk < 0.5:
-            if not self.states[0.5]:
-                self.states = self.set_states(0.5)
-                self.buy()
-        elif risk < 0.6:
-            if not self.states[0.6]:
-                self.states = self.set_states(0.6)
-                self.buy()
-        elif risk < 0.7:
-            if not self.states[0.7]:
-                self.states = self.set_states(0.7)
-                self.buy_partial(100)
-        elif risk < 0.8:
-            if not self.states[0.8]:
-                self.states = self.set_states(0.8)
-                self.buy_partial(60)
-        elif risk < 0.9:
-            if not self.states[0.9]:
-                self.states = self.set_states(0.9)
-                self.buy_partial(30)
-        else:
-            if not self.states["sell"]:
-                self.states = self.set_states("sell")
-                self.sell()
+    The action of a risk bucket is executed when the risk enters the bucket. The actions
+    can be passed as risk_actions, one (action code, value) pair per bucket.
+    """
+
+    risk_actions = (
+        (ACTION_BUY, 0),
+        (ACTION_BUY, 0),
+        (ACTION_BUY, 0),
+        (ACTION_BUY, 0),
+        (ACTION_BUY, 0),
+        (ACTION_BUY, 0),
+        (ACTION_BUY_PARTIAL, 100),
+        (ACTION_BUY_PARTIAL, 60),
+        (ACTION_BUY_PARTIAL, 30),
+        (ACTION_SELL, 0),
+    )
+
+    @classmethod
+    def get_actions(cls, riskmetric: RiskMetric, kwargs: dict):
+        risk_actions = np.array(kwargs.get("risk_actions", cls.risk_actions))
+        buckets = cls.get_risk_buckets(riskmetric, kwargs)
+        entered = buckets != np.concatenate([[-1], buckets[:-1]])
+
+        actions = np.where(entered, risk_actions[buckets, 0].astype(int), ACTION_NONE)
+        action_values = np.where(entered, risk_actions[buckets, 1].astype(float), 0)
+        return actions, action_values
 
 
 class RiskMetricStrategyIdealExtrema(RiskMetricStrategy):
     """Risk metric strategy using the ideal risk function's extrema for its evaluation."""
 
-    def execute_step(self):
-        super(RiskMetricStrategy, self).execute_step()
-        self.execute_extrema_logic()
-
-    def execute_extrema_logic(self):
-        local_min = self.riskmetric.loc[self.current_step]["min"]
-        local_max = self.riskmetric.loc[self.current_step]["max"]
+    min_column = "min"
+    max_column = "max"
 
-        # We are at local minimum
-        if not pd.isnull(local_min):
-            self.buy()
-        # We are at local maximum
-        elif not pd.isnull(local_max):
-            self.sell()
+    @classmethod
+    def get_actions(cls, riskmetric: RiskMetric, kwargs: dict):
+        local_min = ~np.isnan(riskmetric[cls.min_column])
+        local_max = ~np.isnan(riskmetric[cls.max_column])
+        return get_extrema_actions(local_min, local_max)
 
 
-class RiskMetricStrategyRealExtrema(RiskMetricStrategy):
+class RiskMetricStrategyRealExtrema(RiskMetricStrategyIdealExtrema):
     """Risk metric strategy using the real (adjusted by several days) risk function's
     extrema for its evaluation.
     """
 
-    def execute_step(self):
-        super(RiskMetricStrategy, self).execute_step()
-        self.execute_extrema_logic()
-
-    def execute_extrema_logic(self):
-        local_min = self.riskmetric.loc[self.current_step]["min_real"]
-        local_max = self.riskmetric.loc[self.current_step]["max_real"]
-
-        # We are at local minimum
-        if not pd.isnull(local_min):
-            self.buy()
-        # We are at local maximum
-        elif not pd.isnull(local_max):
-            self.sell()
+    min_column = "min_real"
+    max_column = "max_real"
 
 
 class RiskMetricStrategyCombined(RiskMetricStrategy):
     """One of the combined strategies classes, showcasing findings when trying to combine
     the classic risk strategy with the extrema logic.
+
+    At the real extrema, the percentage of the risk bucket is partially bought or sold.
+    The percentages can be passed as buy_percentages and sell_percentages.
     """
 
-    def execute_step(self):
-        super(RiskMetricStrategy, self).execute_step()
-
-        local_min = self.riskmetric.loc[self.current_step]["min_real"]
-        local_max = self.riskmetric.loc[self.current_step]["max_real"]
-
-        # We are at local minimum
-        if not pd.isnull(local_min):
-            self.combined_buy()
-        # We are at local maximum
-        elif not pd.isnull(local_max):
-            self.combined_sell()
-
-    def combined_buy(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.buy_partial(100)
-        elif risk < 0.2:
-            self.buy_partial(100)
-        elif risk < 0.3:
-            self.buy_partial(100)
-        elif risk < 0.4:
-            self.buy_partial(100)
-        elif risk < 0.5:
-            self.buy_partial(100)
-        elif risk < 0.6:
-            self.buy_partial(100)
-        elif risk < 0.7:
-            self.buy_partial(100)
-        elif risk < 0.8:
-            self.buy_partial(80)
-        elif risk < 0.9:
-            self.buy_partial(60)
-        else:
-            self.buy_partial(40)
-
-    def combined_sell(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.sell_partial(40)
-        elif risk < 0.2:
-            self.sell_partial(60)
-        elif risk < 0.3:
-            self.sell_partial(80)
-        elif risk < 0.4:
-            self.sell_partial(100)
-        elif risk < 0.5:
-            self.sell_partial(100)
-        elif risk < 0.6:
-            self.sell_partial(100)
-        elif risk < 0.7:
-            self.sell_partial(100)
-        elif risk < 0.8:
-            self.sell_partial(100)
-        elif risk < 0.9:
-            self.sell_partial(100)
-        else:
-            self.sell_partial(100)
+    buy_percentages = (100, 100, 100, 100, 100, 100, 100, 80, 60, 40)
+    sell_percentages = (40, 60, 80, 100, 100, 100, 100, 100, 100, 100)
+
+    @classmethod
+    def get_actions(cls, riskmetric: RiskMetric, kwargs: dict):
+        buy_percentages = np.array(kwargs.get("buy_percentages", cls.buy_percentages))
+        sell_percentages = np.array(kwargs.get("sell_percentages", cls.sell_percentages))
+        buckets = cls.get_risk_buckets(riskmetric, kwargs)
+        local_min = ~np.isnan(riskmetric["min_real"])
+        local_max = ~np.isnan(riskmetric["max_real"])
+
+        actions = np.select(
+            [local_min, local_max], [ACTION_BUY_PARTIAL, ACTION_SELL_PARTIAL], ACTION_NONE
+        )
+        action_values = np.select(
+            [local_min, local_max], [buy_percentages[buckets], sell_percentages[buckets]], 0
+        ).astype(float)
+        return actions, action_values
 
 
 class RiskMetricStrategyCombined2(RiskMetricStrategyCombined):
@@ -212,53 +162,8 @@ class RiskMetricStrategyCombined2(RiskMetricStrategyCombined):
     the classic risk strategy with the extrema logic.
     """
 
-    def combined_buy(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.buy_partial(100)
-        elif risk < 0.2:
-            self.buy_partial(100)
-        elif risk < 0.3:
-            self.buy_partial(100)
-        elif risk < 0.4:
-            self.buy_partial(100)
-        elif risk < 0.5:
-            self.buy_partial(100)
-        elif risk < 0.6:
-            self.buy_partial(100)
-        elif risk < 0.7:
-            self.buy_partial(100)
-        elif risk < 0.8:
-            self.buy_partial(100)
-        elif risk < 0.9:
-            self.buy_partial(100)
-        else:
-            self.buy_partial(100)
-
-    def combined_sell(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.sell_partial(40)
-        elif risk < 0.2:
-            self.sell_partial(60)
-        elif risk < 0.3:
-            self.sell_partial(80)
-        elif risk < 0.4:
-            self.sell_partial(100)
-        elif risk < 0.5:
-            self.sell_partial(100)
-        elif risk < 0.6:
-            self.sell_partial(100)
-        elif risk < 0.7:
-            self.sell_partial(100)
-        elif risk < 0.8:
-            self.sell_partial(100)
-        elif risk < 0.9:
-            self.sell_partial(100)
-        else:
-            self.sell_partial(100)
+    buy_percentages = (100, 100, 100, 100, 100, 100, 100, 100, 100, 100)
+    sell_percentages = (40, 60, 80, 100, 100, 100, 100, 100, 100, 100)
 
 
 class RiskMetricStrategyCombined3(RiskMetricStrategyCombined):
@@ -266,50 +171,5 @@ class RiskMetricStrategyCombined3(RiskMetricStrategyCombined):
     the classic risk strategy with the extrema logic.
     """
 
-    def combined_buy(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.buy_partial(100)
-        elif risk < 0.2:
-            self.buy_partial(100)
-        elif risk < 0.3:
-            self.buy_partial(100)
-        elif risk < 0.4:
-            self.buy_partial(100)
-        elif risk < 0.5:
-            self.buy_partial(100)
-        elif risk < 0.6:
-            self.buy_partial(100)
-        elif risk < 0.7:
-            self.buy_partial(100)
-        elif risk < 0.8:
-            self.buy_partial(80)
-        elif risk < 0.9:
-            self.buy_partial(60)
-        else:
-            self.buy_partial(40)
-
-    def combined_sell(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-
-        if risk < 0.1:
-            self.sell_partial(100)
-        elif risk < 0.2:
-            self.sell_partial(100)
-        elif risk < 0.3:
-            self.sell_partial(100)
-        elif risk < 0.4:
-            self.sell_partial(100)
-        elif risk < 0.5:
-            self.sell_partial(100)
-        elif risk < 0.6:
-            self.sell_partial(100)
-        elif risk < 0.7:
-            self.sell_partial(100)
-        elif risk < 0.8:
-            self.sell_partial(100)
-        elif risk < 0.9:
-            self.sell_partial(100)
-        else:
-            self.sell_partial(100)
+    buy_percentages = (100, 100, 100, 100, 100, 100, 100, 80, 60, 40)
+    sell_percentages = (100, 100, 100, 100, 100, 100, 100, 100, 100, 100)
@@ -0,0 +1,183 @@
+"""
+Author: Marek Filip 2022
+
+Module for sharing the trading data arrays between processes through shared memory.
+
+Arrays are copied into shared memory once in the main process. Only the names of the shared
+memory blocks together with shapes and indices are pickled and sent to the worker processes.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from .riskmetric_calculator import RiskMetric
+from .utils import TradingData
+
+
+class SharedArray:
+    """NumPy array placed in shared memory. Pickling it sends only its name, shape and dtype."""
+
+    def __init__(self, array: npt.NDArray):
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.name = self.shm.name
+        np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)[...] = array
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Worker processes share the resource tracker of the main process, which unlinks
+        # the memory block in the end
+        self.shm = shared_memory.SharedMemory(name=self.name)
+
+    def get_array(self) -> npt.NDArray:
+        array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+        array.flags.writeable = False
+        return array
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedIndex:
+    """Index whose dates and MultiIndex codes are kept in shared memory. Other levels, such
+    as the pairs, are small and pickled together with the names.
+    """
+
+    def __init__(self, index: pd.Index):
+        self.names = list(index.names)
+        if isinstance(index, pd.MultiIndex):
+            self.codes = [SharedArray(codes) for codes in index.codes]
+            self.levels = [share_level(level) for level in index.levels]
+        else:
+            self.codes = None
+            self.levels = [share_level(index)]
+
+    def get_index(self) -> pd.Index:
+        levels = [get_level(level) for level in self.levels]
+        if self.codes is None:
+            return levels[0].rename(self.names[0])
+        return pd.MultiIndex(
+            levels=levels,
+            codes=[codes.get_array() for codes in self.codes],
+            names=self.names,
+            verify_integrity=False,
+        )
+
+    def unlink(self):
+        for array in [*(self.codes or []), *self.levels]:
+            if isinstance(array, SharedArray):
+                array.unlink()
+
+
+def share_level(level: pd.Index):
+    """Place the naive dates in shared memory as int64 nanoseconds, keep other levels."""
+    if isinstance(level, pd.DatetimeIndex) and level.tz is None:
+        return SharedArray(level.asi8)
+    return level
+
+
+def get_level(level) -> pd.Index:
+    if isinstance(level, SharedArray):
+        return pd.DatetimeIndex(level.get_array().view("datetime64[ns]"))
+    return level
+
+
+class SharedFrame:
+    """Data frame of numeric columns whose values and index are kept in shared memory."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = SharedIndex(df.index)
+        self.columns = df.columns
+        self.values = SharedArray(df.to_numpy(dtype=np.float64))
+
+    def get_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            self.values.get_array(), index=self.index.get_index(), columns=self.columns
+        )
+
+    def unlink(self):
+        self.values.unlink()
+        self.index.unlink()
+
+
+class SharedTradingData:
+    """Trading data whose data frames, panels and close matrix are kept in shared memory."""
+
+    def __init__(self, trading_data: TradingData):
+        self.frames = {
+            name: SharedFrame(getattr(trading_data, name))
+            for name in ["data", "global_metrics", "btc_historical"]
+            if getattr(trading_data, name) is not None
+        }
+        self.panels = {name: SharedFrame(panel) for name, panel in trading_data.panels.items()}
+        self.close_values = SharedArray(trading_data.close_values)
+        self.pair_columns = trading_data.pair_columns
+        self.symbols = trading_data.symbols
+        self.dates = trading_data.dates
+        self.variables = trading_data.variables
+
+    def get_trading_data(self) -> TradingData:
+        """Rebuild trading data on top of the shared memory, without recomputing the
+        panels and the close matrix.
+        """
+        frames = {name: frame.get_frame() for name, frame in self.frames.items()}
+        trading_data = TradingData(
+            None,
+            frames.get("global_metrics"),
+            frames.get("btc_historical"),
+            self.symbols,
+            self.dates,
+            self.variables,
+        )
+        object.__setattr__(trading_data, "data", frames.get("data"))
+        trading_data.panels = {name: panel.get_frame() for name, panel in self.panels.items()}
+        trading_data.close_values = self.close_values.get_array()
+        trading_data.pair_columns = self.pair_columns
+        return trading_data
+
+    def unlink(self):
+        for frame in [*self.frames.values(), *self.panels.values()]:
+            frame.unlink()
+        self.close_values.unlink()
+
+
+def share_data_frames_in_kwargs(kwargs: dict, shared_frames: dict) -> dict:
+    """Replace data frames in strategy keyword arguments by shared frames. Frames already
+    shared, such as a risk metric passed to several strategies, are reused. Risk metrics are
+    shared as their data frames, strategies align them to the steps again.
+    """
+    shared_kwargs = {}
+    for key, value in kwargs.items():
+        if isinstance(value, RiskMetric):
+            value = value.df
+        if isinstance(value, pd.DataFrame):
+            if id(value) not in shared_frames:
+                shared_frames[id(value)] = SharedFrame(value)
+            value = shared_frames[id(value)]
+        shared_kwargs[key] = value
+    return shared_kwargs
+
+
+# Frames attached in the current process, they are kept alive as long as the process runs
+_attached_frames: dict[str, tuple[SharedFrame, pd.DataFrame]] = {}
+
+
+def restore_data_frames_in_kwargs(kwargs: dict) -> dict:
+    """Replace shared frames in strategy keyword arguments by data frames."""
+    restored_kwargs = {}
+    for key, value in kwargs.items():
+        if isinstance(value, SharedFrame):
+            if value.values.name not in _attached_frames:
+                _attached_frames[value.values.name] = (value, value.get_frame())
+            _, value = _attached_frames[value.values.name]
+        restored_kwargs[key] = value
+    return restored_kwargs
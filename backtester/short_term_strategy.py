@@ -7,11 +7,76 @@ File defining the short term strategy.
 
 import numpy as np
 import pandas as pd
-from scipy.signal import argrelextrema
 
 from .api_downloader import get_data
-from .strategy import Strategy
-from .utils import Portfolio, TradingData, get_symbols_from_index
+from .cache import FrameCache, get_cache_key
+from .extrema import get_local_extrema
+from .riskmetric_calculator import RiskMetric
+from .strategy import Strategy, get_extrema_actions
+from .utils import Portfolio, TradingData
+
+SHORT_TERM_MA_WINDOW = 288 * 1 // 4  # Number of 5 minute candles of the moving average
+SHORT_TERM_EXTREMA_ORDER = 3  # Number of values before and after checked for the local extrema
+
+# Whole calculated short term metrics, keyed by the 5 minute data arguments and the calculation
+# parameters, so that the data do not need to be loaded when the metric is cached
+short_term_metric_cache = FrameCache("short_term_metric", max_memory_entries=4)
+
+
+def get_short_term_metric(ticker: str) -> pd.DataFrame:
+    """Get the short term metric of the ticker's whole 5 minute data. It is calculated once
+    and shared by all the short term strategies and plots through the cache.
+    """
+    args = {
+        "ticker": ticker,
+        "start_date": pd.Timestamp("2017-01-01"),
+        "end_date": pd.Timestamp("2022-05-01"),
+        "interval": "5m",
+    }
+    key = get_cache_key(args, SHORT_TERM_MA_WINDOW, SHORT_TERM_EXTREMA_ORDER)
+    riskmetric_df = short_term_metric_cache.get(key)
+    if riskmetric_df is None:
+        riskmetric_df = calculate_short_term_metric(get_data(args))
+        short_term_metric_cache.put(key, riskmetric_df)
+    return riskmetric_df
+
+
+def calculate_short_term_metric(data_5m: pd.DataFrame) -> pd.DataFrame:
+    """Calculate the short term metric of the whole 5 minute data."""
+    df = data_5m.copy()
+    df["price"] = df["close"]
+
+    df["risk"] = df["price"].rolling(SHORT_TERM_MA_WINDOW, min_periods=1).mean().dropna()
+    df["riskmetric"] = df["risk"]
+
+    local_min, local_max = get_local_extrema(df["riskmetric"].to_numpy(), SHORT_TERM_EXTREMA_ORDER)
+    df["min_plot"] = df["risk"].where(local_min)
+    df["max_plot"] = df["risk"].where(local_max)
+
+    df["riskmetric"] = (df["risk"] - df["risk"].cummin()) / (
+        df["risk"].cummax() - df["risk"].cummin()
+    )
+
+    local_min, local_max = get_local_extrema(df["riskmetric"].to_numpy(), SHORT_TERM_EXTREMA_ORDER)
+    df["min"] = df["riskmetric"].where(local_min)
+    df["max"] = df["riskmetric"].where(local_max)
+    df["min_real"] = df["min"].shift(SHORT_TERM_EXTREMA_ORDER)
+    df["max_real"] = df["max"].shift(SHORT_TERM_EXTREMA_ORDER)
+
+    df = df[
+        [
+            "risk",
+            "riskmetric",
+            "price",
+            "min",
+            "max",
+            "min_real",
+            "max_real",
+            "min_plot",
+            "max_plot",
+        ]
+    ]
+    return df[df["riskmetric"].notna()]
 
 
 class ShortTermStrategyIdeal(Strategy):
@@ -23,69 +88,17 @@ class ShortTermStrategyIdeal(Strategy):
 
     def __init__(self, data: TradingData, portfolio: Portfolio = None, *args, **kwargs):
         super().__init__(data, portfolio)
-        self.riskmetric = self.compute_metric()
+        self.riskmetric = RiskMetric(self.compute_metric(), self.steps)
         self.buy()
 
     def compute_metric(self):
-        args = {
-            "ticker": next(iter(get_symbols_from_index(self.data))),
-            "start_date": pd.Timestamp("2017-01-01"),
-            "end_date": pd.Timestamp("2022-05-01"),
-            "interval": "5m",
-        }
-        data_5m = get_data(args)
-        df = data_5m.copy()
-        df["price"] = df["close"]
-
-        df["risk"] = df["price"].rolling(288 * 1 // 4, min_periods=1).mean().dropna()
-        df["riskmetric"] = df["risk"]
-
-        checked_values_after_before = 3
-        df["min_plot"] = df.iloc[
-            argrelextrema(df.riskmetric.values, np.less_equal, order=checked_values_after_before)[0]
-        ]["risk"]
-        df["max_plot"] = df.iloc[
-            argrelextrema(
-                df.riskmetric.values, np.greater_equal, order=checked_values_after_before
-            )[0]
-        ]["risk"]
-
-        df["riskmetric"] = (df["risk"] - df["risk"].cummin()) / (
-            df["risk"].cummax() - df["risk"].cummin()
-        )
-
-        checked_values_after_before = 3
-        df["min"] = df.iloc[
-            argrelextrema(df.riskmetric.values, np.less_equal, order=checked_values_after_before)[0]
-        ]["riskmetric"]
-        df["max"] = df.iloc[
-            argrelextrema(
-                df.riskmetric.values, np.greater_equal, order=checked_values_after_before
-            )[0]
-        ]["riskmetric"]
-        df["min_real"] = df["min"].shift(checked_values_after_before)
-        df["max_real"] = df["max"].shift(checked_values_after_before)
-
-        df = df[
-            [
-                "risk",
-                "riskmetric",
-                "price",
-                "min",
-                "max",
-                "min_real",
-                "max_real",
-                "min_plot",
-                "max_plot",
-            ]
-        ]
-        riskmetric_df = df[df["riskmetric"].notna()]
+        riskmetric_df = get_short_term_metric(next(iter(self.pair_columns)))
         return riskmetric_df[self.steps[0] : self.steps[-1]]
 
     def execute_step(self):
         super().execute_step()
-        local_min = self.riskmetric.loc[self.current_step]["min"]
-        local_max = self.riskmetric.loc[self.current_step]["max"]
+        local_min = self.riskmetric["min"][self.i]
+        local_max = self.riskmetric["max"][self.i]
 
         # We are at local minimum
         if not pd.isnull(local_min):
@@ -94,6 +107,17 @@ class ShortTermStrategyIdeal(Strategy):
         elif not pd.isnull(local_max):
             self.sell()
 
+    def get_event_steps(self):
+        return self.get_signal_steps(self.riskmetric["min"], self.riskmetric["max"])
+
+    def get_action_arrays(self):
+        return self.get_extrema_action_arrays("min", "max")
+
+    def get_extrema_action_arrays(self, min_column: str, max_column: str):
+        local_min = ~np.isnan(self.riskmetric[min_column])
+        local_max = ~np.isnan(self.riskmetric[max_column])
+        return get_extrema_actions(local_min, local_max)
+
 
 class ShortTermStrategyReal(ShortTermStrategyIdeal):
     """Class for Short-term strategy simulation. This class uses realistic local extrema for
@@ -102,8 +126,8 @@ class ShortTermStrategyReal(ShortTermStrategyIdeal):
 
     def execute_step(self):
         super(ShortTermStrategyIdeal, self).execute_step()
-        local_min = self.riskmetric.loc[self.current_step]["min_real"]
-        local_max = self.riskmetric.loc[self.current_step]["max_real"]
+        local_min = self.riskmetric["min_real"][self.i]
+        local_max = self.riskmetric["max_real"][self.i]
 
         # We are at local minimum
         if not pd.isnull(local_min):
@@ -112,6 +136,12 @@ class ShortTermStrategyReal(ShortTermStrategyIdeal):
         elif not pd.isnull(local_max):
             self.sell()
 
+    def get_event_steps(self):
+        return self.get_signal_steps(self.riskmetric["min_real"], self.riskmetric["max_real"])
+
+    def get_action_arrays(self):
+        return self.get_extrema_action_arrays("min_real", "max_real")
+
 
 class ShortTermStrategyAdjusted(ShortTermStrategyIdeal):
     """Class for Short-term strategy simulation. This class uses more custom computation of
@@ -121,18 +151,14 @@ class ShortTermStrategyAdjusted(ShortTermStrategyIdeal):
 
     def __init__(self, data: TradingData, portfolio: Portfolio = None, *args, **kwargs):
         super().__init__(data, portfolio, *args, **kwargs)
-        self.last_action_risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-        self.last_action_price = self.data.loc[("BTCUSDT", self.current_step), "close"]
-        self.riskmetric = self.compute_metric()
+        self.last_action_risk = self.riskmetric["riskmetric"][self.i]
+        self.last_action_price = self.get_close_value("BTCUSDT")
         self.risks = []
         self.is_rising = False
         self.is_falling = False
 
         self.execute_empty_step()
-        if (
-            self.riskmetric.loc[self.steps[self.i]]["riskmetric"]
-            > self.riskmetric.loc[self.steps[0]]["riskmetric"]
-        ):
+        if self.riskmetric["riskmetric"][self.i] > self.riskmetric["riskmetric"][0]:
             self.is_rising = True
         else:
             self.is_falling = True
@@ -141,10 +167,18 @@ class ShortTermStrategyAdjusted(ShortTermStrategyIdeal):
         super(ShortTermStrategyIdeal, self).execute_step()
         self.execute_risk_logic()
 
+    def get_event_steps(self):
+        # The risks of every step are needed for the logic
+        return None
+
+    def get_action_arrays(self):
+        return None
+
     def execute_empty_step(self):
         self.log_profits()
+        # current_step is not moved, the risk of the skipped step is recorded
+        risk = self.riskmetric["riskmetric"][self.i]
         self.i += 1
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
         self.risks.append(risk)
 
     @staticmethod
@@ -168,11 +202,7 @@ class ShortTermStrategyAdjusted(ShortTermStrategyIdeal):
         )
 
     def execute_risk_logic(self):
-        risk = self.riskmetric.loc[self.current_step]["riskmetric"]
-        self.get_close_value("BTCUSDT")
-
-        self.riskmetric.loc[self.current_step]["min_real"]
-        self.riskmetric.loc[self.current_step]["max_real"]
+        risk = self.riskmetric["riskmetric"][self.i]
 
         # We are at local minimum
         if self.is_value_larger_than_last_list(risk, self.risks, n=1) and self.is_risk_lowering(
@@ -180,13 +210,13 @@ class ShortTermStrategyAdjusted(ShortTermStrategyIdeal):
         ):
             self.buy()
             self.last_action_risk = risk
-            self.last_action_price = self.data.loc[("BTCUSDT", self.current_step), "close"]
+            self.last_action_price = self.get_close_value("BTCUSDT")
         # We are at local maximum
         if self.is_value_smaller_than_last_list(risk, self.risks, n=1) and self.is_risk_rising(n=5):
             if abs(self.last_action_risk - risk) < 0.001:
                 return
             self.sell()
             self.last_action_risk = risk
-            self.last_action_price = self.data.loc[("BTCUSDT", self.current_step), "close"]
+            self.last_action_price = self.get_close_value("BTCUSDT")
 
         self.risks.append(risk)
@@ -5,23 +5,31 @@ File for orchestrating the various strategies in play.
 """
 
 import logging
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 
+from .cache import get_cache_directory, set_cache_directory
 from .hodl_strategy import HodlStrategy
 from .plotter import Plotter
 from .rebalance_strategy import RebalanceStrategy
-from .riskmetric_calculator import RiskMetricOptimizations, get_risk_metric
+from .riskmetric_calculator import RiskMetricOptimizations, get_risk_metrics
 from .riskmetric_strategy import RiskMetricStrategyRealExtrema
+from .shared_trading_data import (
+    SharedTradingData,
+    restore_data_frames_in_kwargs,
+    share_data_frames_in_kwargs,
+)
 from .short_term_strategy import (
     ShortTermStrategyAdjusted,
     ShortTermStrategyIdeal,
     ShortTermStrategyReal,
+    get_short_term_metric,
 )
 from .strategy import Strategy
 from .utils import (
     BTC_SYMBOL,
     Portfolio,
-    StrategyResult,
     TradingData,
     create_portfolio_from_data,
     get_historical_data_if_btc_is_only_coin_considered,
@@ -94,17 +102,11 @@ def showcase_all_metrics(trading_data: TradingData):
         diminishing_returns=True, daily_volume_correlation=True
     )
 
-    riskmetric = get_risk_metric(
-        historical_data_used, optimizations, trading_data.dates[0], trading_data.dates[-1]
-    )
-    riskmetric_dim = get_risk_metric(
-        historical_data_used, optimizations_dim, trading_data.dates[0], trading_data.dates[-1]
-    )
-    riskmetric_vol = get_risk_metric(
-        historical_data_used, optimizations_vol, trading_data.dates[0], trading_data.dates[-1]
-    )
-    riskmetric_dim_vol = get_risk_metric(
-        historical_data_used, optimizations_dim_vol, trading_data.dates[0], trading_data.dates[-1]
+    riskmetric, riskmetric_dim, riskmetric_vol, riskmetric_dim_vol = get_risk_metrics(
+        historical_data_used,
+        [optimizations, optimizations_dim, optimizations_vol, optimizations_dim_vol],
+        trading_data.dates[0],
+        trading_data.dates[-1],
     )
 
     plotter = Plotter(
@@ -114,11 +116,13 @@ def showcase_all_metrics(trading_data: TradingData):
         y_title="Price in $USD",
     )
     plotter.plot_historical_btc()
-    plotter.plot_riskmetric_on_second_scale(riskmetric, name="riskmetric - no optimizations")
-    plotter.plot_riskmetric_on_second_scale(riskmetric_dim, name="riskmetric + dim returns")
-    plotter.plot_riskmetric_on_second_scale(riskmetric_vol, name="riskmetric + 24 vol correlation")
+    plotter.plot_riskmetric_on_second_scale(riskmetric.df, name="riskmetric - no optimizations")
+    plotter.plot_riskmetric_on_second_scale(riskmetric_dim.df, name="riskmetric + dim returns")
+    plotter.plot_riskmetric_on_second_scale(
+        riskmetric_vol.df, name="riskmetric + 24 vol correlation"
+    )
     plotter.plot_riskmetric_on_second_scale(
-        riskmetric_dim_vol, name="riskmetric + dim returns + 24 vol corr"
+        riskmetric_dim_vol.df, name="riskmetric + dim returns + 24 vol corr"
     )
 
     plotter.plot_log_y_first_axis()
@@ -133,14 +137,12 @@ def showcase_strategies_longterm(trading_data: TradingData):
     optimizations_dim = RiskMetricOptimizations(
         diminishing_returns=True, daily_volume_correlation=False
     )
-    riskmetric = get_risk_metric(
-        trading_data.btc_historical, optimizations, trading_data.dates[0], trading_data.dates[-1]
-    )
-    riskmetric_dim = get_risk_metric(
+    riskmetric, riskmetric_dim = get_risk_metrics(
         trading_data.btc_historical,
-        optimizations_dim,
+        [optimizations, optimizations_dim],
         trading_data.dates[0],
         trading_data.dates[-1],
+        trading_data.dates,
     )
 
     strategy_list = [
@@ -150,10 +152,12 @@ def showcase_strategies_longterm(trading_data: TradingData):
         [RiskMetricStrategyRealExtrema, {"riskmetric": riskmetric_dim}],
     ]
     portfolio = create_portfolio_from_data(
-        trading_data, cash=trading_data.data.loc[(BTC_SYMBOL, trading_data.dates[0]), "close"]
+        trading_data, cash=trading_data.panels["close"][BTC_SYMBOL].iloc[0]
     )
 
-    simgen = StrategyGenerator(strategy_list, trading_data, portfolio)
+    simgen = StrategyGenerator(
+        strategy_list, trading_data, portfolio, workers=trading_data.variables.workers
+    )
     simgen.run()
     results = simgen.get_results()
 
@@ -182,10 +186,15 @@ def showcase_strategies_shortterm(trading_data: TradingData):
         [ShortTermStrategyAdjusted],
     ]
     portfolio = create_portfolio_from_data(
-        trading_data, cash=trading_data.data.loc[(BTC_SYMBOL, trading_data.dates[0]), "close"]
+        trading_data, cash=trading_data.panels["close"][BTC_SYMBOL].iloc[0]
     )
+    # Calculated before the strategies, which then share it through the cache
+    short_strat_riskmetric = get_short_term_metric(next(iter(trading_data.pair_columns)))
+    short_strat_riskmetric = short_strat_riskmetric[trading_data.dates[0] : trading_data.dates[-1]]
 
-    simgen = StrategyGenerator(strategy_list, trading_data, portfolio)
+    simgen = StrategyGenerator(
+        strategy_list, trading_data, portfolio, workers=trading_data.variables.workers
+    )
     simgen.run()
     results = simgen.get_results()
 
@@ -195,7 +204,6 @@ def showcase_strategies_shortterm(trading_data: TradingData):
         x_title=f"{trading_data.variables.interval_str} steps",
         y_title="Profits in $USD",
     )
-    short_strat_riskmetric = ShortTermStrategyIdeal(trading_data).riskmetric
 
     plotter.plot_riskmetric_on_second_scale(
         short_strat_riskmetric,
@@ -218,32 +226,119 @@ def showcase_strategies_shortterm(trading_data: TradingData):
 class StrategyGenerator:
     """Class used to aggregate several classes under one common interface, sharing
     the data and portfolio without having to retype it every time.
+
+    With more than one worker, the strategies are instantiated and run in a process pool,
+    the trading data are shared with the workers through shared memory.
     """
 
     def __init__(
-        self, strategy_classes: list[list[Strategy, dict]], data: TradingData, portfolio=None
+        self,
+        strategy_classes: list[list[Strategy, dict]],
+        data: TradingData,
+        portfolio=None,
+        vectorized=True,
+        event_driven=True,
+        deferred_profits=False,
+        workers=1,
+        compiled=True,
     ):
+        if workers < 1:
+            raise ValueError(f"Number of workers must be at least 1, got {workers}")
+        self.data = data
+        self.strategy_classes = strategy_classes
+        self.vectorized = vectorized
+        self.event_driven = event_driven
+        self.compiled = compiled
+        self.deferred_profits = deferred_profits
+        self.workers = workers
+        self.results = None
         self.base_portfolio = portfolio
         if self.base_portfolio is None:
             self.base_portfolio = create_portfolio_from_data(data)
-        self.strategies = get_strategy_instances_from_classes_and_kwargs(
-            strategy_classes, data, self.base_portfolio
-        )
+
+        self.strategies = ()
+        if self.workers == 1:
+            self.strategies = get_strategy_instances_from_classes_and_kwargs(
+                strategy_classes, data, self.base_portfolio
+            )
+            for strategy in self.strategies:
+                strategy.deferred_profits = strategy.deferred_profits or deferred_profits
 
     def run(self):
+        if self.workers > 1:
+            self.run_in_parallel()
+            return
+
         for strategy in self.strategies:
-            strategy.run_simulation()
+            strategy.run(self.vectorized, self.event_driven, self.compiled)
             # logging.info(f"{strategy.name}: {strategy.profits_in_time[-1]}")
             logging.info(strategy.stats())
 
-    def get_results(self):
-        results = []
-        for strategy in self.strategies:
-            result = StrategyResult(
-                strategy.name, strategy.profits_in_time, strategy.bought_dates, strategy.sold_dates
+    def run_in_parallel(self):
+        """Run the strategies across a pool of processes, each returning only its result."""
+        shared_data = SharedTradingData(self.data)
+        shared_frames = {}
+        try:
+            tasks = []
+            for cls_and_kwargs in self.strategy_classes:
+                kwargs = cls_and_kwargs[1] if len(cls_and_kwargs) == 2 else {}
+                shared_kwargs = share_data_frames_in_kwargs(kwargs, shared_frames)
+                tasks.append([cls_and_kwargs[0], shared_kwargs])
+
+            run_strategy = partial(
+                _run_strategy_in_worker,
+                portfolio=self.base_portfolio,
+                run_options=(
+                    self.vectorized,
+                    self.event_driven,
+                    self.compiled,
+                    self.deferred_profits,
+                ),
             )
-            results.append(result)
-        return results
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_strategy_worker,
+                initargs=(shared_data, get_cache_directory()),
+            ) as executor:
+                outputs = list(executor.map(run_strategy, tasks))
+        finally:
+            shared_data.unlink()
+            for shared_frame in shared_frames.values():
+                shared_frame.unlink()
+
+        self.results = []
+        for result, stats in outputs:
+            logging.info(stats)
+            self.results.append(result)
+
+    def get_results(self):
+        if self.results is not None:
+            return self.results
+        return [strategy.get_result() for strategy in self.strategies]
+
+
+# Trading data of the current worker process of StrategyGenerator.run_in_parallel()
+_worker_shared_data: SharedTradingData = None
+_worker_trading_data: TradingData = None
+
+
+def _init_strategy_worker(shared_data: SharedTradingData, cache_directory: Path):
+    global _worker_shared_data, _worker_trading_data
+    # The attached shared memory must outlive the trading data built on top of it
+    _worker_shared_data = shared_data
+    _worker_trading_data = shared_data.get_trading_data()
+    set_cache_directory(cache_directory)
+
+
+def _run_strategy_in_worker(cls_and_kwargs, portfolio, run_options):
+    vectorized, event_driven, compiled, deferred_profits = run_options
+    cls_and_kwargs = [cls_and_kwargs[0], restore_data_frames_in_kwargs(cls_and_kwargs[1])]
+    strategy = _get_strategy_instance_from_class_and_kwargs(
+        cls_and_kwargs, _worker_trading_data, portfolio
+    )
+    strategy.deferred_profits = strategy.deferred_profits or deferred_profits
+    strategy.run(vectorized, event_driven, compiled)
+    return strategy.get_result(), strategy.stats()
 
 
 class StrategyMerger(Strategy):
@@ -266,10 +361,14 @@ class StrategyMerger(Strategy):
     def execute_step(self):
         self.name = "Merged:" + "-".join(strat.name for strat in self.strategies)
         for strategy in self.strategies:
-            ...
+            strategy.i = self.i
             strategy.current_step = self.steps[self.i]
             strategy.execute_step()
-        self.profits_in_time[self.i] = self.get_profit_in_usd()
+        # Merged profits are logged after all the strategies executed their step
+        if self.deferred_profits:
+            self.record_holdings(self.i)
+        else:
+            self.profits_in_time[self.i] = self.get_profit_in_usd()
 
 
 def get_strategy_instances_from_classes_and_kwargs(strategy_classes, data, portfolio):
@@ -285,6 +384,6 @@ def _get_strategy_instance_from_class_and_kwargs(cls_and_kwargs, data, portfolio
     if len(cls_and_kwargs) == 2:
         kwargs = cls_and_kwargs[1]
 
-    strategy = cls(data, deepcopy(portfolio), **kwargs)
+    strategy = cls(data, None if portfolio is None else portfolio.copy(), **kwargs)
     logging.debug("- " + str(strategy))
     return strategy
@@ -11,7 +11,37 @@ import numpy as np
 import numpy.typing as npt
 import pandas as pd
 
-from .utils import BTC_SYMBOL, Portfolio, TradingData, create_portfolio_from_data
+from .compiled_simulator import NUMBA_AVAILABLE, simulate_actions
+from .utils import (
+    ACTION_BUY,
+    ACTION_BUY_ADDITIONAL,
+    ACTION_BUY_PARTIAL,
+    ACTION_NONE,
+    ACTION_SELL,
+    ACTION_SELL_PARTIAL,
+    BTC_SYMBOL,
+    HoldingsLedger,
+    Portfolio,
+    StrategyResult,
+    TradingData,
+    create_portfolio_from_data,
+)
+
+# Strategy methods executing the actions, called with the action's value
+ACTION_METHODS = {
+    ACTION_NONE: lambda strategy, value: None,
+    ACTION_BUY: lambda strategy, value: strategy.buy(),
+    ACTION_SELL: lambda strategy, value: strategy.sell(),
+    ACTION_BUY_PARTIAL: lambda strategy, value: strategy.buy_partial(value),
+    ACTION_SELL_PARTIAL: lambda strategy, value: strategy.sell_partial(value),
+    ACTION_BUY_ADDITIONAL: lambda strategy, value: strategy.buy_additional(value),
+}
+
+
+def get_extrema_actions(local_min: npt.NDArray[bool], local_max: npt.NDArray[bool]):
+    """Get action codes buying at local minima, otherwise selling at local maxima."""
+    actions = np.select([local_min, local_max], [ACTION_BUY, ACTION_SELL], ACTION_NONE)
+    return actions, np.zeros(actions.size)
 
 
 class Strategy(ABC):
@@ -19,11 +49,19 @@ class Strategy(ABC):
 
     Other strategy simulations are expected to inherit from this class,
     having the most important functions already defined.
+
+    With deferred_profits enabled, profits are not logged on every step. Only the holdings
+    ledger is kept and profits_in_time are computed from it once the simulation is done.
     """
 
+    deferred_profits = False
+    profits_relative_to_invested = False
+
     def __init__(self, data: TradingData, portfolio: Portfolio = None):
         self.i = 0
-        self.data = data.data
+        self.panels: dict[str, pd.DataFrame] = data.panels
+        self.close_values: npt.NDArray[float] = data.close_values
+        self.pair_columns: dict[str, int] = data.pair_columns
         self.trading_vars = data.variables
         self.steps: npt.NDArray[pd.Timestamp] = data.dates
         self.current_step: pd.Timestamp = self.steps[self.i]
@@ -34,16 +72,161 @@ class Strategy(ABC):
         if self.portfolio is None:
             self.portfolio = create_portfolio_from_data(data)
         self.total_usd_invested = self.portfolio.usd
+        self.portfolio_symbols: tuple[str] = None
+        self.portfolio_close_values: npt.NDArray[float] = None
 
         self.bought_dates: list[pd.Timestamp] = []
         self.sold_dates: list[pd.Timestamp] = []
 
+        self.is_running = False
+        self.ledger = HoldingsLedger()
+        self.record_holdings()
+
+    def run(self, vectorized: bool = True, event_driven: bool = True, compiled: bool = True):
+        """Run the simulation with the fastest engine available for the strategy.
+        run_simulation() is kept as the reference implementation.
+        """
+        if vectorized and self.can_run_vectorized():
+            if self.run_simulation_vectorized() is not None:
+                return
+        if compiled and self.can_run_compiled():
+            self.run_simulation_compiled()
+        elif event_driven and self.get_event_steps() is not None:
+            self.run_simulation_event_driven()
+        else:
+            self.run_simulation()
+
     def run_simulation(self):
         """Run the simulation. This method should be run always once."""
+        self.is_running = True
         while self.i != self.steps.size:
             self.current_step = self.steps[self.i]
             self.execute_step()
             self.i += 1
+        self.is_running = False
+
+        if self.deferred_profits:
+            self.profits_in_time = self.get_profits_from_ledger()
+
+    def can_run_vectorized(self):
+        """Determine whether the strategy has a closed-form implementation."""
+        return False
+
+    def run_simulation_vectorized(self):
+        """Fill profits_in_time, bought_dates and sold_dates from the whole price arrays at once.
+        The results are expected to match run_simulation(). Returns profits_in_time, or None
+        without simulating anything when the strategy has no closed-form implementation.
+        """
+        return None
+
+    def can_run_compiled(self):
+        """Determine whether the strategy can be simulated by the numba compiled engine."""
+        return NUMBA_AVAILABLE and self.get_action_arrays() is not None
+
+    def run_simulation_compiled(self):
+        """Simulate the action arrays returned by get_action_arrays() in a compiled loop.
+        The results are expected to match run_simulation().
+        """
+        actions, action_values = self.get_action_arrays()
+        coins = self.get_holdings_vector()
+        bought = np.zeros(self.steps.size, dtype=np.int64)
+        sold = np.zeros(self.steps.size, dtype=np.int64)
+
+        self.portfolio.usd, self.total_usd_invested = simulate_actions(
+            self.get_portfolio_close_values(),
+            np.asarray(actions, dtype=np.int64),
+            np.asarray(action_values, dtype=np.float64),
+            self.i,
+            float(self.portfolio.usd),
+            coins,
+            float(self.total_usd_invested),
+            self.profits_relative_to_invested,
+            self.profits_in_time,
+            bought,
+            sold,
+        )
+
+        self.set_holdings_from_vector(coins)
+        self.bought_dates.extend(self.steps.repeat(bought))
+        self.sold_dates.extend(self.steps.repeat(sold))
+        self.finish_simulation()
+
+    def get_action_arrays(self):
+        """Get the action codes and values of all steps, if the strategy's logic can be
+        expressed by them. None means that execute_step() has to be called.
+        """
+        return None
+
+    def run_simulation_event_driven(self):
+        """Execute only the steps returned by get_event_steps(). Profits of all the steps
+        are filled in bulk from the holdings ledger.
+        """
+        self.deferred_profits = True
+        self.is_running = True
+        for step in self.get_event_steps():
+            if step < self.i:
+                continue
+            self.i = int(step)
+            self.current_step = self.steps[self.i]
+            self.execute_step()
+        self.is_running = False
+
+        self.profits_in_time = self.get_profits_from_ledger()
+        self.finish_simulation()
+
+    def get_event_steps(self):
+        """Get sorted indices of the only steps on which execute_step() does anything besides
+        logging profits. None means that every step needs to be executed.
+        """
+        return None
+
+    def get_signal_steps(self, *signals: npt.NDArray[float]):
+        """Get indices of steps that have a non-null value in any of the step aligned signals."""
+        return np.flatnonzero(np.any([~np.isnan(signal) for signal in signals], axis=0))
+
+    def finish_simulation(self):
+        """Leave the strategy in the same state as run_simulation() does."""
+        self.i = self.steps.size
+        self.current_step = self.steps[-1]
+
+    def get_periodic_steps(self, interval: int):
+        """Get indices of steps on which a periodic action happens. The first action happens
+        once the first interval of steps has passed, same as with a countdown in execute_step().
+        The countdown of an interval below 1 never reaches zero, so no action happens.
+        """
+        if interval <= 0:
+            return np.arange(0)
+        return np.arange(interval - 1, self.steps.size, interval)
+
+    def get_periodic_countdown(self, interval: int):
+        """Get the countdown of a periodic action left after all the steps."""
+        if interval <= 0:
+            return interval - self.steps.size
+        return interval - self.steps.size % interval
+
+    def get_portfolio_close_values(self):
+        """Get (steps x coins) close values of the portfolio coins in portfolio order.
+        Portfolios in the trading data pair order use the close matrix without copying it.
+        """
+        if self.portfolio.symbols is not self.portfolio_symbols:
+            columns = [self.pair_columns[coin] for coin in self.portfolio.symbols]
+            self.portfolio_close_values = self.close_values
+            if columns != list(range(self.close_values.shape[1])):
+                self.portfolio_close_values = self.close_values[:, columns]
+            self.portfolio_symbols = self.portfolio.symbols
+        return self.portfolio_close_values
+
+    def get_close_values(self):
+        """Get close values of the portfolio coins relevant to the current step."""
+        return self.get_portfolio_close_values()[self.get_step_index()]
+
+    def get_holdings_vector(self):
+        """Get amounts of portfolio coins in portfolio order."""
+        return self.portfolio.holdings.copy()
+
+    def set_holdings_from_vector(self, holdings: npt.NDArray[float]):
+        """Set amounts of portfolio coins from a vector in portfolio order."""
+        self.portfolio.holdings[:] = holdings
 
     @abstractmethod
     def execute_step(self):
@@ -58,7 +241,29 @@ class Strategy(ABC):
 
     def log_profits(self):
         """Determine how the profits should be logged. Profits are passed to Plotter module."""
-        self.profits_in_time[self.i] = self.get_profit_in_usd()
+        if not self.deferred_profits:
+            self.profits_in_time[self.i] = self.get_profit_in_usd()
+
+    def record_holdings(self, step: int = None):
+        """Record the current holdings into the ledger. Profits are logged at the start of
+        execute_step(), so holdings changed while running are valid from the next step.
+        """
+        if step is None:
+            step = self.i + 1 if self.is_running else self.i
+        self.ledger.record(
+            step, self.get_holdings_vector(), self.portfolio.usd, self.total_usd_invested
+        )
+
+    def get_profits_from_ledger(self):
+        """Compute profits in all steps from the holdings ledger."""
+        values, _ = self.ledger.get_values(self.get_portfolio_close_values())
+        return values
+
+    def execute_action(self, action: int, value: float = 0):
+        """Execute the trading action of the given code. The value is the percentage of
+        partial actions or the amount of USD of additional buys.
+        """
+        ACTION_METHODS[action](self, value)
 
     def buy(self):
         """Buy, or transfer, all the stablecoins in portfolio to coins."""
@@ -67,31 +272,27 @@ class Strategy(ABC):
             return -1
         self.bought_dates.append(self.current_step)
         self.execute_buy_logic()
+        self.record_holdings()
         return 0
 
     def execute_buy_logic(self):
-        coins = self.portfolio.coins
-        usd_per_coin = self.portfolio.usd / len(coins)
-        for coin in coins:
-            close = self.get_close_value(coin)
-            coins[coin] += usd_per_coin / close
+        usd_per_coin = self.portfolio.usd / len(self.portfolio.symbols)
+        self.portfolio.holdings += usd_per_coin / self.get_close_values()
         self.portfolio.usd = 0
 
     def sell(self):
         """Sell, or transfer, all the coins in portfolio to stablecoins."""
-        if all(value == 0 for value in self.portfolio.coins.values()):
+        if not self.portfolio.holdings.any():
             logging.debug(f"Tried to sell with 0 $USD in coins, step: {self.current_step}")
             return -1
         self.sold_dates.append(self.current_step)
         self.execute_sell_logic()
+        self.record_holdings()
         return 0
 
     def execute_sell_logic(self):
-        coins = self.portfolio.coins
-        for coin in coins:
-            close = self.get_close_value(coin)
-            self.portfolio.usd += self.portfolio.coins[coin] * close
-            self.portfolio.coins[coin] = 0
+        self.portfolio.usd += self.get_coins_value_in_usd()
+        self.portfolio.holdings[:] = 0
 
     def buy_partial(self, percentage):
         """Buy only a partial percentage of the coins. Keep the rest in stablecoins.
@@ -116,7 +317,6 @@ class Strategy(ABC):
 
     def _execute_partial_logic(self, percentage):
         """Execute partial buy."""
-        coins = self.portfolio.coins
         ratio = percentage / 100
         assert 0 <= ratio <= 1
 
@@ -124,26 +324,29 @@ class Strategy(ABC):
         self.execute_sell_logic()
 
         usd_to_buy_coins_with = self.portfolio.usd * ratio
-        usd_to_buy_one_coin_with = usd_to_buy_coins_with / len(coins)
-        for coin in coins:
-            close = self.get_close_value(coin)
-            self.portfolio.coins[coin] += usd_to_buy_one_coin_with / close
+        usd_to_buy_one_coin_with = usd_to_buy_coins_with / len(self.portfolio.symbols)
+        self.portfolio.holdings += usd_to_buy_one_coin_with / self.get_close_values()
 
         self.portfolio.usd = self.portfolio.usd - usd_to_buy_coins_with
+        self.record_holdings()
 
     def buy_additional(self, usd: float):
         """Buy additional coins using new income. Used for DCA types of stratgies."""
         self.bought_dates.append(self.current_step)
-        coins = self.portfolio.coins
-        usd_to_buy_coin_with = usd / len(coins)
-        for coin in coins:
-            close = self.get_close_value(coin)
-            coins[coin] += usd_to_buy_coin_with / close
+        usd_to_buy_coin_with = usd / len(self.portfolio.symbols)
+        self.portfolio.holdings += usd_to_buy_coin_with / self.get_close_values()
         self.total_usd_invested += usd
+        self.record_holdings()
 
     def get_close_value(self, coin: str):
         """Get close value of a coin relevant to the current step."""
-        return self.data.loc[[(coin, self.current_step)]]["close"][0]
+        return self.close_values[self.get_step_index(), self.pair_columns[coin]]
+
+    def get_step_index(self):
+        """Get the integer index of the current step. Once the simulation has finished,
+        the last step is used.
+        """
+        return min(self.i, self.steps.size - 1)
 
     def get_profit_in_usd(self):
         """Gain total portfolio profit in USD relevant to the current step."""
@@ -151,9 +354,8 @@ class Strategy(ABC):
 
     def get_coins_value_in_usd(self):
         """Gain portfolio coins profit in USD relevant to the current step."""
-        return sum(
-            self.portfolio.coins[coin] * self.get_close_value(coin) for coin in self.portfolio.coins
-        )
+        # Summed one coin after another, the compiled engines follow the same order
+        return sum(self.portfolio.holdings * self.get_close_values())
 
     def get_profit_in_btc(self):
         """Gain total portfolio profit in BTC relevant to the current step."""
@@ -162,6 +364,16 @@ class Strategy(ABC):
         profit = self.get_profit_in_usd()
         return profit / close
 
+    def get_result(self):
+        """Get the strategy's result, used for plotting."""
+        return StrategyResult(
+            self.name,
+            self.profits_in_time,
+            self.bought_dates,
+            self.sold_dates,
+            self.total_usd_invested,
+        )
+
     def stats(self):
         """Return useful stats about the metric, sholud be used once all profits were calculated."""
         profitInUSD = self.profits_in_time[-1]
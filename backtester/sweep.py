@@ -0,0 +1,223 @@
+"""
+Author: Marek Filip 2022
+
+Module for sweeping strategy keyword arguments over a grid, or a random sample, of values.
+
+Keyword arguments named after RiskMetricOptimizations fields are used to compute the risk
+metric passed to risk metric strategies. The risk metric is computed once per distinct
+optimizations, not once per combination.
+"""
+
+import logging
+import random
+from dataclasses import dataclass, fields
+from itertools import product
+from math import prod
+
+import numpy as np
+import pandas as pd
+
+from .batched_simulator import can_run_variants_batched, run_variants_batched
+from .dca_riskmetric_strategy import (
+    DCARiskMetricStrategy7to0,
+    DCARiskMetricStrategyFibonacci,
+    DCARiskMetricStrategyFibonacciAdjusted,
+)
+from .dca_strategy import DCAStrategy
+from .hodl_strategy import HodlStrategy
+from .rebalance_strategy import RebalanceStrategy
+from .riskmetric_calculator import RiskMetricOptimizations, get_risk_metrics
+from .riskmetric_strategy import (
+    RiskMetricStrategy,
+    RiskMetricStrategyCombined,
+    RiskMetricStrategyCombined2,
+    RiskMetricStrategyCombined3,
+    RiskMetricStrategyIdealExtrema,
+    RiskMetricStrategyRealExtrema,
+    RiskMetricStrategyRiskLogic,
+)
+from .simulator import StrategyGenerator
+from .strategy import Strategy
+from .utils import (
+    OUTPUT_PATH,
+    Portfolio,
+    StrategyResult,
+    TradingData,
+    create_portfolio_from_data,
+    get_current_datetime_string,
+)
+
+# Strategies that can be swept from the command line
+STRATEGY_CLASSES: dict[str, Strategy] = {
+    cls.__name__: cls
+    for cls in [
+        HodlStrategy,
+        RebalanceStrategy,
+        DCAStrategy,
+        DCARiskMetricStrategy7to0,
+        DCARiskMetricStrategyFibonacci,
+        DCARiskMetricStrategyFibonacciAdjusted,
+        RiskMetricStrategyRiskLogic,
+        RiskMetricStrategyIdealExtrema,
+        RiskMetricStrategyRealExtrema,
+        RiskMetricStrategyCombined,
+        RiskMetricStrategyCombined2,
+        RiskMetricStrategyCombined3,
+    ]
+}
+OPTIMIZATION_FIELDS = [field.name for field in fields(RiskMetricOptimizations)]
+
+
+@dataclass
+class SweepResult:
+    """Dataclass holding the sweep's results.
+
+    stats hold one row per combination of keyword arguments with the final stats,
+    profits hold the profits in time of every combination, if they were kept.
+    """
+
+    stats: pd.DataFrame
+    profits: pd.DataFrame = None
+
+
+def get_parameter_grid(grid: dict[str, list]) -> list[dict]:
+    """Get all combinations of the keyword arguments' values."""
+    return [dict(zip(grid, values)) for values in product(*grid.values())]
+
+
+def get_parameter_sample(grid: dict[str, list], samples: int, seed: int = None) -> list[dict]:
+    """Get a random sample of distinct combinations of the keyword arguments' values.
+    The grid is never expanded, sampled combination indices are decoded instead.
+    """
+    sizes = [len(values) for values in grid.values()]
+    total = prod(sizes)
+    indices = random.Random(seed).sample(range(total), min(samples, total))
+
+    combinations = []
+    for index in sorted(indices):
+        combination = {}
+        for (key, values), size in zip(reversed(grid.items()), reversed(sizes)):
+            index, value_index = divmod(index, size)
+            combination[key] = values[value_index]
+        combinations.append({key: combination[key] for key in grid})
+    return combinations
+
+
+def get_combination_optimizations(combination: dict) -> RiskMetricOptimizations:
+    return RiskMetricOptimizations(
+        **{k: v for k, v in combination.items() if k in OPTIMIZATION_FIELDS}
+    )
+
+
+def run_sweep(
+    strategy_class: Strategy,
+    trading_data: TradingData,
+    grid: dict[str, list],
+    portfolio: Portfolio = None,
+    samples: int = None,
+    seed: int = None,
+    workers: int = 1,
+    keep_profits: bool = False,
+    batched: bool = True,
+) -> SweepResult:
+    """Run the strategy for every combination of the grid, or for a random sample of
+    the combinations if samples is given. Strategies supported by the batched simulator
+    are simulated for all combinations in lockstep, unless batched is False.
+    """
+    if samples is None:
+        combinations = get_parameter_grid(grid)
+    else:
+        combinations = get_parameter_sample(grid, samples, seed)
+
+    riskmetrics = {}
+    if issubclass(strategy_class, RiskMetricStrategy):
+        # The distinct optimizations are calculated together, sharing the moving averages
+        optimizations_list = list(dict.fromkeys(map(get_combination_optimizations, combinations)))
+        riskmetrics = dict(
+            zip(
+                optimizations_list,
+                get_risk_metrics(
+                    trading_data.btc_historical,
+                    optimizations_list,
+                    trading_data.dates[0],
+                    trading_data.dates[-1],
+                    trading_data.dates,
+                ),
+            )
+        )
+
+    strategy_list = []
+    for combination in combinations:
+        kwargs = {k: v for k, v in combination.items() if k not in OPTIMIZATION_FIELDS}
+        if riskmetrics:
+            kwargs["riskmetric"] = riskmetrics[get_combination_optimizations(combination)]
+        strategy_list.append([strategy_class, kwargs])
+    logging.info(
+        f"Sweeping {len(strategy_list)} combinations of {strategy_class.__name__}, "
+        f"{len(riskmetrics)} risk metrics computed"
+    )
+
+    if batched and can_run_variants_batched(strategy_class):
+        variants = [kwargs for _, kwargs in strategy_list]
+        results = run_variants_batched(strategy_class, trading_data, variants, portfolio)
+    else:
+        simgen = StrategyGenerator(strategy_list, trading_data, portfolio, workers=workers)
+        simgen.run()
+        results = simgen.get_results()
+
+    stats = pd.concat(
+        [pd.DataFrame(combinations), pd.DataFrame([get_result_stats(r) for r in results])],
+        axis=1,
+    )
+    profits = None
+    if keep_profits:
+        profits = pd.DataFrame(
+            np.column_stack([result.profits for result in results]), index=trading_data.dates
+        )
+    return SweepResult(stats, profits)
+
+
+def get_result_stats(result: StrategyResult) -> dict:
+    """Get final stats of a strategy result."""
+    peaks = np.maximum.accumulate(result.profits)
+    drawdowns = np.divide(result.profits, peaks, out=np.ones_like(result.profits), where=peaks != 0)
+    return {
+        "name": result.name,
+        "final_profit": result.profits[-1],
+        "total_usd_invested": result.total_usd_invested,
+        "max_drawdown": 1 - drawdowns.min(),
+        "buys": len(result.bought_dates),
+        "sells": len(result.sold_dates),
+    }
+
+
+def sweep(trading_data: TradingData, sweep_args: dict):
+    """Run the sweep defined by the command line arguments and save the results into
+    the output folder. Called from __main__.py.
+    """
+    strategy_name = sweep_args["strategy"]
+    if strategy_name not in STRATEGY_CLASSES:
+        raise ValueError(
+            f"Unknown strategy {strategy_name}, choose one of: {', '.join(STRATEGY_CLASSES)}"
+        )
+
+    portfolio = create_portfolio_from_data(trading_data, cash=sweep_args["cash"])
+    result = run_sweep(
+        STRATEGY_CLASSES[strategy_name],
+        trading_data,
+        sweep_args["grid"],
+        portfolio,
+        samples=sweep_args["samples"],
+        seed=sweep_args["seed"],
+        workers=trading_data.variables.workers,
+        keep_profits=sweep_args["keep_profits"],
+    )
+    logging.info(f"Sweep results:\n{result.stats.to_string()}")
+
+    filename = f"sweep-{strategy_name}-{get_current_datetime_string()}"
+    result.stats.to_csv(OUTPUT_PATH / f"{filename}.csv", encoding="utf-8")
+    logging.info(f"saving csv to: {OUTPUT_PATH / f'{filename}.csv'}")
+    if result.profits is not None:
+        result.profits.to_csv(OUTPUT_PATH / f"{filename}-profits.csv", encoding="utf-8")
+        logging.info(f"saving csv to: {OUTPUT_PATH / f'{filename}-profits.csv'}")
+    return result
@@ -6,9 +6,9 @@ Utils file for defining auxiliary structures, functions, and constants.
 
 import logging
 import sys
+from collections.abc import MutableMapping
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from functools import reduce
 from pathlib import Path
 
 import numpy as np
@@ -22,6 +22,7 @@ DATA_PATH = ROOT_PATH / "data"
 BINANCE_DATA_PATH = DATA_PATH / "binance"
 COINMARKETCAP_DATA_PATH = DATA_PATH / "coinmarketcap"
 COINGECKO_DATA_PATH = DATA_PATH / "coingecko"
+CACHE_PATH = DATA_PATH / "cache"
 LOGS_PATH = ROOT_PATH / "logs"
 OUTPUT_PATH = ROOT_PATH / "output"
 BACKTESTER_PATH = ROOT_PATH / "backtester"
@@ -29,12 +30,25 @@ BACKTESTER_PATH = ROOT_PATH / "backtester"
 COINMARKETCAP_GLOBAL_METRICS_URL = (
     "https://api.coinmarketcap.com/data-api/v3/global-metrics/quotes/historical"
 )
-COINMARKETCAP_LIMIT = 2000
+COINMARKETCAP_LIMIT = 2000  # days of global metrics per request
+COINMARKETCAP_WORKERS = 4  # concurrent requests of the global metrics windows
+COINMARKETCAP_RATE = 5  # requests per second
 SEP = ":"
 TIME_FORMAT = "%Y-%m-%d"
 BTC_SYMBOL = "BTCUSDT"
 FIRST_BITCOIN_EXCHANGE = pd.Timestamp("2009-01-12")
 
+# Codes of the trading actions, used by the engines simulating strategies on whole arrays
+ACTION_NONE = 0
+ACTION_BUY = 1
+ACTION_SELL = 2
+ACTION_BUY_PARTIAL = 3
+ACTION_SELL_PARTIAL = 4
+ACTION_BUY_ADDITIONAL = 5
+
+# Number of threads the pairs data are loaded in by default
+DEFAULT_DOWNLOAD_WORKERS = 8
+
 # YAML schema defining the args.yaml file
 YAML_FILE_SCHEMA = Schema(
     {
@@ -43,6 +57,8 @@ YAML_FILE_SCHEMA = Schema(
         "end_date": lambda date: pd.Timestamp(date),
         "interval": str,
         Optional("debug_level"): Schema(Or("WARNING", "DEBUG", "INFO", "ERROR", "CRITICAL")),
+        Optional("workers"): lambda workers: int(workers) > 0,
+        Optional("download_workers"): lambda workers: int(workers) > 0,
     }
 )
 
@@ -60,6 +76,8 @@ class TradingVariables:
     end_date: pd.Timestamp
     interval: pd.Timedelta
     interval_str: str
+    workers: int = 1  # Number of processes the strategies are run in
+    download_workers: int = DEFAULT_DOWNLOAD_WORKERS  # Number of threads the pairs are loaded in
 
     def get_interval_in_day_fraction(self):
         """Get interval as a fraction of number of days."""
@@ -68,7 +86,12 @@ class TradingVariables:
 
 @dataclass
 class TradingData:
-    """Dataclass holding all information needed to run the simulation."""
+    """Dataclass holding all information needed to run the simulation.
+
+    Next to the long data frame, wide (dates x pairs) panels of every field are kept, as well
+    as a dense (steps x pairs) matrix of close values together with the pair to column
+    mapping. They are rebuilt every time data is reassigned.
+    """
 
     data: pd.DataFrame
     global_metrics: pd.DataFrame
@@ -76,14 +99,131 @@ class TradingData:
     symbols: list[str]
     dates: npt.NDArray[pd.Timestamp]
     variables: TradingVariables
+    panels: dict[str, pd.DataFrame] = field(init=False, repr=False)
+    close_values: npt.NDArray[float] = field(init=False, repr=False)
+    pair_columns: dict[str, int] = field(init=False, repr=False)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name == "data" and value is not None:
+            panels = get_panels_from_data(value)
+            close_values, pair_columns = get_close_values_from_panel(panels["close"])
+            super().__setattr__("panels", panels)
+            super().__setattr__("close_values", close_values)
+            super().__setattr__("pair_columns", pair_columns)
 
 
-@dataclass
 class Portfolio:
-    """Dataclass holding all the information about current simulation portfolio."""
+    """Class holding all the information about current simulation portfolio.
+
+    Coin amounts are kept in the float64 holdings vector, in the order of symbols.
+    coins is a {coin: amount} view of the holdings, assigning a dict to it replaces the coins.
+    """
+
+    __slots__ = ("usd", "symbols", "coin_indices", "holdings")
+
+    def __init__(self, usd: float = 1000, coins: dict = None):
+        self.usd = usd
+        self.coins = {} if coins is None else coins
+
+    @property
+    def coins(self) -> "PortfolioCoins":
+        return PortfolioCoins(self)
+
+    @coins.setter
+    def coins(self, coins: dict):
+        self.symbols = tuple(coins)
+        self.coin_indices = {coin: index for index, coin in enumerate(self.symbols)}
+        self.holdings = np.fromiter(coins.values(), dtype=np.float64, count=len(self.symbols))
+
+    def copy(self) -> "Portfolio":
+        """Copy the portfolio, only the holdings vector is copied."""
+        portfolio = Portfolio.__new__(Portfolio)
+        portfolio.usd = self.usd
+        portfolio.symbols = self.symbols
+        portfolio.coin_indices = self.coin_indices
+        portfolio.holdings = self.holdings.copy()
+        return portfolio
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        if not isinstance(other, Portfolio):
+            return NotImplemented
+        return (
+            self.usd == other.usd
+            and self.symbols == other.symbols
+            and np.array_equal(self.holdings, other.holdings)
+        )
+
+    def __repr__(self):
+        return f"Portfolio(usd={self.usd!r}, coins={dict(self.coins)!r})"
 
-    usd: int = 1000
-    coins: dict = field(default_factory=dict)  # {'coin': percentage, 'coin': percantage}
+
+class PortfolioCoins(MutableMapping):
+    """Mutable {coin: amount} view of the portfolio holdings vector."""
+
+    __slots__ = ("portfolio",)
+
+    def __init__(self, portfolio: Portfolio):
+        self.portfolio = portfolio
+
+    def __getitem__(self, coin: str):
+        return self.portfolio.holdings[self.portfolio.coin_indices[coin]]
+
+    def __setitem__(self, coin: str, amount: float):
+        if coin in self.portfolio.coin_indices:
+            self.portfolio.holdings[self.portfolio.coin_indices[coin]] = amount
+        else:
+            self.portfolio.coins = {**self, coin: amount}
+
+    def __delitem__(self, coin: str):
+        coins = dict(self)
+        del coins[coin]
+        self.portfolio.coins = coins
+
+    def __iter__(self):
+        return iter(self.portfolio.symbols)
+
+    def __len__(self):
+        return len(self.portfolio.symbols)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+@dataclass
+class HoldingsLedger:
+    """Dataclass recording the portfolio holdings every time they change.
+
+    Every entry holds the step index from which the holdings are valid, the coin amounts
+    in portfolio order, the stablecoins and the total USD invested.
+    """
+
+    steps: list[int] = field(default_factory=list)
+    coins: list[npt.NDArray[float]] = field(default_factory=list)
+    usd: list[float] = field(default_factory=list)
+    usd_invested: list[float] = field(default_factory=list)
+
+    def record(self, step: int, coins: npt.NDArray[float], usd: float, usd_invested: float):
+        self.steps.append(step)
+        self.coins.append(coins)
+        self.usd.append(usd)
+        self.usd_invested.append(usd_invested)
+
+    def get_values(self, close_values: npt.NDArray[float]):
+        """Forward fill the holdings over all steps and value them with the (steps x coins)
+        close values. Return the portfolio values and the total USD invested in every step.
+        """
+        all_steps = np.arange(close_values.shape[0])
+        entries = np.searchsorted(self.steps, all_steps, side="right") - 1
+        coins = np.array(self.coins)[entries]
+        values = np.array(self.usd)[entries] + np.einsum("ij,ij->i", coins, close_values)
+        return values, np.array(self.usd_invested)[entries]
 
 
 @dataclass
@@ -94,6 +234,7 @@ class StrategyResult:
     profits: npt.NDArray[float]
     bought_dates: list[pd.Timestamp]
     sold_dates: list[pd.Timestamp]
+    total_usd_invested: float = None
 
 
 def convert_args_to_trading_variables(args):
@@ -105,6 +246,8 @@ def convert_args_to_trading_variables(args):
     )
     variables["interval"] = pd.to_timedelta(args["interval"])
     variables["interval_str"] = args["interval"]
+    variables["workers"] = int(args.get("workers", 1))
+    variables["download_workers"] = int(args.get("download_workers", DEFAULT_DOWNLOAD_WORKERS))
     return TradingVariables(**variables)
 
 
@@ -165,6 +308,33 @@ def get_dates_from_index(data):
     return data.index.get_level_values(level="open_time").unique()
 
 
+def get_panels_from_data(data: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Get wide (dates x pairs) panels of every field of the long data frame, built by one
+    aligned unstack of the pairs. Rows follow the order of dates returned by
+    get_dates_from_index.
+    """
+    dates = get_dates_from_index(data)
+    wide = data.unstack(level="pair").reindex(index=dates)
+    return {name: wide[name] for name in data.columns}
+
+
+def get_close_values_from_panel(close: pd.DataFrame):
+    """Get dense (steps x pairs) float64 matrix of close values and the pair to column mapping."""
+    close_values = np.ascontiguousarray(close.to_numpy(dtype=np.float64))
+    pair_columns = {pair: column for column, pair in enumerate(close.columns)}
+    return close_values, pair_columns
+
+
+def get_profits_relative_to_invested(profits_in_usd, usd_invested):
+    """Divide profits by the USD invested, zero profits with nothing invested stay zero."""
+    return np.divide(
+        profits_in_usd,
+        usd_invested,
+        out=np.zeros(np.shape(profits_in_usd)),
+        where=(profits_in_usd != 0) | (usd_invested != 0),
+    )
+
+
 def map_values_to_specific_dates(all_dates, specific_dates, values):
     date_indices = map(lambda x: list(all_dates).index(x), specific_dates)
     specific_values = list(map(lambda x: values[x], date_indices))
@@ -173,20 +343,16 @@ def map_values_to_specific_dates(all_dates, specific_dates, values):
 
 def remove_distinct_dates(data: pd.DataFrame):
     """Remove dates that do not intersect among every coin from the data frame data."""
-    coins = get_symbols_from_index(data)
-    for coin in coins:
-        logging.info(f"{coin}: {data.loc[coin].reset_index().iloc[0]['open_time']}")
-
-    dates = []
-    for coin in set(data.index.get_level_values(level="pair")):
-        dates.append(data.loc[coin].index.values)
-    dates = reduce(np.intersect1d, dates)
-
-    df = data.reset_index()
-    date_filter = (df["open_time"] < dates[0]) | (df["open_time"] > dates[-1])
-    df = df.drop(df.index[date_filter])
-    df = set_index_for_data(df)
-    return df
+    pairs = data.index.get_level_values(level="pair")
+    open_times = data.index.get_level_values(level="open_time")
+    for coin, first_date in pd.Series(open_times).groupby(pairs).min().items():
+        logging.info(f"{coin}: {first_date}")
+
+    # Dates shared by every coin are counted once for each of them
+    date_counts = open_times.value_counts()
+    dates = date_counts.index[date_counts == pairs.nunique()]
+    data = data[(open_times >= dates.min()) & (open_times <= dates.max())]
+    return data.sort_index()
 
 
 def set_index_for_data(data: pd.DataFrame):
@@ -195,8 +361,10 @@ def set_index_for_data(data: pd.DataFrame):
 
 
 def create_portfolio_from_data(data: TradingData, cash: float = 10000):
-    """Create portfolio for usd and coins. Cash parameter is used to denote dollar capital."""
-    return Portfolio(usd=cash, coins={coin: 0 for coin in data.symbols})
+    """Create portfolio for usd and coins. Cash parameter is used to denote dollar capital.
+    The coins are in the order of the trading data pairs.
+    """
+    return Portfolio(usd=cash, coins={coin: 0 for coin in data.pair_columns})
 
 
 def get_current_datetime_string():
@@ -11,8 +11,7 @@ from .utils import TradingData
 
 def run_simulation_vectorbt_hodl(trading_data: TradingData):
     for symbol in trading_data.symbols:
-        df = trading_data.data.loc[symbol]
-        price = df.close
+        price = trading_data.panels["close"][symbol]
         pf = vbt.Portfolio.from_holding(price, init_cash=100)
         print(pf.total_profit())
         pf.plot().show()
@@ -20,8 +19,7 @@ def run_simulation_vectorbt_hodl(trading_data: TradingData):
 
 def run_simulation_vectorbt_msa(trading_data: TradingData):
     for symbol in trading_data.symbols:
-        df = trading_data.data.loc[symbol]
-        price = df.close
+        price = trading_data.panels["close"][symbol]
 
         fast_ma = vbt.MA.run(price, 10)
         slow_ma = vbt.MA.run(price, 100)
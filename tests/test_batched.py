@@ -0,0 +1,112 @@
+"""
+File for testing that the batched simulations of many variants match the reference simulations.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_random_close_data
+
+from backtester.batched_simulator import run_variants_batched
+from backtester.dca_riskmetric_strategy import (
+    DCARiskMetricStrategy7to0,
+    DCARiskMetricStrategyFibonacci,
+    DCARiskMetricStrategyFibonacciAdjusted,
+)
+from backtester.riskmetric_strategy import (
+    RiskMetricStrategyCombined3,
+    RiskMetricStrategyRealExtrema,
+    RiskMetricStrategyRiskLogic,
+)
+from backtester.utils import (
+    ACTION_BUY,
+    ACTION_SELL,
+    ACTION_SELL_PARTIAL,
+    create_portfolio_from_data,
+)
+
+
+@pytest.fixture
+def data():
+    return get_random_close_data("2022-01-01", "2022-04-01", 4)
+
+
+@pytest.fixture
+def riskmetrics(data):
+    rng = np.random.default_rng(5)
+    riskmetrics = []
+    for _ in range(2):
+        risk = rng.uniform(0, 1, data.dates.size)
+        riskmetric = pd.DataFrame({"riskmetric": risk}, index=data.dates)
+        for column in ["min_real", "max_real"]:
+            signal = rng.uniform(size=data.dates.size) < 0.1
+            riskmetric[column] = np.where(signal, riskmetric["riskmetric"], np.nan)
+        riskmetrics.append(riskmetric)
+    return riskmetrics
+
+
+def assert_results_match(references, results):
+    for reference, result in zip(references, results):
+        assert reference.name == result.name
+        assert np.array_equal(reference.profits, result.profits)
+        assert reference.bought_dates == result.bought_dates
+        assert reference.sold_dates == result.sold_dates
+        assert reference.total_usd_invested == result.total_usd_invested
+
+
+@pytest.mark.parametrize(
+    "cls",
+    [
+        DCARiskMetricStrategy7to0,
+        DCARiskMetricStrategyFibonacci,
+        DCARiskMetricStrategyFibonacciAdjusted,
+    ],
+)
+@pytest.mark.parametrize("usd", [0, 100])
+def test_dca_riskmetric_variants(data, riskmetrics, cls, usd):
+    variants = [
+        {"riskmetric": riskmetric, "dca_interval": interval, "base": base}
+        for riskmetric in riskmetrics
+        for interval in [1, 3, 7]
+        for base in [5, 12]
+    ]
+    references = []
+    for kwargs in variants:
+        strategy = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+        strategy.run_simulation()
+        references.append(strategy.get_result())
+
+    results = run_variants_batched(cls, data, variants, create_portfolio_from_data(data, usd))
+    assert_results_match(references, results)
+
+
+@pytest.mark.parametrize(
+    "cls, tables",
+    [
+        (RiskMetricStrategyRiskLogic, {}),
+        (
+            RiskMetricStrategyRiskLogic,
+            {
+                "risk_edges": (0.25, 0.5, 0.75),
+                "risk_actions": [
+                    (ACTION_BUY, 0),
+                    (ACTION_BUY, 0),
+                    (ACTION_SELL_PARTIAL, 50),
+                    (ACTION_SELL, 0),
+                ],
+            },
+        ),
+        (RiskMetricStrategyRealExtrema, {}),
+        (RiskMetricStrategyCombined3, {"buy_percentages": (100,) * 5 + (50,) * 5}),
+    ],
+)
+def test_risk_metric_variants(data, riskmetrics, cls, tables):
+    variants = [{"riskmetric": riskmetric} | tables for riskmetric in riskmetrics]
+    references = []
+    for kwargs in variants:
+        strategy = cls(data, create_portfolio_from_data(data, 100), **kwargs)
+        strategy.run_simulation()
+        references.append(strategy.get_result())
+
+    results = run_variants_batched(cls, data, variants, create_portfolio_from_data(data, 100))
+    assert_results_match(references, results)
@@ -0,0 +1,101 @@
+"""
+File for testing the memory and disk cache of the computed data frames.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import cache, riskmetric_calculator
+from backtester.cache import FrameCache, get_cache_key
+from backtester.riskmetric_calculator import RiskMetricOptimizations, get_risk_metric
+
+
+@pytest.fixture
+def historical_data():
+    dates = pd.date_range("2019-01-01", "2022-01-01", name="date")
+    prices = 10_000 + 5_000 * np.sin(np.arange(dates.size) / 60)
+    return pd.DataFrame({"price": prices}, index=dates)
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_cache_directory", tmp_path)
+    return tmp_path
+
+
+def get_frame(size, value=0.0):
+    return pd.DataFrame({"value": np.full(size, value)}, index=pd.RangeIndex(size))
+
+
+def test_cache_key_depends_on_contents():
+    df = get_frame(10)
+    assert get_cache_key(df, 5) == get_cache_key(df.copy(), 5)
+    assert get_cache_key(df, 5) != get_cache_key(df, 3)
+    assert get_cache_key(df, 5) != get_cache_key(get_frame(10, 1.0), 5)
+    assert get_cache_key(df, 5) != get_cache_key(df.rename(columns={"value": "other"}), 5)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    frame_cache = FrameCache("test", max_memory_entries=2)
+    for key in ("a", "b"):
+        frame_cache.put(key, get_frame(3))
+    frame_cache.get("a")
+    frame_cache.put("c", get_frame(3))
+    assert list(frame_cache.memory) == ["a", "c"]
+
+
+def test_cached_frames_are_copies(cache_directory):
+    frame_cache = FrameCache("test")
+    df = get_frame(3, 1.0)
+    frame_cache.put("key", df)
+    df["value"] = 2.0
+    frame_cache.get("key")["value"] = 3.0
+    pd.testing.assert_frame_equal(frame_cache.get("key"), get_frame(3, 1.0))
+
+
+def test_disk_tier_round_trip(cache_directory):
+    df = get_frame(5, 2.5)
+    FrameCache("test").put("key", df)
+    assert (cache_directory / "test" / "key.parquet").is_file()
+    pd.testing.assert_frame_equal(FrameCache("test").get("key"), df)
+
+
+def test_disk_tier_size_limit(cache_directory):
+    frame_cache = FrameCache("test")
+    frame_cache.put("first", get_frame(1000))
+    frame_cache.max_disk_bytes = (cache_directory / "test" / "first.parquet").stat().st_size
+    frame_cache.put("second", get_frame(1000, 1.0))
+    assert [file.stem for file in (cache_directory / "test").glob("*.parquet")] == ["second"]
+
+
+def test_risk_metric_is_calculated_once(historical_data, monkeypatch):
+    calls = []
+    calculate = riskmetric_calculator._calculate_risk_metrics
+
+    def counting_calculate(*args):
+        calls.append(args)
+        return calculate(*args)
+
+    monkeypatch.setattr(riskmetric_calculator, "_calculate_risk_metrics", counting_calculate)
+    riskmetric_calculator.riskmetric_cache.clear_memory()
+    optimizations = RiskMetricOptimizations(diminishing_returns=False)
+    first = get_risk_metric(historical_data, optimizations, "2020-01-01", "2021-01-01")
+    second = get_risk_metric(historical_data, optimizations, "2020-06-01", "2021-06-01")
+    assert len(calls) == 1
+
+    pd.testing.assert_frame_equal(
+        first.df.loc["2020-06-01":"2021-01-01"], second.df.loc["2020-06-01":"2021-01-01"]
+    )
+    riskmetric_calculator.riskmetric_cache.clear_memory()
+    uncached = get_risk_metric(historical_data, optimizations, "2020-01-01", "2021-01-01")
+    assert len(calls) == 2
+    pd.testing.assert_frame_equal(first.df, uncached.df)
+
+
+def test_risk_metric_from_disk_matches(historical_data, cache_directory):
+    optimizations = RiskMetricOptimizations(daily_volume_correlation=False)
+    calculated = get_risk_metric(historical_data, optimizations, "2020-01-01", "2021-01-01")
+    riskmetric_calculator.riskmetric_cache.clear_memory()
+    loaded = get_risk_metric(historical_data, optimizations, "2020-01-01", "2021-01-01")
+    pd.testing.assert_frame_equal(calculated.df, loaded.df)
@@ -0,0 +1,81 @@
+"""
+File for testing that the compiled simulations match the per-step reference simulations.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_random_close_data
+
+from backtester.dca_riskmetric_strategy import (
+    DCARiskMetricStrategy7to0,
+    DCARiskMetricStrategyFibonacci,
+)
+from backtester.riskmetric_strategy import (
+    RiskMetricStrategyCombined,
+    RiskMetricStrategyCombined2,
+    RiskMetricStrategyIdealExtrema,
+    RiskMetricStrategyRiskLogic,
+)
+from backtester.short_term_strategy import ShortTermStrategyReal
+from backtester.utils import create_portfolio_from_data
+
+
+@pytest.fixture
+def data():
+    return get_random_close_data("2022-01-01", "2022-05-01", 7)
+
+
+@pytest.fixture
+def riskmetric(data):
+    rng = np.random.default_rng(8)
+    size = data.dates.size
+    riskmetric = pd.DataFrame({"riskmetric": rng.uniform(0, 1, size)}, index=data.dates)
+    riskmetric.iloc[10, 0] = np.nan
+    for column in ["min", "max"]:
+        signal = np.where(rng.uniform(size=size) < 0.1, riskmetric["riskmetric"], np.nan)
+        riskmetric[column] = signal
+        riskmetric[f"{column}_real"] = riskmetric[column].shift(3)
+    return riskmetric
+
+
+def assert_strategies_match(reference, compiled):
+    assert np.array_equal(reference.profits_in_time, compiled.profits_in_time)
+    assert reference.bought_dates == compiled.bought_dates
+    assert reference.sold_dates == compiled.sold_dates
+    assert reference.portfolio.usd == compiled.portfolio.usd
+    assert reference.portfolio.coins == compiled.portfolio.coins
+    assert reference.total_usd_invested == compiled.total_usd_invested
+    assert reference.i == compiled.i
+
+
+@pytest.mark.parametrize(
+    "cls, kwargs, usd",
+    [
+        (RiskMetricStrategyRiskLogic, {}, 100),
+        (RiskMetricStrategyIdealExtrema, {}, 100),
+        (RiskMetricStrategyCombined, {}, 100),
+        (RiskMetricStrategyCombined2, {}, 0),
+        (DCARiskMetricStrategy7to0, {"dca_interval": 1}, 0),
+        (DCARiskMetricStrategyFibonacci, {"dca_interval": 6, "base": 3}, 50),
+    ],
+)
+def test_compiled_matches_reference(data, riskmetric, cls, kwargs, usd):
+    kwargs["riskmetric"] = riskmetric
+    reference = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    reference.run_simulation()
+    compiled = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    assert compiled.can_run_compiled()
+    compiled.run_simulation_compiled()
+
+    assert_strategies_match(reference, compiled)
+
+
+def test_compiled_short_term_matches_reference(data, riskmetric, monkeypatch):
+    monkeypatch.setattr(ShortTermStrategyReal, "compute_metric", lambda self: riskmetric)
+    reference = ShortTermStrategyReal(data, create_portfolio_from_data(data, 100))
+    reference.run_simulation()
+    compiled = ShortTermStrategyReal(data, create_portfolio_from_data(data, 100))
+    compiled.run()
+
+    assert_strategies_match(reference, compiled)
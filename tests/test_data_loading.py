@@ -0,0 +1,50 @@
+"""
+File for testing the concurrent loading of the pairs data.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import argparser
+from backtester.utils import convert_args_to_trading_variables
+
+PAIRS = [f"PAIR{i}USDT" for i in range(8)]
+DELAY = 0.2
+
+
+@pytest.fixture
+def get_data(monkeypatch):
+    def delayed_get_data(args):
+        # Stand-in for the Binance API, later pairs respond sooner
+        time.sleep(DELAY * (1 - PAIRS.index(args["ticker"]) / len(PAIRS)))
+        dates = pd.date_range(args["start_date"], args["end_date"], freq="1d", name="open_time")
+        values = np.full((dates.size, 5), PAIRS.index(args["ticker"]), dtype=float)
+        return pd.DataFrame(values, columns=["open", "high", "low", "close", "volume"], index=dates)
+
+    monkeypatch.setattr(argparser, "get_data", delayed_get_data)
+
+
+def get_trading_vars(download_workers):
+    return convert_args_to_trading_variables(
+        {
+            "pairs": PAIRS,
+            "start_date": "2022-01-01",
+            "end_date": "2022-01-10",
+            "interval": "1d",
+            "download_workers": download_workers,
+        }
+    )
+
+
+def test_pairs_are_loaded_concurrently_in_order(get_data):
+    start = time.perf_counter()
+    data = argparser.get_data_dataframe(get_trading_vars(len(PAIRS)))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < DELAY * len(PAIRS) / 2
+    assert list(data.index.get_level_values("pair").unique()) == sorted(PAIRS)
+    pd.testing.assert_frame_equal(data, argparser.get_data_dataframe(get_trading_vars(1)))
+    assert list(data.xs("2022-01-01", level="open_time")["close"]) == list(range(len(PAIRS)))
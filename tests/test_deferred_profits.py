@@ -0,0 +1,46 @@
+"""
+File for testing that profits computed from the holdings ledger match the per-step logging.
+"""
+
+import numpy as np
+import pytest
+from utils import get_random_close_data
+
+from backtester.dca_strategy import DCAStrategy
+from backtester.strategy import Strategy
+from backtester.utils import Portfolio, TradingData, create_portfolio_from_data
+
+
+class ScheduledStrategy(Strategy):
+    def __init__(self, data: TradingData, portfolio: Portfolio = None):
+        super().__init__(data, portfolio)
+        self.buy()
+
+    def execute_step(self):
+        super().execute_step()
+        if self.i % 7 == 3:
+            self.sell()
+        elif self.i % 7 == 5:
+            self.buy_partial(40)
+        elif self.i % 11 == 0:
+            self.buy_additional(10)
+
+
+@pytest.fixture
+def data():
+    return get_random_close_data("2022-01-01", "2022-03-01", 1)
+
+
+@pytest.mark.parametrize(
+    "cls, kwargs, usd",
+    [(ScheduledStrategy, {}, 100), (DCAStrategy, {"dca_interval": 3}, 0)],
+)
+def test_deferred_profits_match_reference(data, cls, kwargs, usd):
+    reference = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    reference.run_simulation()
+    deferred = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    deferred.deferred_profits = True
+    deferred.run_simulation()
+
+    assert np.allclose(reference.profits_in_time, deferred.profits_in_time)
+    assert len(deferred.ledger.steps) < data.dates.size
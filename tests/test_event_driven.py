@@ -0,0 +1,56 @@
+"""
+File for testing that the event-driven simulations match the per-step reference simulations.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_random_close_data
+
+from backtester.dca_riskmetric_strategy import DCARiskMetricStrategyFibonacci
+from backtester.riskmetric_strategy import (
+    RiskMetricStrategyCombined,
+    RiskMetricStrategyIdealExtrema,
+    RiskMetricStrategyRealExtrema,
+)
+from backtester.utils import create_portfolio_from_data
+
+
+@pytest.fixture
+def data():
+    return get_random_close_data("2022-01-01", "2022-04-01", 2)
+
+
+@pytest.fixture
+def riskmetric(data):
+    rng = np.random.default_rng(3)
+    size = data.dates.size
+    riskmetric = pd.DataFrame({"riskmetric": rng.uniform(0, 1, size)}, index=data.dates)
+    for column in ["min", "max"]:
+        signal = np.where(rng.uniform(size=size) < 0.1, riskmetric["riskmetric"], np.nan)
+        riskmetric[column] = signal
+        riskmetric[f"{column}_real"] = riskmetric[column].shift(5)
+    return riskmetric
+
+
+@pytest.mark.parametrize(
+    "cls, kwargs, usd",
+    [
+        (RiskMetricStrategyIdealExtrema, {}, 100),
+        (RiskMetricStrategyRealExtrema, {}, 100),
+        (RiskMetricStrategyCombined, {}, 100),
+        (DCARiskMetricStrategyFibonacci, {"dca_interval": 4}, 0),
+    ],
+)
+def test_event_driven_matches_reference(data, riskmetric, cls, kwargs, usd):
+    kwargs["riskmetric"] = riskmetric
+    reference = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    reference.run(event_driven=False, compiled=False)
+    event_driven = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    assert event_driven.get_event_steps().size < data.dates.size
+    event_driven.run(compiled=False)
+
+    assert np.allclose(reference.profits_in_time, event_driven.profits_in_time)
+    assert reference.bought_dates == event_driven.bought_dates
+    assert reference.sold_dates == event_driven.sold_dates
+    assert reference.i == event_driven.i
@@ -0,0 +1,55 @@
+"""
+File for testing the batch and streaming local extrema detectors against argrelextrema.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import argrelextrema
+
+from backtester.extrema import StreamingExtrema, get_local_extrema
+
+
+def get_argrelextrema_masks(values, order):
+    local_min = np.zeros(values.size, dtype=bool)
+    local_max = np.zeros(values.size, dtype=bool)
+    local_min[argrelextrema(values, np.less_equal, order=order)[0]] = True
+    local_max[argrelextrema(values, np.greater_equal, order=order)[0]] = True
+    return local_min, local_max
+
+
+def get_series(seed):
+    rng = np.random.default_rng(seed)
+    # Few distinct values make plateaus, NaN and infinite values are mixed in
+    values = rng.integers(0, 4, int(rng.integers(1, 80))).astype(float)
+    values[rng.integers(0, values.size, 2)] = np.nan
+    values[rng.integers(0, values.size, 1)] = np.inf
+    return values
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("order", [1, 3, 5])
+def test_batch_matches_argrelextrema(seed, order):
+    values = get_series(seed)
+    local_min, local_max = get_local_extrema(values, order)
+    expected_min, expected_max = get_argrelextrema_masks(values, order)
+    assert np.array_equal(local_min, expected_min)
+    assert np.array_equal(local_max, expected_max)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("order", [1, 3, 5])
+def test_streaming_confirms_extrema_order_steps_late(seed, order):
+    values = get_series(seed)
+    local_min, local_max = get_argrelextrema_masks(values, order)
+    min_real, max_real = StreamingExtrema(order).extend(values)
+    expected_min = pd.Series(values).where(local_min).shift(order).to_numpy()
+    expected_max = pd.Series(values).where(local_max).shift(order).to_numpy()
+    assert np.array_equal(min_real, expected_min, equal_nan=True)
+    assert np.array_equal(max_real, expected_max, equal_nan=True)
+
+
+def test_empty_values():
+    local_min, local_max = get_local_extrema(np.array([]), 5)
+    assert local_min.size == local_max.size == 0
+    assert StreamingExtrema(5).extend([]).shape == (2, 0)
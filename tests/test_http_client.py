@@ -0,0 +1,118 @@
+"""
+File for testing the concurrent global metrics download against a local stand-in server.
+"""
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+import requests
+
+from backtester import coinmarketcap_api_downloader, http_client
+from backtester.http_client import RateLimiter
+
+
+def get_quote(date: pd.Timestamp):
+    value = float(date.toordinal())
+    return {
+        "timestamp": (date + pd.Timedelta(hours=23, minutes=59)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "btcDominance": value / 1e6,
+        "quote": [
+            {
+                "altcoinMarketCap": value,
+                "altcoinVolume24H": value + 1,
+                "totalMarketCap": value + 2,
+                "totalVolume24H": value + 3,
+            }
+        ],
+    }
+
+
+@pytest.fixture
+def server(monkeypatch):
+    requested = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = parse_qs(urlparse(self.path).query)
+            with lock:
+                requested.append(params["timeStart"][0])
+                # The first request of every window fails with a transient error
+                failed = requested.count(params["timeStart"][0]) == 1
+            if failed:
+                self.send_response(503)
+                self.end_headers()
+                return
+            start, end = (
+                pd.Timestamp(int(params[key][0]), unit="s") for key in ("timeStart", "timeEnd")
+            )
+            quotes = [get_quote(date) for date in pd.date_range(start, end, freq="D")]
+            body = json.dumps({"data": {"quotes": quotes}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{http_server.server_address[1]}/historical"
+    monkeypatch.setattr(coinmarketcap_api_downloader, "COINMARKETCAP_GLOBAL_METRICS_URL", url)
+    monkeypatch.setattr(coinmarketcap_api_downloader, "COINMARKETCAP_LIMIT", 30)
+    monkeypatch.setattr(coinmarketcap_api_downloader, "COINMARKETCAP_RATE", 100)
+    yield requested
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def test_windows_are_downloaded_with_retries(server):
+    start_date, end_date = pd.Timestamp("2021-01-01"), pd.Timestamp("2021-04-30")
+    df = coinmarketcap_api_downloader.download_global_metrics(start_date, end_date)
+
+    dates = pd.date_range(start_date, end_date, freq="D", name="date")
+    pd.testing.assert_index_equal(df.index, dates)
+    assert list(df.columns) == [
+        "btc_dominance",
+        "eth_dominance",
+        "altcoin_marketcap",
+        "altcoin_volume_24h",
+        "total_marketcap",
+        "total_volume_24h",
+    ]
+    assert list(df["total_marketcap"]) == [date.toordinal() + 2.0 for date in dates]
+    assert not df["eth_dominance"].any()
+    # Every one of the 4 windows is requested twice, the first request failing
+    assert len(server) == 8 and len(set(server)) == 4
+
+
+def test_failed_download_raises(monkeypatch):
+    # Nothing listens on the port of a closed socket, every connection is refused
+    with socket.socket() as closed_socket:
+        closed_socket.bind(("127.0.0.1", 0))
+        port = closed_socket.getsockname()[1]
+    url = f"http://127.0.0.1:{port}/historical"
+    monkeypatch.setattr(coinmarketcap_api_downloader, "COINMARKETCAP_GLOBAL_METRICS_URL", url)
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 2)
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_FACTOR", 0)
+    with pytest.raises(requests.RequestException):
+        coinmarketcap_api_downloader.download_global_metrics(
+            pd.Timestamp("2021-01-01"), pd.Timestamp("2021-01-10")
+        )
+
+
+def test_rate_limiter_spaces_requests(monkeypatch):
+    times = []
+    monkeypatch.setattr("time.sleep", lambda seconds: times.append(seconds))
+    rate_limiter = RateLimiter(10)
+    for _ in range(3):
+        rate_limiter.wait()
+    assert len(times) == 2
+    assert times[1] > times[0] > 0.05
@@ -0,0 +1,66 @@
+"""
+File for testing the incremental risk metric calculation against the calculation of all
+the data at once.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import riskmetric_calculator
+from backtester.incremental_riskmetric import IncrementalRiskMetric, RollingMean
+from backtester.riskmetric_calculator import RiskMetricOptimizations, get_risk_metric
+
+
+@pytest.fixture
+def historical_data():
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2014-01-01", "2019-01-01", name="date")
+    df = pd.DataFrame(
+        {
+            "price": np.exp(np.cumsum(rng.normal(0, 0.03, dates.size))) * 500,
+            "total_volume_24h": rng.uniform(1e9, 5e9, dates.size),
+        },
+        index=dates,
+    )
+    df.iloc[::97, 1] = np.nan
+    return df
+
+
+def test_rolling_mean_matches_pandas():
+    rng = np.random.default_rng(2)
+    values = rng.normal(0, 1e6, 1000)
+    values[100:200] = 0.1
+    values[rng.integers(0, values.size, 20)] = np.nan
+    rolling_mean = RollingMean(50, min_periods=1)
+    means = np.concatenate([rolling_mean.append(values[:333]), rolling_mean.append(values[333:])])
+    expected = pd.Series(values).rolling(50, min_periods=1).mean().to_numpy()
+    assert np.array_equal(means, expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("diminishing_returns", [False, True])
+@pytest.mark.parametrize("daily_volume_correlation", [False, True])
+def test_updates_match_calculation_of_all_data(
+    historical_data, diminishing_returns, daily_volume_correlation
+):
+    optimizations = RiskMetricOptimizations(diminishing_returns, daily_volume_correlation)
+    incremental = IncrementalRiskMetric(optimizations)
+    start_date, end_date = historical_data.index[0], historical_data.index[-1]
+
+    splits = [0, 1000, 1001, 1003, 1010, historical_data.index.size]
+    for start, end in zip(splits, splits[1:]):
+        new_rows = incremental.update(historical_data.iloc[start:end])
+        assert new_rows.index[-1] == historical_data.index[end - 1]
+
+        riskmetric_calculator.riskmetric_cache.clear_memory()
+        expected = get_risk_metric(historical_data.iloc[:end], optimizations, start_date, end_date)
+        pd.testing.assert_frame_equal(
+            incremental.get_df(), expected.df, check_exact=True, check_freq=False
+        )
+
+
+def test_update_with_older_data_raises(historical_data):
+    incremental = IncrementalRiskMetric(RiskMetricOptimizations())
+    incremental.update(historical_data.iloc[:100])
+    with pytest.raises(ValueError, match="does not follow"):
+        incremental.update(historical_data.iloc[50:150])
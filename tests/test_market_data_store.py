@@ -0,0 +1,326 @@
+"""
+File for testing the Arrow files of the downloaded market data.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import (
+    binance_api_downloader,
+    coinmarketcap_api_downloader,
+    market_data_store,
+)
+from backtester.market_data_store import (
+    ARROW_SUFFIX,
+    CATALOG_NAME,
+    MarketDataCatalog,
+    get_market_data_files,
+    load_market_data,
+    save_market_data,
+)
+from backtester.utils import SEP
+
+
+@pytest.fixture
+def data_5m():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2021-01-01 02:00", "2021-03-01", freq="5min", name="open_time")
+    columns = ["open", "high", "low", "close", "volume"]
+    return pd.DataFrame(
+        {column: rng.uniform(1e3, 6e4, dates.size).round(2) for column in columns}, index=dates
+    )
+
+
+def test_date_range_is_loaded(data_5m, tmp_path):
+    path = tmp_path / "data.arrow"
+    save_market_data(data_5m, path)
+    start_date, end_date = pd.Timestamp("2021-01-10"), pd.Timestamp("2021-02-01 00:05")
+
+    pd.testing.assert_frame_equal(load_market_data(path), data_5m, check_freq=False)
+    pd.testing.assert_frame_equal(
+        load_market_data(path, start_date, end_date),
+        data_5m[start_date:end_date],
+        check_freq=False,
+    )
+    assert load_market_data(path, end_date=pd.Timestamp("2020-01-01")).empty
+
+
+def test_csv_files_are_migrated(data_5m, tmp_path):
+    data_5m.to_csv(tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.csv")
+    data_5m.to_csv(tmp_path / f"btc-historical{SEP}2021-03-01")
+
+    files = get_market_data_files(tmp_path, "open_time")
+    assert [file.name for file in files] == [
+        f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.arrow",
+        f"btc-historical{SEP}2021-03-01.arrow",
+    ]
+    assert sorted(tmp_path.iterdir()) == files
+    pd.testing.assert_frame_equal(load_market_data(files[0]), data_5m, check_freq=False)
+
+
+def test_binance_data_is_loaded_from_migrated_csv(data_5m, tmp_path, monkeypatch):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    data_5m.to_csv(tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.csv")
+    args = {
+        "ticker": "BTCUSDT",
+        "start_date": pd.Timestamp("2021-01-01"),
+        "end_date": pd.Timestamp("2021-02-01"),
+        "interval": "5m",
+    }
+    df = binance_api_downloader.get_data_from_binance(args)
+    pd.testing.assert_frame_equal(df, data_5m[: args["end_date"]], check_freq=False)
+
+
+def test_catalog_finds_shortest_covering_file(data_5m, tmp_path):
+    for start_date, end_date in [("2020-01-01", "2021-06-01"), ("2021-01-01", "2021-03-01")]:
+        save_market_data(
+            data_5m, tmp_path / f"BTCUSDT{SEP}{start_date}{SEP}{end_date}{SEP}5m.arrow"
+        )
+    (tmp_path / "notes.txt").write_text("not market data")
+    (tmp_path / "README").write_text("not market data")
+    catalog = MarketDataCatalog(
+        tmp_path, binance_api_downloader.get_binance_file_entry, "open_time"
+    )
+
+    def find(start_date, end_date, ticker="BTCUSDT", interval="5m"):
+        file = catalog.find(ticker, interval, pd.Timestamp(start_date), pd.Timestamp(end_date))
+        return None if file is None else file.stem.split(SEP)[1]
+
+    assert find("2021-01-05", "2021-02-01") == "2021-01-01"
+    assert find("2020-05-01", "2021-02-01") == "2020-01-01"
+    assert find("2021-01-05", "2021-07-01") is None
+    assert find("2021-01-05", "2021-02-01", ticker="ETHUSDT") is None
+    assert find("2021-01-05", "2021-02-01", interval="1h") is None
+
+    (tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.arrow").unlink()
+    assert find("2021-01-05", "2021-02-01") == "2020-01-01"
+
+    path = tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-08-01{SEP}5m.arrow"
+    save_market_data(data_5m, path)
+    catalog.add(path, catalog.get_file_entry(path))
+    assert find("2021-01-05", "2021-07-01") == "2021-01-01"
+    assert (tmp_path / CATALOG_NAME).exists()
+
+
+def test_binance_data_is_extended_with_missing_head_and_tail(data_5m, tmp_path, monkeypatch):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    save_market_data(
+        data_5m["2021-01-10":"2021-02-01 23:55"],
+        tmp_path / f"BTCUSDT{SEP}2021-01-10{SEP}2021-02-01{SEP}5m.arrow",
+    )
+    downloads = []
+
+    def download_klines(args, start_date, end_date):
+        downloads.append((start_date, end_date))
+        return data_5m[start_date:end_date]
+
+    monkeypatch.setattr(binance_api_downloader, "download_klines", download_klines)
+    args = {
+        "ticker": "BTCUSDT",
+        "start_date": pd.Timestamp("2021-01-05"),
+        "end_date": pd.Timestamp("2021-02-10"),
+        "interval": "5m",
+    }
+    df = binance_api_downloader.get_data_from_binance(args)
+    pd.testing.assert_frame_equal(
+        df, data_5m[args["start_date"] : args["end_date"]], check_freq=False
+    )
+    assert downloads == [
+        (pd.Timestamp("2021-01-05"), pd.Timestamp("2021-01-10")),
+        (pd.Timestamp("2021-02-01"), pd.Timestamp("2021-02-10")),
+    ]
+    assert [file.name for file in get_market_data_files(tmp_path, "open_time")] == [
+        f"BTCUSDT{SEP}2021-01-05{SEP}2021-02-10{SEP}5m.arrow"
+    ]
+
+    # The daily update downloads only the last day
+    downloads.clear()
+    args["end_date"] = pd.Timestamp("2021-02-11")
+    df = binance_api_downloader.get_data_from_binance(args)
+    pd.testing.assert_frame_equal(
+        df, data_5m[args["start_date"] : args["end_date"]], check_freq=False
+    )
+    assert downloads == [(pd.Timestamp("2021-02-10"), pd.Timestamp("2021-02-11"))]
+
+
+def test_global_metrics_are_extended_with_missing_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(coinmarketcap_api_downloader, "COINMARKETCAP_DATA_PATH", tmp_path)
+    dates = pd.date_range("2013-04-28", "2021-03-01", freq="D", name="date")
+    metrics = pd.DataFrame({"total_marketcap": np.arange(dates.size, dtype=float)}, index=dates)
+    save_market_data(
+        metrics[:"2021-02-01"], tmp_path / f"global-metrics{SEP}2013-04-28{SEP}2021-02-01.arrow"
+    )
+    downloads = []
+
+    def download_global_metrics(start_date, end_date):
+        downloads.append((start_date, end_date))
+        return metrics[start_date:end_date]
+
+    monkeypatch.setattr(
+        coinmarketcap_api_downloader, "download_global_metrics", download_global_metrics
+    )
+    df = coinmarketcap_api_downloader.get_global_metrics_from_coinmarketcap(
+        pd.Timestamp("2020-01-01"), pd.Timestamp("2021-02-09")
+    )
+    pd.testing.assert_frame_equal(df, metrics[:"2021-02-10"], check_freq=False)
+    assert downloads == [(pd.Timestamp("2021-02-01"), pd.Timestamp("2021-02-10"))]
+    assert [file.name for file in get_market_data_files(tmp_path, "date")] == [
+        f"global-metrics{SEP}2013-04-28{SEP}2021-02-10.arrow"
+    ]
+
+
+def test_klines_are_converted_to_typed_columns(data_5m):
+    open_times = data_5m.index.values.astype("datetime64[ms]").astype(np.int64)
+    klines = (
+        [int(open_time)]
+        + [str(value) for value in row]
+        + [int(open_time) + 299999, "0", 10]
+        + ["0", "0", "0"]
+        for open_time, row in zip(open_times, data_5m.itertuples(index=False))
+    )
+    df = binance_api_downloader.get_df_from_binance(klines)
+    pd.testing.assert_frame_equal(df, data_5m, check_freq=False)
+    assert (df.dtypes == np.float64).all()
+
+    empty = binance_api_downloader.get_df_from_binance([])
+    assert empty.empty and isinstance(empty.index, pd.DatetimeIndex)
+    assert list(empty.columns) == list(data_5m.columns)
+
+
+@pytest.mark.parametrize("interval", ["1h", "4h", "1d", "1w"])
+def test_coarser_interval_is_resampled_from_cached_data(data_5m, tmp_path, monkeypatch, interval):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    save_market_data(data_5m, tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.arrow")
+    monkeypatch.setattr(binance_api_downloader, "download_klines", None)
+    args = {
+        "ticker": "BTCUSDT",
+        "start_date": pd.Timestamp("2021-01-01"),
+        "end_date": pd.Timestamp("2021-02-15"),
+        "interval": interval,
+    }
+    df = binance_api_downloader.get_data_from_binance(args)
+
+    # Bars start at midnight and on Mondays, bars missing data at the edges are dropped
+    if interval == "1w":
+        bar_dates = data_5m.index.to_period("W-SUN").start_time
+    else:
+        bar_dates = data_5m.index.floor(interval)
+    bars = data_5m.groupby(bar_dates.rename("open_time"))
+    expected = bars.agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    )
+    expected = expected[bars.size() == pd.Timedelta(interval) // pd.Timedelta("5m")]
+    assert expected.index[0] > args["start_date"]
+    pd.testing.assert_frame_equal(df, expected[: args["end_date"]], check_freq=False)
+
+
+def test_months_are_not_resampled(data_5m, tmp_path, monkeypatch):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    save_market_data(data_5m, tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.arrow")
+    catalog = binance_api_downloader.get_binance_catalog()
+    for interval in ["1M", "3d"]:
+        args = {
+            "ticker": "BTCUSDT",
+            "start_date": pd.Timestamp("2021-01-01"),
+            "end_date": pd.Timestamp("2021-02-15"),
+            "interval": interval,
+        }
+        assert binance_api_downloader.get_resampled_data(catalog, args) is None
+
+
+def test_local_time_csv_is_merged_and_resampled_in_utc(tmp_path, monkeypatch):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    monkeypatch.setattr(market_data_store, "LOCAL_TIMEZONE", "Europe/Prague")
+    # The daylight saving time starts on 2021-03-28, daily bars move from 01:00 to 02:00
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2021-03-20", "2021-04-10", freq="5min", name="open_time")
+    columns = ["open", "high", "low", "close", "volume"]
+    data_5m = pd.DataFrame(
+        {column: rng.uniform(1e3, 6e4, dates.size).round(2) for column in columns}, index=dates
+    )
+    old_data = data_5m[: pd.Timestamp("2021-04-01")].copy()
+    old_data.index = old_data.index.tz_localize("UTC").tz_convert("Europe/Prague").tz_localize(None)
+    old_data.to_csv(tmp_path / f"BTCUSDT{SEP}2021-03-20{SEP}2021-04-01{SEP}5m.csv")
+
+    downloads = []
+
+    def download_klines(args, start_date, end_date):
+        downloads.append((start_date, end_date))
+        return data_5m[start_date:end_date]
+
+    monkeypatch.setattr(binance_api_downloader, "download_klines", download_klines)
+    args = {
+        "ticker": "BTCUSDT",
+        "start_date": pd.Timestamp("2021-03-20"),
+        "end_date": pd.Timestamp("2021-04-09"),
+        "interval": "5m",
+    }
+    df = binance_api_downloader.get_data_from_binance(args)
+    assert downloads == [(pd.Timestamp("2021-04-01"), pd.Timestamp("2021-04-09"))]
+    pd.testing.assert_frame_equal(
+        df, data_5m[args["start_date"] : args["end_date"]], check_freq=False
+    )
+
+    args["interval"], args["end_date"] = "1d", pd.Timestamp("2021-04-07")
+    df = binance_api_downloader.get_data_from_binance(args)
+    assert len(downloads) == 1
+    expected = data_5m.groupby(data_5m.index.floor("1d")).agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    )
+    pd.testing.assert_frame_equal(
+        df, expected[args["start_date"] : args["end_date"]], check_freq=False
+    )
+
+
+def test_last_bar_is_completed_from_downloaded_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    rng = np.random.default_rng(2)
+    dates = pd.date_range("2021-01-01", "2021-03-05", freq="5min", name="open_time")
+    columns = ["open", "high", "low", "close", "volume"]
+    data_5m = pd.DataFrame(
+        {column: rng.uniform(1e3, 6e4, dates.size).round(2) for column in columns}, index=dates
+    )
+    # The 5m run over the same dates ended with the first bar of its end date
+    save_market_data(
+        data_5m[: pd.Timestamp("2021-03-01")],
+        tmp_path / f"BTCUSDT{SEP}2021-01-01{SEP}2021-03-01{SEP}5m.arrow",
+    )
+    downloads = []
+
+    def download_klines(args, start_date, end_date):
+        downloads.append((args["interval"], start_date, end_date))
+        return data_5m[start_date:end_date]
+
+    monkeypatch.setattr(binance_api_downloader, "download_klines", download_klines)
+    args = {
+        "ticker": "BTCUSDT",
+        "start_date": pd.Timestamp("2021-01-01"),
+        "end_date": pd.Timestamp("2021-03-01"),
+        "interval": "1d",
+    }
+    expected = data_5m.groupby(data_5m.index.floor("1d")).agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+    )[args["start_date"] : args["end_date"]]
+    for _ in range(2):
+        df = binance_api_downloader.get_data_from_binance(args)
+        pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    # Only the 5m tail of the last day is downloaded, once
+    assert downloads == [("5m", pd.Timestamp("2021-03-01"), pd.Timestamp("2021-03-01 23:55"))]
+
+
+def test_empty_download_returns_empty_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(binance_api_downloader, "BINANCE_DATA_PATH", tmp_path)
+    monkeypatch.setattr(
+        binance_api_downloader,
+        "download_klines",
+        lambda args, start_date, end_date: binance_api_downloader.get_df_from_binance([]),
+    )
+    args = {
+        "ticker": "NEWUSDT",
+        "start_date": pd.Timestamp("2021-01-01"),
+        "end_date": pd.Timestamp("2021-03-01"),
+        "interval": "1d",
+    }
+    assert binance_api_downloader.get_data_from_binance(args).empty
+    assert not list(tmp_path.glob(f"*{ARROW_SUFFIX}"))
@@ -0,0 +1,76 @@
+"""
+File for testing that strategies run in parallel give the same results as run sequentially.
+"""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_random_close_data
+
+from backtester.argparser import get_argument_parser
+from backtester.hodl_strategy import HodlStrategy
+from backtester.rebalance_strategy import RebalanceStrategy
+from backtester.riskmetric_strategy import RiskMetricStrategyRealExtrema
+from backtester.shared_trading_data import SharedFrame
+from backtester.simulator import StrategyGenerator
+from backtester.utils import create_portfolio_from_data
+
+
+@pytest.fixture
+def data():
+    return get_random_close_data("2022-01-01", "2022-04-01", 4)
+
+
+@pytest.fixture
+def strategy_list(data):
+    rng = np.random.default_rng(5)
+    riskmetric = pd.DataFrame({"riskmetric": rng.uniform(0, 1, data.dates.size)}, index=data.dates)
+    riskmetric["min_real"] = riskmetric["riskmetric"].where(riskmetric["riskmetric"] < 0.1)
+    riskmetric["max_real"] = riskmetric["riskmetric"].where(riskmetric["riskmetric"] > 0.9)
+    return [
+        [HodlStrategy],
+        [RebalanceStrategy, {"interval": 3}],
+        [RiskMetricStrategyRealExtrema, {"riskmetric": riskmetric}],
+        [RiskMetricStrategyRealExtrema, {"riskmetric": riskmetric}],
+    ]
+
+
+def test_parallel_matches_sequential(data, strategy_list):
+    portfolio = create_portfolio_from_data(data, 100)
+    sequential = StrategyGenerator(strategy_list, data, portfolio)
+    sequential.run()
+    parallel = StrategyGenerator(strategy_list, data, portfolio, workers=2)
+    parallel.run()
+
+    assert len(sequential.get_results()) == len(parallel.get_results())
+    for expected, result in zip(sequential.get_results(), parallel.get_results()):
+        assert expected.name == result.name
+        assert np.array_equal(expected.profits, result.profits)
+        assert expected.bought_dates == result.bought_dates
+        assert expected.sold_dates == result.sold_dates
+
+
+@pytest.mark.parametrize("workers", [0, -1])
+def test_workers_below_one_are_rejected(data, strategy_list, workers):
+    with pytest.raises(ValueError):
+        StrategyGenerator(strategy_list, data, workers=workers)
+    parser = get_argument_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--workers", str(workers)])
+
+
+def test_shared_frame_keeps_index_in_shared_memory(data, strategy_list):
+    riskmetric = strategy_list[2][1]["riskmetric"]
+    for df in [data.data, data.panels["close"], riskmetric]:
+        shared = SharedFrame(df)
+        try:
+            # The attached frame must be kept alive as long as its data frame is used
+            attached = pickle.loads(pickle.dumps(shared))
+            restored = attached.get_frame()
+            pd.testing.assert_frame_equal(restored, df.astype(np.float64), check_freq=False)
+            # Only the names of the memory blocks and the small levels are pickled
+            assert len(pickle.dumps(shared)) < len(pickle.dumps(df.index)) / 2
+        finally:
+            shared.unlink()
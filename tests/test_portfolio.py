@@ -0,0 +1,40 @@
+"""
+File for testing the portfolio holdings vector and its coins view.
+"""
+
+import pickle
+
+import numpy as np
+from utils import get_data_from_dict
+
+from backtester.utils import Portfolio, create_portfolio_from_data
+
+
+def test_portfolio_follows_pair_order():
+    data = get_data_from_dict("2022-01-01", "2022-01-10", "1d", {"ETHUSDT", "BTCUSDT", "ADAUSDT"})
+    portfolio = create_portfolio_from_data(data, 100)
+    assert portfolio.symbols == tuple(data.pair_columns)
+    assert portfolio.holdings.dtype == np.float64
+
+
+def test_coins_view():
+    portfolio = Portfolio(100, {"BTCUSDT": 1, "ETHUSDT": 2})
+    portfolio.coins["ETHUSDT"] += 1
+    assert portfolio.holdings.tolist() == [1, 3]
+    assert dict(portfolio.coins) == {"BTCUSDT": 1, "ETHUSDT": 3}
+
+    portfolio.coins["ADAUSDT"] = 4
+    assert portfolio.symbols == ("BTCUSDT", "ETHUSDT", "ADAUSDT")
+    del portfolio.coins["BTCUSDT"]
+    assert portfolio.coins == {"ETHUSDT": 3, "ADAUSDT": 4}
+
+
+def test_copy_does_not_share_holdings():
+    portfolio = Portfolio(100, {"BTCUSDT": 1, "ETHUSDT": 2})
+    copied = portfolio.copy()
+    assert copied == portfolio
+    copied.holdings[0] = 5
+    copied.usd = 0
+    assert portfolio.coins["BTCUSDT"] == 1
+    assert portfolio.usd == 100
+    assert pickle.loads(pickle.dumps(portfolio)) == portfolio
@@ -0,0 +1,115 @@
+"""
+File for testing the risk metric and its arrays aligned to the simulation steps.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_data_from_dict
+
+from backtester import riskmetric_calculator
+from backtester.riskmetric_calculator import (
+    RiskMetric,
+    RiskMetricOptimizations,
+    align_risk_metric,
+    get_risk_metric,
+    get_risk_metrics,
+    get_risk_metrics_of_windows,
+)
+from backtester.riskmetric_strategy import (
+    RiskMetricStrategy,
+    RiskMetricStrategyRiskLogic,
+)
+from backtester.utils import create_portfolio_from_data
+
+
+@pytest.fixture
+def data():
+    return get_data_from_dict("2022-01-01", "2022-02-01", "1d", {"BTCUSDT"})
+
+
+@pytest.fixture
+def riskmetric_df():
+    dates = pd.date_range("2021-12-01", "2022-03-01")
+    return pd.DataFrame({"riskmetric": np.linspace(0, 1, dates.size)}, index=dates)
+
+
+def test_arrays_are_aligned_to_dates(data, riskmetric_df):
+    riskmetric = RiskMetric(riskmetric_df, data.dates)
+    assert riskmetric["riskmetric"].flags.c_contiguous
+    assert np.array_equal(
+        riskmetric["riskmetric"], riskmetric_df.loc[data.dates, "riskmetric"].to_numpy()
+    )
+    assert align_risk_metric(riskmetric, data.dates) is riskmetric
+    assert align_risk_metric(riskmetric, data.dates[1:])["riskmetric"].size == data.dates.size - 1
+
+
+def test_missing_dates_raise_on_construction(data, riskmetric_df):
+    riskmetric_df = riskmetric_df.drop(data.dates[5])
+    with pytest.raises(ValueError, match="missing 1 of the"):
+        RiskMetricStrategyRiskLogic(
+            data, create_portfolio_from_data(data, 100), riskmetric=riskmetric_df
+        )
+
+
+def test_strategy_without_actions_cannot_be_created(data, riskmetric_df):
+    class RiskMetricStrategyWithoutActions(RiskMetricStrategy):
+        pass
+
+    with pytest.raises(TypeError, match="get_actions"):
+        RiskMetricStrategyWithoutActions(
+            data, create_portfolio_from_data(data, 100), riskmetric=riskmetric_df
+        )
+
+
+@pytest.fixture
+def historical_data():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2015-01-01", "2022-01-01", name="date")
+    return pd.DataFrame(
+        {
+            "price": np.exp(np.cumsum(rng.normal(0, 0.03, dates.size))) * 500,
+            "total_volume_24h": rng.uniform(1e9, 5e9, dates.size),
+        },
+        index=dates,
+    )
+
+
+def test_batch_matches_single_calculations(historical_data):
+    optimizations_list = [
+        RiskMetricOptimizations(diminishing_returns, daily_volume_correlation)
+        for diminishing_returns in (False, True)
+        for daily_volume_correlation in (False, True)
+    ]
+    start_date, end_date = pd.Timestamp("2016-01-01"), pd.Timestamp("2021-06-01")
+
+    riskmetrics = get_risk_metrics(historical_data, optimizations_list, start_date, end_date)
+    for optimizations, riskmetric in zip(optimizations_list, riskmetrics):
+        riskmetric_calculator.riskmetric_cache.clear_memory()
+        single = get_risk_metric(historical_data, optimizations, start_date, end_date)
+        pd.testing.assert_frame_equal(riskmetric.df, single.df, check_exact=True)
+    assert not riskmetrics[0].df.equals(riskmetrics[3].df)
+
+
+@pytest.mark.parametrize(
+    "optimizations",
+    [RiskMetricOptimizations(), RiskMetricOptimizations(True, True)],
+)
+def test_windows_match_single_calculations(historical_data, optimizations, monkeypatch):
+    start_date, end_date = pd.Timestamp("2016-01-01"), pd.Timestamp("2021-06-01")
+    short_windows = [20, 50, 80]
+    riskmetrics = get_risk_metrics_of_windows(
+        historical_data,
+        [(short_window, short_window * 7) for short_window in short_windows],
+        start_date,
+        end_date,
+        optimizations,
+    )
+    assert riskmetrics.shape == (historical_data[start_date:end_date].index.size, 3)
+
+    for short_window in short_windows:
+        monkeypatch.setattr(riskmetric_calculator, "NO_DAYS_MA", short_window)
+        expected = get_risk_metric(historical_data, optimizations, start_date, end_date).df
+        riskmetric = riskmetrics[(short_window, short_window * 7)].dropna()
+        assert riskmetric.index.equals(expected.index)
+        assert np.allclose(riskmetric, expected["riskmetric"], rtol=1e-9, atol=1e-12)
@@ -0,0 +1,65 @@
+"""
+File for testing that the short term metric is shared by the short term strategies.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_data_from_dict
+
+from backtester import cache, short_term_strategy
+from backtester.short_term_strategy import (
+    ShortTermStrategyAdjusted,
+    ShortTermStrategyIdeal,
+    ShortTermStrategyReal,
+    calculate_short_term_metric,
+)
+
+
+@pytest.fixture
+def data():
+    return get_data_from_dict("2021-01-01", "2021-01-03", "5min", {"BTCUSDT"})
+
+
+@pytest.fixture
+def data_5m():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-12-30", "2021-01-05", freq="5min", name="open_time")
+    prices = np.exp(np.cumsum(rng.normal(0, 0.002, dates.size))) * 30000
+    return pd.DataFrame({"close": prices}, index=dates)
+
+
+@pytest.fixture
+def get_data_calls(data_5m, monkeypatch):
+    calls = []
+
+    def counted_get_data(args):
+        calls.append(args)
+        return data_5m
+
+    monkeypatch.setattr(short_term_strategy, "get_data", counted_get_data)
+    short_term_strategy.short_term_metric_cache.clear_memory()
+    yield calls
+    short_term_strategy.short_term_metric_cache.clear_memory()
+
+
+def test_metric_is_calculated_once_for_all_strategies(data, data_5m, get_data_calls):
+    strategies = [
+        cls(data)
+        for cls in (ShortTermStrategyIdeal, ShortTermStrategyReal, ShortTermStrategyAdjusted)
+    ]
+    assert len(get_data_calls) == 1
+    assert get_data_calls[0]["ticker"] == "BTCUSDT"
+
+    expected = calculate_short_term_metric(data_5m)[data.dates[0] : data.dates[-1]]
+    for strategy in strategies:
+        pd.testing.assert_frame_equal(strategy.riskmetric.df, expected)
+
+
+def test_metric_is_loaded_from_disk(data, get_data_calls, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_cache_directory", tmp_path)
+    calculated = ShortTermStrategyIdeal(data).riskmetric.df
+    short_term_strategy.short_term_metric_cache.clear_memory()
+    loaded = ShortTermStrategyIdeal(data).riskmetric.df
+    assert len(get_data_calls) == 1
+    pd.testing.assert_frame_equal(calculated, loaded, check_freq=False)
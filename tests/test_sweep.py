@@ -0,0 +1,93 @@
+"""
+File for testing the parameter sweep of strategy keyword arguments.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_data_from_dict, update_close_values
+
+from backtester import sweep
+from backtester.dca_riskmetric_strategy import DCARiskMetricStrategy7to0
+from backtester.rebalance_strategy import RebalanceStrategy
+from backtester.riskmetric_strategy import RiskMetricStrategyRealExtrema
+from backtester.utils import create_portfolio_from_data
+
+
+@pytest.fixture
+def data():
+    data = get_data_from_dict("2022-01-01", "2022-04-01", "1d", {"BTCUSDT"})
+    rng = np.random.default_rng(6)
+    data.data = update_close_values(data, {"BTCUSDT": rng.uniform(10, 20, data.dates.size)})
+    dates = pd.date_range("2019-01-01", "2022-04-01")
+    data.btc_historical = pd.DataFrame(
+        {
+            "price": np.exp(np.cumsum(rng.normal(0, 0.05, dates.size))),
+            "total_volume_24h": rng.uniform(1, 2, dates.size),
+        },
+        index=dates,
+    )
+    return data
+
+
+def test_parameter_grid():
+    grid = {"a": [1, 2], "b": ["x", "y", "z"]}
+    combinations = sweep.get_parameter_grid(grid)
+    assert len(combinations) == 6
+    assert combinations[0] == {"a": 1, "b": "x"}
+    assert combinations[-1] == {"a": 2, "b": "z"}
+
+    sample = sweep.get_parameter_sample(grid, 4, seed=0)
+    assert len(sample) == 4
+    assert all(combination in combinations for combination in sample)
+    assert len({tuple(combination.values()) for combination in sample}) == 4
+    assert len(sweep.get_parameter_sample(grid, 100)) == 6
+
+
+def test_sweep_stats(data):
+    grid = {"interval": [1, 7, 30]}
+    result = sweep.run_sweep(
+        RebalanceStrategy,
+        data,
+        grid,
+        create_portfolio_from_data(data, 100),
+        keep_profits=True,
+    )
+    assert list(result.stats["interval"]) == [1, 7, 30]
+    assert result.profits.shape == (data.dates.size, 3)
+    assert np.array_equal(result.stats["final_profit"], result.profits.iloc[-1])
+
+
+def test_sweep_computes_riskmetric_once_per_optimizations(data, monkeypatch):
+    calls = []
+    get_risk_metrics = sweep.get_risk_metrics
+
+    def counted_get_risk_metrics(*args):
+        calls.append(args[1])
+        return get_risk_metrics(*args)
+
+    monkeypatch.setattr(sweep, "get_risk_metrics", counted_get_risk_metrics)
+    grid = {"diminishing_returns": [False, True], "daily_volume_correlation": [False, True]}
+    result = sweep.run_sweep(
+        RiskMetricStrategyRealExtrema, data, grid | {"unused": [1, 2]}, workers=1
+    )
+    assert len(result.stats) == 8
+    assert len(calls) == 1
+    assert len(set(calls[0])) == len(calls[0]) == 4
+
+
+def test_batched_sweep_matches_strategy_generator(data):
+    grid = {"diminishing_returns": [False, True], "dca_interval": [1, 7], "base": [5, 10]}
+    batched = sweep.run_sweep(DCARiskMetricStrategy7to0, data, grid, keep_profits=True)
+    generated = sweep.run_sweep(
+        DCARiskMetricStrategy7to0, data, grid, keep_profits=True, batched=False
+    )
+    pd.testing.assert_frame_equal(batched.stats, generated.stats, check_dtype=False)
+    pd.testing.assert_frame_equal(batched.profits, generated.profits)
+
+
+def test_sweep_of_hodl_ignores_keyword_arguments(data):
+    grid = {"diminishing_returns": [False, True], "interval": [1, 7]}
+    result = sweep.run_sweep(sweep.STRATEGY_CLASSES["HodlStrategy"], data, grid, keep_profits=True)
+    assert len(result.stats) == 4
+    assert (result.profits.to_numpy() == result.profits.iloc[:, [0]].to_numpy()).all()
@@ -0,0 +1,54 @@
+"""
+File for testing the array representation of the trading data.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils import get_data_from_dict, update_close_values
+
+from backtester.utils import remove_distinct_dates, set_index_for_data
+
+
+@pytest.fixture
+def data():
+    return get_data_from_dict("2022-01-01", "2022-01-03", "1d", {"BTCUSDT", "ETHUSDT"})
+
+
+def test_close_values(data):
+    assert data.close_values.shape == (3, 2)
+    assert not data.close_values.any()
+
+    new_close_values = {"BTCUSDT": [10, 20, 30], "ETHUSDT": [1, 2, 3]}
+    data.data = update_close_values(data, new_close_values)
+
+    btc_column = data.pair_columns["BTCUSDT"]
+    eth_column = data.pair_columns["ETHUSDT"]
+    assert data.close_values.dtype == np.float64
+    assert list(data.close_values[:, btc_column]) == [10, 20, 30]
+    assert list(data.close_values[:, eth_column]) == [1, 2, 3]
+
+
+def test_panels(data):
+    data.data = update_close_values(data, {"BTCUSDT": [10, 20, 30], "ETHUSDT": [1, 2, 3]})
+
+    assert list(data.panels) == ["open", "high", "low", "close", "volume"]
+    close = data.panels["close"]
+    pd.testing.assert_index_equal(close.index, pd.Index(data.dates, name="open_time"))
+    assert list(close.columns) == list(data.pair_columns)
+    assert list(close["BTCUSDT"]) == [10, 20, 30]
+    assert np.array_equal(close.to_numpy(), data.close_values)
+
+
+def test_remove_distinct_dates():
+    dates = pd.date_range("2022-01-01", "2022-01-10", freq="1d")
+    df = pd.DataFrame(
+        {
+            "pair": ["BTCUSDT"] * 10 + ["ETHUSDT"] * 6,
+            "open_time": [*dates, *dates[2:8]],
+            "close": np.arange(16.0),
+        }
+    )
+    data = remove_distinct_dates(set_index_for_data(df.sample(frac=1, random_state=0)))
+    assert list(data.index.get_level_values("open_time").unique()) == list(dates[2:8])
+    assert list(data.loc["BTCUSDT", "close"]) == list(np.arange(2.0, 8.0))
@@ -0,0 +1,72 @@
+"""
+File for testing that the vectorized simulations match the per-step reference simulations.
+"""
+
+import numpy as np
+import pytest
+from utils import get_random_close_data
+
+from backtester.dca_strategy import DCAStrategy
+from backtester.hodl_strategy import HodlStrategy
+from backtester.rebalance_strategy import RebalanceStrategy
+from backtester.strategy import Strategy
+from backtester.utils import create_portfolio_from_data
+
+
+@pytest.fixture
+def data():
+    return get_random_close_data("2022-01-01", "2022-03-01", 0)
+
+
+@pytest.mark.parametrize(
+    "cls, kwargs, usd",
+    [
+        (HodlStrategy, {}, 100),
+        (RebalanceStrategy, {"interval": 1}, 100),
+        (RebalanceStrategy, {"interval": 7}, 100),
+        (RebalanceStrategy, {"interval": 59}, 100),
+        (RebalanceStrategy, {"interval": 0}, 100),
+        (DCAStrategy, {"dca_interval": 1}, 0),
+        (DCAStrategy, {"dca_interval": 5, "base": 10}, 20),
+        (DCAStrategy, {"dca_interval": 0}, 0),
+    ],
+)
+def test_vectorized_matches_reference(data, cls, kwargs, usd):
+    reference = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    reference.run(vectorized=False)
+    vectorized = cls(data, create_portfolio_from_data(data, usd), **kwargs)
+    assert vectorized.can_run_vectorized()
+    vectorized.run()
+
+    assert np.allclose(reference.profits_in_time, vectorized.profits_in_time)
+    assert reference.bought_dates == vectorized.bought_dates
+    assert reference.sold_dates == vectorized.sold_dates
+    assert reference.portfolio.usd == vectorized.portfolio.usd
+    assert np.allclose(
+        list(reference.portfolio.coins.values()), list(vectorized.portfolio.coins.values())
+    )
+    assert reference.total_usd_invested == vectorized.total_usd_invested
+    assert reference.i == vectorized.i
+    assert getattr(reference, "interval_until_next_buy", None) == getattr(
+        vectorized, "interval_until_next_buy", None
+    )
+    assert getattr(reference, "interval_until_next_rebalance", None) == getattr(
+        vectorized, "interval_until_next_rebalance", None
+    )
+
+
+def test_unsupported_vectorized_simulation_falls_back(data):
+    class UnsupportedHodlStrategy(HodlStrategy):
+        def can_run_vectorized(self):
+            return True
+
+        run_simulation_vectorized = Strategy.run_simulation_vectorized
+
+    reference = HodlStrategy(data, create_portfolio_from_data(data, 100))
+    reference.run(vectorized=False)
+    strategy = UnsupportedHodlStrategy(data, create_portfolio_from_data(data, 100))
+    assert strategy.can_run_vectorized()
+    strategy.run()
+
+    assert np.allclose(reference.profits_in_time, strategy.profits_in_time)
+    assert reference.i == strategy.i
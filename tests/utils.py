@@ -53,6 +53,18 @@ def get_data_from_dict(start_date: str, end_date: str, interval: str, symbols: s
     return data
 
 
+def get_random_close_data(start_date: str, end_date: str, seed: int):
+    """Get daily BTCUSDT and ETHUSDT data with close values drawn by the seeded generator."""
+    data = get_data_from_dict(start_date, end_date, "1d", {"BTCUSDT", "ETHUSDT"})
+    rng = np.random.default_rng(seed)
+    new_close_values = {
+        "BTCUSDT": rng.uniform(10, 20, data.dates.size),
+        "ETHUSDT": rng.uniform(1, 2, data.dates.size),
+    }
+    data.data = update_close_values(data, new_close_values)
+    return data
+
+
 def _add_symbol_to_dict_data(
     data, symbol, dates, open=None, high=None, low=None, close=None, volume=None
 ):